@@ -1,14 +1,154 @@
+import json
+import time
+from datetime import time as dt_time
+from uuid import uuid4
+from concurrent.futures import wait, FIRST_COMPLETED
 import streamlit as st
 import numpy as np
 import pandas as pd
 from utils.stl_parser import parse_3d_file
-from utils.cost_calculator import (
-    calc_material_cost, calc_energy_cost, calc_total_cost, get_materials
+from utils.parse_cache import get_parse_cache
+from utils.parse_jobs import get_parse_jobs
+from utils.mesh_validation import validate_mesh
+from utils.supports import analyse_overhangs, support_volume_cm3, SUPPORT_STYLES, DEFAULT_OVERHANG_ANGLE
+from utils.nesting import (
+    Part, footprint_hull, nest_parts, price_plates, bed_size, DEFAULT_SPACING_MM, DEFAULT_PLATE_OVERHEAD_HOURS
 )
+from utils.catalog import get_catalog
+from utils.tariffs import TARIFFS
+from utils.monte_carlo import simulate_quote, PERCENTILES
+from utils.quote_store import get_quote_store
+from utils.pipeline import quote_graph
+from utils import metrics
+from utils.sweep import price_sweep
+from utils.preview import (
+    build_preview, build_preview_figure, DEFAULT_FACE_BUDGET, PREVIEW_FACE_BUDGETS
+)
+from utils.cost_calculator import calc_material_cost, estimate_print_time, get_materials
+
+@st.cache_data(show_spinner="Slicing model...", max_entries=64)
+def sliced_print_time(cache_key, _mesh, layer_height, infill_density):
+    """Slice once per upload and settings; the mesh itself is identified by cache_key"""
+    return estimate_print_time(
+        _mesh.volume, layer_height=layer_height, infill_density=infill_density, mesh=_mesh
+    )
+
+@st.cache_data(show_spinner="Checking mesh...", max_entries=64)
+def validated_volume(cache_key, _mesh, volume_cm3):
+    """Check the mesh once per upload; broken meshes get a ray-parity volume"""
+    return validate_mesh(_mesh.vertices, _mesh.faces, volume_cm3)
+
+@st.cache_data(show_spinner="Finding overhangs...", max_entries=64)
+def overhang_analysis(cache_key, _mesh, overhang_angle):
+    """Overhangs and the space under them, once per upload and angle"""
+    return analyse_overhangs(_mesh.vertices, _mesh.faces, overhang_angle=overhang_angle)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def part_footprint(cache_key, _mesh):
+    """Convex hull of the mesh seen from above, and its height (mm)"""
+    vertices = np.asarray(_mesh.vertices)
+    return footprint_hull(vertices), float(vertices[:, 2].max() - vertices[:, 2].min())
+
+@st.cache_data(show_spinner="Nesting parts...", max_entries=16)
+def nested_plates(part_keys, _parts, bed, spacing_mm):
+    """Nest once per set of parts and copies; part_keys identifies _parts"""
+    return nest_parts(_parts, bed[:2], build_height_mm=bed[2], spacing_mm=spacing_mm)
+
+def style_breakdown(breakdown_data):
+    """Cost breakdown table in the app's dark theme"""
+    return (
+        pd.DataFrame(breakdown_data).style
+        .hide(axis='index')
+        .set_properties(**{
+            'background-color': '#22272e',
+            'color': '#fff',
+            'border-color': '#22272e',
+            'font-size': '1.1em'
+        })
+        .set_table_styles([
+            {'selector': 'th', 'props': [
+                ('background-color', '#1a1d23'),
+                ('color', '#4CAF50'),
+                ('font-size', '1.1em'),
+                ('text-align', 'left')
+            ]}
+        ])
+    )
+
+def file_graph(file_id):
+    """
+    The quote pipeline of one upload, kept for the session so a rerun only
+    recomputes the nodes whose inputs changed
+    """
+    graphs = st.session_state.pipelines
+    if file_id not in graphs:
+        graph = quote_graph()
+
+        @graph.node()
+        def parsed(upload, file_type, cache_key, job):
+            entry = job.get("entry")
+            if entry is not None:
+                # Too big for the parse cache; the job's own mesh saves parsing it again
+                return entry.volume_cm3, dict(entry.bbox), entry.mesh
+            upload.seek(0)
+            return parse_3d_file(upload, file_type, cache=get_parse_cache(), cache_key=cache_key)
+
+        graph.add("validation", lambda cache_key, parsed: validated_volume(cache_key, parsed[2], parsed[0]))
+        graph.add("preview", lambda cache_key, parsed, face_budget: build_preview(
+            parsed[2], face_budget=face_budget, key=cache_key
+        ))
+        graph.add("figure", build_preview_figure, ["preview"])
+        graph.add("print_estimate", lambda cache_key, parsed, layer_height, infill_density: sliced_print_time(
+            cache_key, parsed[2], layer_height, infill_density
+        ))
+        graph.add("overhangs", lambda cache_key, parsed, overhang_angle: overhang_analysis(
+            cache_key, parsed[2], overhang_angle
+        ))
+        graph.add("breakdown_table", style_breakdown, ["breakdown_data"])
+        graphs[file_id] = graph
+    return graphs[file_id]
+
+def completed_uploads(tabs, uploaded_files, futures, parse_jobs):
+    """
+    Yield (tab, upload, future) in the order the parse jobs finish, keeping a
+    status line in each tab that is still waiting
+    """
+    started = time.monotonic()
+    waiting = []
+    for tab, uploaded_file in zip(tabs, uploaded_files):
+        with tab:
+            waiting.append((tab, uploaded_file, st.empty()))
+    while waiting:
+        wait([futures[f.file_id] for _, f, _ in waiting], timeout=0.25, return_when=FIRST_COMPLETED)
+        still_waiting = []
+        for tab, uploaded_file, status in waiting:
+            future = futures[uploaded_file.file_id]
+            state = parse_jobs.status(future)
+            if state == "done":
+                status.empty()
+                yield tab, uploaded_file, future
+            else:
+                # Also lets Streamlit stop this run promptly when the uploads change
+                status.info(
+                    f"Parsing {uploaded_file.name}... {time.monotonic() - started:.0f}s" if state == "running"
+                    else f"Queued {uploaded_file.name}..."
+                )
+                still_waiting.append((tab, uploaded_file, status))
+        waiting = still_waiting
 
 # Add near the top of your app
 if 'advanced_settings' not in st.session_state:
     st.session_state.advanced_settings = False
+# Upload file_id -> parse cache key, so reruns don't re-hash large uploads
+if 'parse_cache_keys' not in st.session_state:
+    st.session_state.parse_cache_keys = {}
+# Identifies this session's jobs in the shared parse pool
+if 'parse_owner' not in st.session_state:
+    st.session_state.parse_owner = uuid4().hex
+
+# Upload file_id -> its quote pipeline (see file_graph)
+if 'pipelines' not in st.session_state:
+    st.session_state.pipelines = {}
 
 st.set_page_config(page_title="3D Printer Cost Estimator", layout="centered")
 st.title("3D Printer Cost Estimator")
@@ -28,248 +168,15 @@ uk_rates = {
     "Smart Meter Off-Peak (0.25£/kWh)": 0.25,
     "Custom": None
 }
-# --- 3D Printer Power Mapping ---
-printer_power_dict = {
-    "Bambu Lab": {
-        "A1": 100, "A1 Mini": 100, "P1P": 85, "P1S": 85, "X1 Carbon": 95, "X1E": 95
-    },
-    "Prusa Research": {
-        "Prusa MK4": 90, "Prusa MK3S+": 90, "Prusa Mini+": 90, "Prusa XL": 130
-    },
-    "Creality": {
-        "Ender-3 V3 SE": 110, "Ender-3 V3 NEO": 110, "Ender-3 V3 S1": 110, "Ender-5 Plus": 130, "K1": 150, "K1 Max": 150, "CR-10 Smart Pro": 150, "CR-M4": 150
-    },
-    "Anycubic": {
-        "Kobra 2": 100, "Kobra 2 Pro": 100, "Kobra 2 Max": 100, "Vyper": 90, "Chiron": 130
-    },
-    "Elegoo": {
-        "Neptune 4": 100, "Neptune 4 Pro": 100, "Neptune 4 Max":
-          100, "Neptune 3 Plus": 100
-    },
-    "Artillery": {
-        "Sidewinder X2": 130, "Sidewinder X3": 130, "Genius Pro": 110
-    },
-    "Raise3D": {
-        "E2": 200, "Pro2": 200, "Pro3": 200
-    },
-    "Flashforge": {
-        "Adventurer 5M": 130, "Creator Pro 2": 130, "Guider IIs": 200
-    },
-    "Snapmaker": {
-        "Snapmaker 2.0 A150": 150, "Snapmaker 2.0 A250": 150, "Snapmaker 2.0 A350": 150, "Snapmaker Artisan": 200
-    },
-    "Qidi Tech": {
-        "X-Smart 3": 110, "X-Plus 3": 200, "X-Max 3": 200
-    },
-    "Ultimaker": {
-        "Ultimaker S3": 250, "Ultimaker S5": 250
-    },
-    "Voxelab": {
-        "Aquila": 110, "Aquila X2": 110, "Aquila D1": 110
-    },
-    "MakerBot": {
-        "Sketch": 100, "Method X": 250
-    },
-    "LulzBot": {
-        "Mini 2": 130, "Taz Workhorse": 200, "Taz Pro": 200
-    }
-}
-# --- 3D Printer Selection (Make → Model) ---
-printer_dict = {
-    "Bambu Lab": ["A1", "A1 Mini", "P1P", "P1S", "X1 Carbon", "X1E"],
-    "Prusa Research": ["Prusa MK4", "Prusa MK3S+", "Prusa Mini+", "Prusa XL"],
-    "Creality": ["Ender-3 V3 SE / NEO / S1", "Ender-5 Plus", "K1", "K1 Max", "CR-10 Smart Pro", "CR-M4"],
-    "Anycubic": ["Kobra 2 / 2 Pro / 2 Max", "Vyper", "Chiron"],
-    "Elegoo": ["Neptune 4", "Neptune 4 Pro", "Neptune 4 Max", "Neptune 3 Plus"],
-    "Artillery": ["Sidewinder X2", "Sidewinder X3", "Genius Pro"],
-    "Raise3D": ["E2", "Pro2", "Pro3"],
-    "Flashforge": ["Adventurer 5M", "Creator Pro 2", "Guider IIs"],
-    "Snapmaker": ["Snapmaker 2.0 A150 / A250 / A350", "Snapmaker Artisan"],
-    "Qidi Tech": ["X-Smart 3", "X-Plus 3", "X-Max 3"],
-    "Ultimaker": ["Ultimaker S3", "Ultimaker S5"],
-    "Voxelab": ["Aquila", "Aquila X2", "Aquila D1"],
-    "MakerBot": ["Sketch", "Method X"],
-    "LulzBot": ["Mini 2", "Taz Workhorse", "Taz Pro"]
+# Rates that are one band of a time-of-use tariff (utils/tariffs.py)
+uk_rate_tariffs = {
+    "Economy 7 Day (0.39£/kWh)": "Economy 7",
+    "Economy 7 Night (0.20£/kWh)": "Economy 7",
+    "Smart Meter Peak (0.40£/kWh)": "Smart Meter",
+    "Smart Meter Off-Peak (0.25£/kWh)": "Smart Meter"
 }
-# Build a display list for models with power values
-printer_display_dict = {}
-for make, models in printer_dict.items():
-    display_models = []
-    for m in models:
-        # For grouped models, pick the first matching model in the power dict
-        if "/" in m:
-            # Split by / and strip whitespace
-            submodels = [s.strip() for s in m.split("/")]
-            # Find the first submodel with a power value
-            power = None
-            for sub in submodels:
-                if sub in printer_power_dict.get(make, {}):
-                    power = printer_power_dict[make][sub]
-                    break
-            # If not found, fallback to None
-        else:
-            power = printer_power_dict.get(make, {}).get(m)
-        if power:
-            display_models.append(f"{m} ({power}W)")
-        else:
-            display_models.append(m)
-    printer_display_dict[make] = display_models
-
-# --- Material Properties ---
-MATERIALS = {
-    "PLA": {
-        "density": 1.24,       # g/cm³
-        "cost_per_kg": 25.00,  # £/kg
-        "diameters": [1.75, 2.85]
-    },
-    "PETG": {
-        "density": 1.27,
-        "cost_per_kg": 30.00,
-        "diameters": [1.75, 2.85]
-    },
-    "ABS": {
-        "density": 1.01,
-        "cost_per_kg": 20.00,
-        "diameters": [1.75, 2.85]
-    },
-    "TPU": {
-        "density": 1.21,
-        "cost_per_kg": 35.00,
-        "diameters": [1.75, 2.85]
-    },
-    "Nylon": {
-        "density": 1.02,
-        "cost_per_kg": 100.00,
-        "diameters": [1.75, 2.85]
-    },
-    "PC": {
-        "density": 1.19,
-        "cost_per_kg": 40.00,
-        "diameters": [1.75, 2.85]
-    },
-    "ASA": {
-        "density": 1.08,
-        "cost_per_kg": 30.00,
-        "diameters": [1.75, 2.85]
-    },
-    "PVA": {
-        "density": 1.23,
-        "cost_per_kg": 40.00,
-        "diameters": [1.75]  # Usually only in 1.75 mm for support material
-    },
-    "HIPS": {
-        "density": 1.04,
-        "cost_per_kg": 35.00,
-        "diameters": [1.75, 2.85]  # Some brands do both, often used for supports
-    },
-    "Carbon Fiber (PLA‑based)": {
-        "density": 1.19,
-        "cost_per_kg": 65.00,
-        "diameters": [1.75, 2.85]
-    }
-}
-
-# --- Printer Details Dictionary ---
-printer_details_dict = {
-    "Bambu Lab": {
-        "A1": {"cost": 499, "upgrades": 50, "maintenance": 50, "lifetime_hours": 5000, "avg_power_watts": 100, "cost_per_kwh": 0.15},
-        "A1 Mini": {"cost": 399, "upgrades": 50, "maintenance": 50, "lifetime_hours": 5000, "avg_power_watts": 100, "cost_per_kwh": 0.15},
-        "P1P": {"cost": 599, "upgrades": 75, "maintenance": 50, "lifetime_hours": 5000, "avg_power_watts": 85, "cost_per_kwh": 0.15},
-        "P1S": {"cost": 699, "upgrades": 75, "maintenance": 50, "lifetime_hours": 5000, "avg_power_watts": 85, "cost_per_kwh": 0.15},
-        "X1 Carbon": {"cost": 1199, "upgrades": 100, "maintenance": 100, "lifetime_hours": 5000, "avg_power_watts": 95, "cost_per_kwh": 0.15},
-        "X1E": {"cost": 1399, "upgrades": 100, "maintenance": 100, "lifetime_hours": 5000, "avg_power_watts": 95, "cost_per_kwh": 0.15}
-    },
-    "Prusa Research": {
-        "Prusa MK4": {"cost": 799, "upgrades": 100, "maintenance": 75, "lifetime_hours": 5000, "avg_power_watts": 90, "cost_per_kwh": 0.15},
-        "Prusa MK3S+": {"cost": 749, "upgrades": 100, "maintenance": 75, "lifetime_hours": 5000, "avg_power_watts": 90, "cost_per_kwh": 0.15},
-        "Prusa Mini+": {"cost": 399, "upgrades": 50, "maintenance": 50, "lifetime_hours": 5000, "avg_power_watts": 90, "cost_per_kwh": 0.15},
-        "Prusa XL": {"cost": 1999, "upgrades": 200, "maintenance": 150, "lifetime_hours": 5000, "avg_power_watts": 130, "cost_per_kwh": 0.15}
-    },
-    "Creality": {
-        "Ender-3 V3 SE": {"cost": 229, "upgrades": 100, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 110, "cost_per_kwh": 0.15},
-        "Ender-3 V3 NEO": {"cost": 279, "upgrades": 100, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 110, "cost_per_kwh": 0.15},
-        "Ender-3 V3 S1": {"cost": 329, "upgrades": 100, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 110, "cost_per_kwh": 0.15},
-        "Ender-5 Plus": {"cost": 579, "upgrades": 150, "maintenance": 75, "lifetime_hours": 4000, "avg_power_watts": 130, "cost_per_kwh": 0.15},
-        "K1": {"cost": 399, "upgrades": 100, "maintenance": 75, "lifetime_hours": 4000, "avg_power_watts": 150, "cost_per_kwh": 0.15},
-        "K1 Max": {"cost": 599, "upgrades": 150, "maintenance": 75, "lifetime_hours": 4000, "avg_power_watts": 150, "cost_per_kwh": 0.15},
-        "CR-10 Smart Pro": {"cost": 499, "upgrades": 150, "maintenance": 75, "lifetime_hours": 4000, "avg_power_watts": 150, "cost_per_kwh": 0.15},
-        "CR-M4": {"cost": 999, "upgrades": 200, "maintenance": 100, "lifetime_hours": 4000, "avg_power_watts": 150, "cost_per_kwh": 0.15}
-    },
-    "Anycubic": {
-        "Kobra 2": {"cost": 299, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 100, "cost_per_kwh": 0.15},
-        "Kobra 2 Pro": {"cost": 349, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 100, "cost_per_kwh": 0.15},
-        "Kobra 2 Max": {"cost": 399, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 100, "cost_per_kwh": 0.15},
-        "Vyper": {"cost": 349, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 90, "cost_per_kwh": 0.15},
-        "Chiron": {"cost": 499, "upgrades": 75, "maintenance": 75, "lifetime_hours": 4000, "avg_power_watts": 130, "cost_per_kwh": 0.15}
-    },
-    "Elegoo": {
-        "Neptune 4": {"cost": 249, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 100, "cost_per_kwh": 0.15},
-        "Neptune 4 Pro": {"cost": 299, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 100, "cost_per_kwh": 0.15},
-        "Neptune 4 Max": {"cost": 349, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 100, "cost_per_kwh": 0.15},
-        "Neptune 3 Plus": {"cost": 199, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 100, "cost_per_kwh": 0.15}
-    },
-    "Artillery": {
-        "Sidewinder X2": {"cost": 399, "upgrades": 75, "maintenance": 75, "lifetime_hours": 4000, "avg_power_watts": 130, "cost_per_kwh": 0.15},
-        "Sidewinder X3": {"cost": 499, "upgrades": 100, "maintenance": 100, "lifetime_hours": 4000, "avg_power_watts": 130, "cost_per_kwh": 0.15},
-        "Genius Pro": {"cost": 349, "upgrades": 75, "maintenance": 75, "lifetime_hours": 4000, "avg_power_watts": 110, "cost_per_kwh": 0.15}
-    },
-    "Raise3D": {
-        "E2": {"cost": 1999, "upgrades": 200, "maintenance": 150, "lifetime_hours": 5000, "avg_power_watts": 200, "cost_per_kwh": 0.15},
-        "Pro2": {"cost": 2499, "upgrades": 250, "maintenance": 200, "lifetime_hours": 5000, "avg_power_watts": 200, "cost_per_kwh": 0.15},
-        "Pro3": {"cost": 2999, "upgrades": 300, "maintenance": 250, "lifetime_hours": 5000, "avg_power_watts": 200, "cost_per_kwh": 0.15}
-    },
-    "Flashforge": {
-        "Adventurer 5M": {"cost": 499, "upgrades": 75, "maintenance": 75, "lifetime_hours": 4000, "avg_power_watts": 130, "cost_per_kwh": 0.15},
-        "Creator Pro 2": {"cost": 599, "upgrades": 100, "maintenance": 100, "lifetime_hours": 4000, "avg_power_watts": 130, "cost_per_kwh": 0.15},
-        "Guider IIs": {"cost": 699, "upgrades": 150, "maintenance": 150, "lifetime_hours": 4000, "avg_power_watts": 200, "cost_per_kwh": 0.15}
-    },
-    "Snapmaker": {
-        "Snapmaker 2.0 A150": {"cost": 699, "upgrades": 100, "maintenance": 100, "lifetime_hours": 5000, "avg_power_watts": 150, "cost_per_kwh": 0.15},
-        "Snapmaker 2.0 A250": {"cost": 799, "upgrades": 100, "maintenance": 100, "lifetime_hours": 5000, "avg_power_watts": 150, "cost_per_kwh": 0.15},
-        "Snapmaker 2.0 A350": {"cost": 899, "upgrades": 100, "maintenance": 100, "lifetime_hours": 5000, "avg_power_watts": 150, "cost_per_kwh": 0.15},
-        "Snapmaker Artisan": {"cost": 1299, "upgrades": 150, "maintenance": 150, "lifetime_hours": 5000, "avg_power_watts": 200, "cost_per_kwh": 0.15}
-    },
-    "Qidi Tech": {
-        "X-Smart 3": {"cost": 249, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 110, "cost_per_kwh": 0.15},
-        "X-Plus 3": {"cost": 599, "upgrades": 100, "maintenance": 75, "lifetime_hours": 4000, "avg_power_watts": 200, "cost_per_kwh": 0.15},
-        "X-Max 3": {"cost": 699, "upgrades": 150, "maintenance": 100, "lifetime_hours": 4000, "avg_power_watts": 200, "cost_per_kwh": 0.15}
-    },
-    "Ultimaker": {
-        "Ultimaker S3": {"cost": 2495, "upgrades": 300, "maintenance": 200, "lifetime_hours": 5000, "avg_power_watts": 250, "cost_per_kwh": 0.15},
-        "Ultimaker S5": {"cost": 3995, "upgrades": 500, "maintenance": 300, "lifetime_hours": 5000, "avg_power_watts": 250, "cost_per_kwh": 0.15}
-    },
-    "Voxelab": {
-        "Aquila": {"cost": 199, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 110, "cost_per_kwh": 0.15},
-        "Aquila X2": {"cost": 249, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 110, "cost_per_kwh": 0.15},
-        "Aquila D1": {"cost": 299, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 110, "cost_per_kwh": 0.15}
-    },
-    "MakerBot": {
-        "Sketch": {"cost": 349, "upgrades": 50, "maintenance": 50, "lifetime_hours": 4000, "avg_power_watts": 100, "cost_per_kwh": 0.15},
-        "Method X": {"cost": 599, "upgrades": 100, "maintenance": 75, "lifetime_hours": 5000, "avg_power_watts": 250, "cost_per_kwh": 0.15}
-    },
-    "LulzBot": {
-        "Mini 2": {"cost": 1499, "upgrades": 200, "maintenance": 150, "lifetime_hours": 5000, "avg_power_watts": 130, "cost_per_kwh": 0.15},
-        "Taz Workhorse": {"cost": 1999, "upgrades": 250, "maintenance": 200, "lifetime_hours": 5000, "avg_power_watts": 200, "cost_per_kwh": 0.15},
-        "Taz Pro": {"cost": 2499, "upgrades": 300, "maintenance": 250, "lifetime_hours": 5000, "avg_power_watts": 200, "cost_per_kwh": 0.15}
-    }
-}
-
-# Add after your imports and before the main code
-def calc_depreciation_cost(printer_details, print_time_hr):
-    """Calculate depreciation cost for a print job."""
-    if not printer_details:
-        return 0.0
-    
-    total_cost = (
-        printer_details["cost"] + 
-        printer_details["upgrades"] + 
-        printer_details["maintenance"]
-    )
-    
-    print_time_min = print_time_hr * 60
-    depreciation_per_minute = total_cost / (printer_details["lifetime_hours"] * 60)
-    
-    return depreciation_per_minute * print_time_min
+# --- Printers and materials (material_db/*.json, reloaded when the files change) ---
+catalog = get_catalog()
 
 with st.sidebar:
     # --- General Settings ---
@@ -315,40 +222,50 @@ with st.sidebar:
     else:
         electricity_rate = uk_rates[electricity_rate_label] * rate
 
+    tariff_name = uk_rate_tariffs.get(electricity_rate_label)
+    tariff = None
+    if tariff_name and st.checkbox(
+        f"Price by time of day ({tariff_name})",
+        value=True,
+        help="Charge each half hour of the print at the tariff's rate for that time instead of one flat rate"
+    ):
+        tariff = TARIFFS[tariff_name] * rate
+
     # --- Printer Selection ---
     st.markdown("## Printer Details")
     make = st.selectbox(
         "Manufacturer",
-        options=list(printer_display_dict.keys()),
+        options=catalog.makes,
         help="Select the printer manufacturer"
     )
     
     model_display = st.selectbox(
         "Model",
-        options=printer_display_dict[make],
+        options=catalog.model_labels[make],
         help="Select the specific printer model"
     )
-
-    # Extract model name (remove power info)
-    model = model_display.split(" (")[0] if " (" in model_display else model_display
+    model = catalog.model_for_label[make][model_display]
 
     # --- Material Selection ---
     st.markdown("## Material")
     material = st.selectbox(
         "Type",
-        options=list(MATERIALS.keys()),
+        options=catalog.material_names,
         help="Choose filament material type"
     )
+    material_props = catalog.materials[material]
+    if material_props.get('notes'):
+        st.caption(material_props['notes'])
     
     diameter = st.selectbox(
         "Diameter (mm)",
-        options=MATERIALS[material]['diameters'],
+        options=material_props['diameters'],
         help="Select filament diameter"
     )
 
     # Material cost settings
-    density = MATERIALS[material]['density']
-    base_cost = MATERIALS[material]['cost_per_kg'] * rate
+    density = material_props['density']
+    base_cost = material_props['cost_per_kg'] * rate
     
     custom_material_cost = st.checkbox(
         "Use custom material cost",
@@ -368,7 +285,7 @@ with st.sidebar:
 
     # --- Advanced Settings ---
     with st.expander("Advanced Settings"):
-        default_details = printer_details_dict.get(make, {}).get(model, {})
+        default_details = catalog.printers[make][model]
         
         st.markdown("### Printer Configuration")
         custom_printer_cost = st.number_input(
@@ -411,212 +328,459 @@ with st.sidebar:
                 step=5
             )
 
+        st.markdown("### Preview")
+        preview_face_budget = st.select_slider(
+            "Preview detail (faces)",
+            options=PREVIEW_FACE_BUDGETS,
+            value=DEFAULT_FACE_BUDGET,
+            format_func=lambda n: f"{n:,}",
+            help="Large models are simplified for the 3D preview. Volume and cost always use the full model."
+        )
+
+        st.markdown("### Diagnostics")
+        show_metrics = st.checkbox(
+            "Show performance debug panel",
+            key="show_metrics",
+            help="Time each stage of this page's quotes"
+        )
+        track_memory = st.checkbox(
+            "Track peak memory (slower)",
+            key="track_memory",
+            disabled=not show_metrics,
+            help="Uses tracemalloc for every session on this server while enabled"
+        )
+        # Counted per session, so one session can't switch off another's tracking
+        metrics.track_memory(st.session_state.parse_owner, show_metrics and track_memory)
+
+    # --- Saved quotes (utils/quote_store.py) ---
+    st.markdown("## Saved Quotes")
+    customer = st.text_input("Customer", key="customer", help="Quotes saved from each file's tab are filed under this name")
+
 # Set power based on selection or advanced settings
 if show_advanced := st.session_state.get('advanced_settings', False):
     power = power_watt
 else:
-    power = printer_power_dict.get(make, {}).get(model, 120)
+    power = catalog.printers[make][model]["avg_power_watts"]
 
 # --- Main: STL Upload and Processing ---
 st.subheader("Upload 3D Model Files")
 uploaded_files = st.file_uploader(
     "Upload your 3D model files", 
-    type=["stl", "obj", "3mf"],
+    type=["stl", "obj", "3mf", "gcode"],
     accept_multiple_files=True,
-    help="Supported formats: STL, OBJ, 3MF"
+    help="Supported formats: STL, OBJ, 3MF, or sliced G-code"
 )
 
+# File name -> stage timings for this rerun, shown in the debug panel at the bottom
+traces = {}
+# File name -> its quote pipeline, for per-node hits and misses in the same panel
+graphs_shown = {}
+
 if uploaded_files:
     # Create tabs for each uploaded file
     tabs = st.tabs([f.name for f in uploaded_files])
-    
+
+    # Queue every upload for parsing up front, then render each tab as soon
+    # as its own file is ready
+    parse_cache = get_parse_cache()
+    parse_jobs = get_parse_jobs()
+    futures = {}
+    job_keys = []
+    for uploaded_file in uploaded_files:
+        if show_metrics:
+            traces[uploaded_file.name] = metrics.start_trace()
+        file_extension = uploaded_file.name.split('.')[-1].lower()
+        cache_key = st.session_state.parse_cache_keys.get(uploaded_file.file_id)
+        if cache_key is None:
+            with metrics.span("upload.hash"):
+                cache_key = parse_cache.make_key(uploaded_file.getvalue(), file_extension)
+            st.session_state.parse_cache_keys[uploaded_file.file_id] = cache_key
+        # The selectbox below hasn't run yet; its value from the last rerun picks the job
+        filament_diameter = st.session_state.get(f"filament_diameter_{uploaded_file.file_id}", 1.75)
+        futures[uploaded_file.file_id] = parse_jobs.submit(
+            st.session_state.parse_owner, cache_key, uploaded_file.getvalue, file_extension, filament_diameter
+        )
+        job_keys.append(parse_jobs.job_key(cache_key, file_extension, filament_diameter))
+    # Drop queued jobs for files removed since the last rerun
+    parse_jobs.release(st.session_state.parse_owner, keep=job_keys)
+    # and their pipelines
+    current_ids = {f.file_id for f in uploaded_files}
+    for file_id in list(st.session_state.pipelines):
+        if file_id not in current_ids:
+            del st.session_state.pipelines[file_id]
+    # Mesh parts and their copies, nested onto build plates after the tabs
+    plate_parts = []
+    plate_keys = []
+
     # Process each file in its own tab
-    for tab, uploaded_file in zip(tabs, uploaded_files):
+    for tab, uploaded_file, future in completed_uploads(tabs, uploaded_files, futures, parse_jobs):
+        if show_metrics:
+            metrics.start_trace(traces[uploaded_file.name])
         with tab:
             try:
                 # Parse file and get volume
                 file_extension = uploaded_file.name.split('.')[-1].lower()
-                volume_cm3, bbox, mesh = parse_3d_file(uploaded_file, file_extension)
-                st.success(f"Volume: {volume_cm3:.2f} cm³")
-
-                # Convert volume for later use
-                volume_mm3 = volume_cm3 * 1000  # convert cm³ to mm³
-
-                # Reset file pointer for preview
-                uploaded_file.seek(0)
-
-                # --- 3D Preview (Interactive) ---
-                st.subheader("3D Preview")
-                import plotly.graph_objects as go
-                import numpy as np
-
-                # Extract vertices and faces
-                x, y, z = mesh.vertices.T
-                i, j, k = mesh.faces.T
-
-                # Fix orientation and scaling
-                def fix_mesh_orientation(x, y, z):
-                    # Calculate bounding box
-                    x_min, x_max = np.min(x), np.max(x)
-                    y_min, y_max = np.min(y), np.max(y)
-                    z_min, z_max = np.min(z), np.max(z)
-                    
-                    # Calculate dimensions
-                    dx = x_max - x_min
-                    dy = y_max - y_min
-                    dz = z_max - z_min
-                    
-                    # Scale to uniform size (e.g., max dimension = 10 units)
-                    max_dim = max(dx, dy, dz)
-                    scale = 10.0 / max_dim if max_dim > 0 else 1.0
-                    
-                    x_scaled = x * scale
-                    y_scaled = y * scale
-                    z_scaled = z * scale
-                    
-                    # Center the model
-                    x_center = (np.max(x_scaled) + np.min(x_scaled)) / 2
-                    y_center = (np.max(y_scaled) + np.min(y_scaled)) / 2
-                    z_center = (np.max(z_scaled) + np.min(z_scaled)) / 2
-                    
-                    return (x_scaled - x_center, 
-                           y_scaled - y_center, 
-                           z_scaled - z_center)
-
-                # Apply fixes
-                x, y, z = fix_mesh_orientation(x, y, z)
-
-                # Create the 3D mesh figure
-                fig = go.Figure(data=[
-                    go.Mesh3d(
-                        x=x, y=y, z=z,
-                        i=i, j=j, k=k,
-                        color='#00E5FF',  # Cyan color
-                        opacity=1.0,      # Full opacity
-                        lighting=dict(
-                            ambient=0.6,
-                            diffuse=0.8,
-                            specular=0.2,
-                            roughness=0.5
-                        ),
-                        lightposition=dict(
-                            x=100,
-                            y=200,
-                            z=150
-                        )
+                cache_key = st.session_state.parse_cache_keys[uploaded_file.file_id]
+                parsed = future.result()
+                if show_metrics:
+                    traces[uploaded_file.name].extend(parsed["trace"])
+                # (print time, caption) when the upload already carries slicer results
+                sliced = None
+                support_volume = 0.0
+                support_cost = 0.0
+                support_material = material
+                graph = file_graph(uploaded_file.file_id)
+                # Hits and misses of this rerun only, for the debug panel
+                graph.reset_stats()
+                if show_metrics:
+                    graphs_shown[uploaded_file.name] = graph
+                # Identifies the geometry behind a saved quote (per plate and filament for sliced files)
+                geometry_key = cache_key
+                bbox = None
+                plates = parsed.get("plates")
+                if file_extension == "gcode":
+                    filament_diameter = st.selectbox(
+                        "Filament Diameter (mm)",
+                        options=[1.75, 2.85],
+                        key=f"filament_diameter_{uploaded_file.file_id}"
                     )
-                ])
-
-                # Update layout with better camera positioning
-                fig.update_layout(
-                    scene=dict(
-                        aspectmode='data',
-                        camera=dict(
-                            up=dict(x=0, y=1, z=0),  # Set up vector
-                            center=dict(x=0, y=0, z=0),  # Look at center
-                            eye=dict(x=1.5, y=1.5, z=1.5)  # Camera position
-                        ),
-                        xaxis=dict(range=[-5, 5]),
-                        yaxis=dict(range=[-5, 5]),
-                        zaxis=dict(range=[-5, 5])
-                    ),
-                    margin=dict(l=0, r=0, b=0, t=0)
-                )
+                    gcode_result = parsed["gcode"]
+                    volume_cm3 = gcode_result["filament_volume_cm3"]
+                    st.success(
+                        f"Filament: {gcode_result['filament_length_mm'] / 1000:.2f} m "
+                        f"({volume_cm3:.2f} cm³)"
+                    )
+                    details = gcode_result["details"]
+                    caption = f"Simulated from {details['moves']:,} moves over {details['layers']} layers"
+                    if details["slicer_time_hours"] is not None:
+                        caption += f"; the slicer estimated {details['slicer_time_hours']:.1f}h"
+                    sliced = (gcode_result["print_time_hours"], caption)
+                    geometry_key = f"{cache_key}:{filament_diameter}"
+                elif plates:
+                    # Sliced Bambu/Orca project: use the slicer's own numbers, skip the meshes
+                    plate = plates[0]
+                    if len(plates) > 1:
+                        plate = st.selectbox(
+                            "Plate",
+                            options=plates,
+                            format_func=lambda p: f"Plate {p['plate']}",
+                            key=f"plate_{uploaded_file.file_id}"
+                        )
+                    volume_cm3 = plate["weight_g"] / density
+                    st.success(f"Plate {plate['plate']}: {plate['weight_g']:.1f} g of filament ({volume_cm3:.2f} cm³)")
+                    if plate["thumbnail"]:
+                        st.image(plate["thumbnail"], caption=f"Plate {plate['plate']}")
+                    sliced = (plate["print_time_hours"], f"From the slicer results saved in the project (plate {plate['plate']})")
+                    # The volume comes from the plate's weight, so it depends on the density too
+                    geometry_key = f"{cache_key}:plate{plate['plate']}:{density}"
+                else:
+                    graph.set("upload", uploaded_file, key=cache_key)
+                    # Holding the job keeps an oversized mesh shared for later reruns
+                    graph.set("job", parsed, key=cache_key)
+                    graph.update(file_type=file_extension, cache_key=cache_key, face_budget=preview_face_budget)
+                    with metrics.span("parse", file_type=file_extension):
+                        volume_cm3, bbox, mesh = graph["parsed"]
+                    with metrics.span("validate"):
+                        validation = graph["validation"]
+                    if validation["method"] == "signed":
+                        st.success(f"Volume: {volume_cm3:.2f} cm³")
+                    else:
+                        # Holes or flipped faces make the signed volume unreliable
+                        volume_cm3 = validation["volume_cm3"]
+                        problems = [
+                            f"{validation[key]:,} {singular if validation[key] == 1 else plural}"
+                            for key, singular, plural in [
+                                ("boundary_loops", "hole", "holes"),
+                                ("inconsistent_edges", "edge with flipped faces", "edges with flipped faces"),
+                                ("non_manifold_edges", "non-manifold edge", "non-manifold edges")
+                            ]
+                            if validation[key]
+                        ]
+                        st.warning(
+                            f"Volume: {volume_cm3:.2f} cm³ (measured by ray casting, "
+                            f"{validation['confidence']:.0%} confidence). The mesh has {', '.join(problems)}; "
+                            f"its surface volume would be {validation['signed_volume_cm3']:.2f} cm³."
+                        )
 
-                st.plotly_chart(fig, use_container_width=True)
+                    # Convert volume for later use
+                    volume_mm3 = volume_cm3 * 1000  # convert cm³ to mm³
+
+                    # --- 3D Preview (Interactive) ---
+                    # Decimated to the face budget; costs still use the full mesh
+                    st.subheader("3D Preview")
+                    with metrics.span("preview.decimate"):
+                        preview = graph["preview"]
+                    with metrics.span("preview.figure"):
+                        fig = graph["figure"]
+                    with metrics.span("preview.render"):
+                        st.plotly_chart(fig, use_container_width=True)
+                    if preview.decimated:
+                        st.caption(f"Preview simplified to {len(preview.faces):,} of {preview.source_faces:,} faces")
 
-                # --- Cost Calculations ---
-                # Calculate material cost
-                material_cost = calc_material_cost(volume_cm3, density, cost_per_kg)
-                
                 # --- Print Time Input ---
                 st.markdown("### Print Duration")
-                col_time1, col_time2 = st.columns(2)
-                with col_time1:
-                    print_hours = st.number_input(
-                        "Hours",
-                        min_value=0,
-                        value=0,
-                        step=1,
-                        help="Enter the print duration hours from your slicer"
-                    )
-                with col_time2:
-                    print_minutes = st.number_input(
-                        "Minutes",
-                        min_value=0,
-                        max_value=59,
-                        value=0,
-                        step=1,
-                        help="Enter the print duration minutes from your slicer"
+                if sliced is not None:
+                    print_time_hr, caption = sliced
+                    st.caption(caption)
+                else:
+                    time_source = st.radio(
+                        "Print time source",
+                        options=["Estimate from model", "Enter from slicer"],
+                        horizontal=True,
+                        key=f"time_source_{uploaded_file.file_id}",
+                        help="Slice the model here for an estimate, or enter the time your slicer reports"
                     )
+                    if time_source == "Estimate from model":
+                        col_time1, col_time2 = st.columns(2)
+                        with col_time1:
+                            layer_height = st.selectbox(
+                                "Layer Height (mm)",
+                                options=[0.08, 0.12, 0.16, 0.2, 0.28],
+                                index=3,
+                                key=f"layer_height_{uploaded_file.file_id}"
+                            )
+                        with col_time2:
+                            infill_density = st.slider(
+                                "Infill (%)",
+                                min_value=0,
+                                max_value=100,
+                                value=20,
+                                step=5,
+                                key=f"infill_{uploaded_file.file_id}"
+                            )
+                        graph.update(layer_height=layer_height, infill_density=infill_density)
+                        with metrics.span("print_time.sliced"):
+                            estimate = graph["print_estimate"]
+                        if "error" in estimate:
+                            st.warning(f"Could not estimate print time: {estimate['error']}")
+                            print_time_hr = 0.0
+                        else:
+                            print_time_hr = estimate["print_time_hours"]
+                            st.caption(
+                                f"Sliced into {estimate['details']['layers']} layers "
+                                f"at {layer_height} mm. Slicer times are more accurate."
+                            )
+                    else:
+                        col_time1, col_time2 = st.columns(2)
+                        with col_time1:
+                            print_hours = st.number_input(
+                                "Hours",
+                                min_value=0,
+                                value=0,
+                                step=1,
+                                key=f"print_hours_{uploaded_file.file_id}",
+                                help="Enter the print duration hours from your slicer"
+                            )
+                        with col_time2:
+                            print_minutes = st.number_input(
+                                "Minutes",
+                                min_value=0,
+                                max_value=59,
+                                value=0,
+                                step=1,
+                                key=f"print_minutes_{uploaded_file.file_id}",
+                                help="Enter the print duration minutes from your slicer"
+                            )
 
-                # Calculate total print time in hours
-                print_time_hr = print_hours + (print_minutes / 60)
+                        # Calculate total print time in hours
+                        print_time_hr = print_hours + (print_minutes / 60)
 
-                # Add instructions for users
-                with st.expander("How to find print time & configure settings"):
-                    st.markdown("""
-                        ### Getting Accurate Print Time
-                        1. Open your slicer software (Cura, PrusaSlicer, etc.)
-                        2. Configure your print settings:
-                           - **Layer Height**: Smaller = longer print time, better quality
-                           - **Infill Density**: Higher = longer print time, stronger part
-                           - **Print Speed**: Faster = lower quality but shorter print time
+                # Supports are already in sliced files
+                if sliced is None:
+                    # Add instructions for users
+                    with st.expander("How to find print time & configure settings"):
+                        st.markdown("""
+                            ### Getting Accurate Print Time
+                            1. Open your slicer software (Cura, PrusaSlicer, etc.)
+                            2. Configure your print settings:
+                               - **Layer Height**: Smaller = longer print time, better quality
+                               - **Infill Density**: Higher = longer print time, stronger part
+                               - **Print Speed**: Faster = lower quality but shorter print time
                         
-                        ### Support Settings
-                        Support structures will increase material usage and print time:
+                            ### Support Settings
+                            Support structures will increase material usage and print time:
                         
-                        **Support Types:**
-                        - **None**: No additional cost
-                        - **Regular**: Add 10-20% to material cost
-                        - **Tree**: Add 5-15% to material cost
-                        - **Soluble**: Add 30-50% to material cost (PVA/HIPS)
+                            Support material is estimated from the model: faces that overhang
+                            more than the overhang angle need supports reaching down to the
+                            part or the bed below them.
+
+                            **Support Types:**
+                            - **None**: No additional cost
+                            - **Regular**: Grid supports, about 15% infill under each overhang
+                            - **Tree**: Branching supports, less material than regular
+                            - **Soluble**: Denser supports printed in PVA
                         
-                        ### Final Steps
-                        3. Configure supports if needed
-                        4. Slice the model
-                        5. Look for the estimated print time in the slice info
-                        6. Enter the hours and minutes shown
+                            ### Final Steps
+                            3. Configure supports if needed
+                            4. Slice the model
+                            5. Look for the estimated print time in the slice info
+                            6. Enter the hours and minutes shown
                         
-                        **Note**: Actual print times may vary based on printer settings and conditions.
-                    """)
+                            **Note**: Actual print times may vary based on printer settings and conditions.
+                        """)
+                    
+                        # Support type selection
+                        support_type = st.selectbox(
+                            "Support Type",
+                            options=["None", "Regular", "Tree", "Soluble"],
+                            key=f"support_type_{uploaded_file.file_id}",
+                            help="Select the type of supports needed for your print"
+                        )
                     
-                    # Support type selection
-                    support_type = st.selectbox(
-                        "Support Type",
-                        options=["None", "Regular", "Tree", "Soluble"],
-                        help="Select the type of supports needed for your print"
+                        if support_type != "None":
+                            overhang_angle = st.slider(
+                                "Overhang angle (°)",
+                                min_value=20,
+                                max_value=80,
+                                value=DEFAULT_OVERHANG_ANGLE,
+                                step=5,
+                                key=f"overhang_angle_{uploaded_file.file_id}",
+                                help="Faces tilted further than this from vertical need support"
+                            )
+                            graph.set("overhang_angle", overhang_angle)
+                            with metrics.span("supports"):
+                                overhangs = graph["overhangs"]
+                            support_volume = support_volume_cm3(overhangs, support_type)
+
+                            # Soluble supports are priced as their own material
+                            support_material = SUPPORT_STYLES[support_type.lower()]["material"] or material
+                            if support_material == material:
+                                support_cost = calc_material_cost(support_volume, density, cost_per_kg)
+                            else:
+                                support_props = catalog.materials[support_material]
+                                support_cost = calc_material_cost(
+                                    support_volume, support_props["density"], support_props["cost_per_kg"] * rate
+                                )
+                            st.info(
+                                f"{support_type} supports: {support_volume:.2f} cm³ of {support_material} under "
+                                f"{overhangs['supported_area_cm2']:.1f} cm² of overhangs (+{symbol}{support_cost:.2f})"
+                            )
+
+                    copies = st.number_input(
+                        "Copies",
+                        min_value=1,
+                        value=1,
+                        step=1,
+                        key=f"copies_{uploaded_file.file_id}",
+                        help="Copies are nested onto build plates with the other parts (see Build Plates below)"
                     )
+                    hull, height_mm = part_footprint(cache_key, mesh)
+                    plate_parts.append(Part(
+                        uploaded_file.name, hull, height_mm, volume_cm3 + support_volume, print_time_hr, copies
+                    ))
+                    plate_keys.append((cache_key, uploaded_file.name, copies))
+                
+                # Printer behind depreciation and energy, custom values from the sidebar if enabled
+                if show_advanced:
+                    st.sidebar.markdown("### Custom Printer Details")
                     
-                    # Calculate support cost multiplier
-                    support_multipliers = {
-                        "None": 1.0,
-                        "Regular": 1.15,  # 15% increase
-                        "Tree": 1.10,     # 10% increase
-                        "Soluble": 1.40   # 40% increase
-                    }
+                    # Get default values from the catalog
+                    default_details = catalog.printers[make][model]
                     
-                    support_multiplier = support_multipliers[support_type]
+                    # Custom printer details inputs
+                    custom_printer_cost = st.sidebar.number_input(
+                        f"Printer Cost ({symbol})", 
+                        min_value=0.0, 
+                        value=float(default_details.get("cost", 0)) * rate,
+                        step=10.0,
+                        key=f"custom_printer_cost_{uploaded_file.file_id}"
+                    )
                     
-                    # Apply support multiplier to material cost
-                    material_cost = material_cost * support_multiplier
+                    custom_upgrades = st.sidebar.number_input(
+                        f"Planned Upgrades ({symbol})", 
+                        min_value=0.0, 
+                        value=float(default_details.get("upgrades", 0)) * rate,
+                        step=10.0,
+                        key=f"custom_upgrades_{uploaded_file.file_id}"
+                    )
                     
-                    if support_type != "None":
-                        st.info(f"Material cost adjusted for {support_type} supports (+{((support_multiplier-1)*100):.0f}%)")
-                
-                # Calculate energy cost
-                energy_cost = calc_energy_cost(print_time_hr, power, electricity_rate)
-                
-                # Calculate depreciation using printer details
-                depreciation_cost = calc_depreciation_cost(printer_details_dict[make][model], print_time_hr)
-                
-                # Calculate total cost with markup
-                subtotal = material_cost + energy_cost
-                markup = subtotal * (markup_percent / 100)
-                total_cost = subtotal + markup
+                    custom_maintenance = st.sidebar.number_input(
+                        f"Expected Maintenance ({symbol})", 
+                        min_value=0.0, 
+                        value=float(default_details.get("maintenance", 0)) * rate,
+                        step=10.0,
+                        key=f"custom_maintenance_{uploaded_file.file_id}"
+                    )
+                    
+                    custom_lifetime = st.sidebar.number_input(
+                        "Expected Lifetime (hours)", 
+                        min_value=1000, 
+                        value=int(default_details.get("lifetime_hours", 5000)),
+                        step=1000,
+                        key=f"custom_lifetime_{uploaded_file.file_id}"
+                    )
+                    
+                    power_watt = st.sidebar.number_input(
+                        "Printer Power (W)", 
+                        min_value=1, 
+                        value=int(default_details.get("avg_power_watts", 120)),
+                        step=5,
+                        key=f"custom_power_{uploaded_file.file_id}"
+                    )
+                    
+                    # Use custom values in calculations
+                    printer_details = {
+                        "cost": custom_printer_cost,
+                        "upgrades": custom_upgrades,
+                        "maintenance": custom_maintenance,
+                        "lifetime_hours": custom_lifetime,
+                        "avg_power_watts": power_watt,
+                        "cost_per_kwh": electricity_rate
+                    }
+                else:
+                    # Use default values from the catalog
+                    printer_details = catalog.printers[make][model]
+                    power_watt = printer_details.get("avg_power_watts", 120)
+
+                # Energy is priced over the actual print window on time-of-use tariffs
+                start_time = None
+                start_hr = 0.0
+                if tariff is not None:
+                    start_time = st.time_input(
+                        "Print Start",
+                        value=dt_time(9, 0),
+                        step=1800,
+                        key=f"start_time_{uploaded_file.file_id}",
+                        help=f"Energy is priced at the {tariff_name} rate for each half hour of the print"
+                    )
+                    start_hr = start_time.hour + start_time.minute / 60
+
+                # Only the cost nodes downstream of a changed input recompute
+                graph.update(
+                    volume_cm3=volume_cm3,
+                    density=density,
+                    cost_per_kg=cost_per_kg,
+                    support_cost=support_cost,
+                    print_time_hr=print_time_hr,
+                    power_watt=power_watt,
+                    electricity_rate=electricity_rate,
+                    start_hr=start_hr,
+                    printer=printer_details,
+                    markup_percent=markup_percent
+                )
+                # Tariff arrays are rebuilt every rerun; the name and rate identify them
+                graph.set("tariff", tariff, key=(tariff_name, rate) if tariff is not None else None)
+                material_cost = graph["material_cost"]
+                energy_cost = graph["energy_cost"]
+                depreciation_cost = graph["depreciation_cost"]
+                total_cost = graph["total_cost"]
+                # Flat rate giving the same energy cost, for prices that take a single rate
+                energy_rate = electricity_rate
+                if tariff is not None and print_time_hr > 0:
+                    energy_rate = energy_cost * 1000 / (power_watt * print_time_hr)
+
+                if tariff is not None:
+                    best_start, best_cost = graph["cheapest_start"]
+                    if energy_cost - best_cost >= 0.005:
+                        minutes = int(round(float(best_start) * 60))
+                        st.caption(
+                            f"Starting at {minutes // 60 % 24:02d}:{minutes % 60:02d}"
+                            f"{' tomorrow' if minutes >= 24 * 60 else ''} would save "
+                            f"{symbol}{energy_cost - best_cost:.2f} on electricity"
+                        )
 
                 # --- Total Cost Summary Box ---
-                total_with_depreciation = total_cost + depreciation_cost
+                total_with_depreciation = graph["total_with_depreciation"]
                 
                 cost_col1, cost_col2 = st.columns([2, 1])
                 with cost_col1:
@@ -646,69 +810,83 @@ if uploaded_files:
                         </div>
                     """.format(print_time_hr), unsafe_allow_html=True)
 
-                # --- Detailed Breakdown in Expander ---
-                with st.expander('Cost Breakdown'):
-                    # Update the Advanced Settings section
-                    if show_advanced:
-                        st.sidebar.markdown("### Custom Printer Details")
-                        
-                        # Get default values from printer_details_dict
-                        default_details = printer_details_dict.get(make, {}).get(model, {})
-                        
-                        # Custom printer details inputs
-                        custom_printer_cost = st.sidebar.number_input(
-                            f"Printer Cost ({symbol})", 
-                            min_value=0.0, 
-                            value=float(default_details.get("cost", 0)) * rate,
-                            step=10.0
+                # --- Price range from Monte Carlo samples of the uncertain inputs ---
+                with st.expander('Price Range'):
+                    range_col1, range_col2 = st.columns(2)
+                    with range_col1:
+                        fail_rate = st.number_input(
+                            "Fail Rate (%)", min_value=0.0, max_value=90.0, value=5.0, step=1.0,
+                            key=f"fail_rate_{uploaded_file.file_id}",
+                            help="Share of prints that fail and are reprinted"
                         )
-                        
-                        custom_upgrades = st.sidebar.number_input(
-                            f"Planned Upgrades ({symbol})", 
-                            min_value=0.0, 
-                            value=float(default_details.get("upgrades", 0)) * rate,
-                            step=10.0
+                        labour_minutes = st.number_input(
+                            "Hands-on Time (min)", min_value=0, value=0, step=5,
+                            key=f"labour_minutes_{uploaded_file.file_id}",
+                            help="Preparation, part removal and cleanup"
                         )
-                        
-                        custom_maintenance = st.sidebar.number_input(
-                            f"Expected Maintenance ({symbol})", 
-                            min_value=0.0, 
-                            value=float(default_details.get("maintenance", 0)) * rate,
-                            step=10.0
+                    with range_col2:
+                        labour_rate = st.number_input(
+                            f"Labour Rate ({symbol}/h)", min_value=0.0, value=0.0, step=1.0,
+                            key=f"labour_rate_{uploaded_file.file_id}"
                         )
-                        
-                        custom_lifetime = st.sidebar.number_input(
-                            "Expected Lifetime (hours)", 
-                            min_value=1000, 
-                            value=int(default_details.get("lifetime_hours", 5000)),
-                            step=1000
+                        shipping = st.number_input(
+                            f"Shipping ({symbol})", min_value=0.0, value=0.0, step=0.5,
+                            key=f"shipping_{uploaded_file.file_id}"
                         )
-                        
-                        power_watt = st.sidebar.number_input(
-                            "Printer Power (W)", 
-                            min_value=1, 
-                            value=int(default_details.get("avg_power_watts", 120)),
-                            step=5
+                    with metrics.span("monte_carlo"):
+                        price_range = simulate_quote(
+                            volume_cm3, print_time_hr, density, cost_per_kg, power_watt, energy_rate,
+                            printer=printer_details,
+                            markup_percent=markup_percent,
+                            support_volume_cm3=support_volume,
+                            fail_rate_percent=fail_rate,
+                            post_hours=labour_minutes / 60,
+                            labour_rate=labour_rate,
+                            shipping=shipping,
+                            # Slicer times are much closer than estimates
+                            sigmas={"print_time": 0.05} if sliced is not None else None,
+                            seed=0
                         )
-                        
-                        # Use custom values in calculations
-                        printer_details = {
-                            "cost": custom_printer_cost,
-                            "upgrades": custom_upgrades,
-                            "maintenance": custom_maintenance,
-                            "lifetime_hours": custom_lifetime,
-                            "avg_power_watts": power_watt,
-                            "cost_per_kwh": electricity_rate
-                        }
-                    else:
-                        # Use default values from printer_details_dict
-                        printer_details = printer_details_dict.get(make, {}).get(model, {})
-                        power_watt = printer_details.get("avg_power_watts", 120)
+                    percentile_cols = st.columns(len(PERCENTILES))
+                    for column, (percentile, price) in zip(percentile_cols, price_range["percentiles"].items()):
+                        column.metric(f"P{percentile}", f"{symbol}{price:.2f}")
+                    st.caption(
+                        f"{price_range['samples']:,} samples varying print time, supports, filament and "
+                        f"electricity prices, with failed prints reprinted. Expected price "
+                        f"{symbol}{price_range['point']:.2f} (markup on all costs, including depreciation)."
+                    )
 
-                    # Update the depreciation calculation to use the custom values
-                    depreciation_cost = calc_depreciation_cost(printer_details, print_time_hr)
-                    energy_cost = calc_energy_cost(print_time_hr, printer_details["avg_power_watts"], electricity_rate)
-                    
+                # --- Save the quote; stored in £ so catalog price changes can reprice it ---
+                if st.button("Save Quote", key=f"save_quote_{uploaded_file.file_id}"):
+                    quote_id = get_quote_store().add_quote(
+                        geometry_key, file_extension, volume_cm3, bbox, print_time_hr,
+                        {
+                            "material": material,
+                            "density": density,
+                            "cost_per_kg": cost_per_kg / rate if custom_material_cost else material_props["cost_per_kg"],
+                            # On a tariff, the flat rate that gives the quoted energy cost
+                            "electricity_rate": energy_rate / rate if tariff is not None
+                            else uk_rates[electricity_rate_label] or electricity_rate / rate,
+                            "markup_percent": markup_percent,
+                            "make": make,
+                            "model": model,
+                            # The printer behind the quote; custom values are entered in the selected currency
+                            "printer": {
+                                **printer_details,
+                                **({field: printer_details[field] / rate for field in ("cost", "upgrades", "maintenance")}
+                                   if show_advanced else {})
+                            }
+                        },
+                        customer=customer or None,
+                        name=uploaded_file.name,
+                        slicer_time=sliced is not None,
+                        support_volume_cm3=support_volume,
+                        support_material=support_material
+                    )
+                    st.success(f"Saved as quote #{quote_id}" + (f" for {customer}" if customer else ""))
+
+                # --- Detailed Breakdown in Expander ---
+                with st.expander('Cost Breakdown'):
                     # Create detailed breakdown
                     breakdown_data = {
                         "Cost Component": [
@@ -722,47 +900,130 @@ if uploaded_files:
                             f"{symbol}{material_cost:.2f}",
                             f"{symbol}{energy_cost:.2f}",
                             f"{symbol}{depreciation_cost:.2f}",
-                            f"{symbol}{(total_cost - material_cost - energy_cost - depreciation_cost):.2f}",
-                            f"{symbol}{(total_cost + depreciation_cost):.2f}"
+                            f"{symbol}{(total_cost - material_cost - energy_cost):.2f}",
+                            f"{symbol}{total_with_depreciation:.2f}"
                         ],
                         "Details": [
-                            f"{volume_cm3:.1f}cm³ of {material}",
-                            f"{print_time_hr:.1f}h at {power_watt}W" + (" (Custom)" if show_advanced else ""),
+                            f"{volume_cm3:.1f}cm³ of {material}" + (f" + {support_volume:.1f}cm³ supports" if support_volume else ""),
+                            f"{print_time_hr:.1f}h at {power_watt}W" + (" (Custom)" if show_advanced else "")
+                            + (f" from {start_time:%H:%M} on {tariff_name}" if tariff is not None else ""),
                             f"{print_time_hr:.1f}h of printer use ({symbol}{printer_details['cost']:.0f} printer)" + (" (Custom values)" if show_advanced else ""),
                             f"{markup_percent}% markup",
                             f"Final price inc. depreciation"
                         ]
                     }
                     
-                    df = pd.DataFrame(breakdown_data)
+                    graph.set("breakdown_data", breakdown_data)
+                    with metrics.span("breakdown.table"):
+                        st.dataframe(graph["breakdown_table"], use_container_width=True, hide_index=True)
+                    
+                    # Add pie chart visualization
+                    # plot_cost_pie(material_cost, energy_cost, total_cost)
+
+                # --- What-if comparison across materials, printers and tariffs ---
+                with st.expander('What-if Comparison'):
+                    sweep_materials = {
+                        name: {**props, "cost_per_kg": props["cost_per_kg"] * rate}
+                        for name, props in catalog.materials.items()
+                    }
+                    sweep_tariffs = {
+                        label: value * rate for label, value in uk_rates.items() if value is not None
+                    }
+                    with metrics.span("sweep"):
+                        sweep_table, sensitivity = price_sweep(
+                            volume_cm3, print_time_hr, sweep_materials, catalog.printers,
+                            sweep_tariffs, sorted(set(range(0, 101, 5)) | {markup_percent})
+                        )
+                    st.caption(f"{len(sweep_table):,} combinations of material, printer, tariff and markup")
+                    st.markdown("**What moves the price most**")
                     st.dataframe(
-                        df.style
-                        .hide(axis='index')
-                        .set_properties(**{
-                            'background-color': '#22272e',
-                            'color': '#fff',
-                            'border-color': '#22272e',
-                            'font-size': '1.1em'
-                        })
-                        .set_table_styles([
-                            {'selector': 'th', 'props': [
-                                ('background-color', '#1a1d23'),
-                                ('color', '#4CAF50'),
-                                ('font-size', '1.1em'),
-                                ('text-align', 'left')
-                            ]}
-                        ]),
+                        sensitivity.assign(
+                            cheapest=sensitivity["cheapest"].astype(str),
+                            dearest=sensitivity["dearest"].astype(str),
+                            swing=sensitivity["swing"].map(lambda v: f"{symbol}{v:.2f}"),
+                            variance_share=sensitivity["variance_share"].map(lambda v: f"{v:.0%}")
+                        ),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                    st.markdown(f"**Cheapest options at {markup_percent}% markup**")
+                    cheapest = (
+                        sweep_table[sweep_table["markup_percent"] == markup_percent]
+                        .nsmallest(10, "total_with_depreciation")
+                    )
+                    st.dataframe(
+                        cheapest[["material", "printer", "tariff", "total_with_depreciation"]]
+                        .rename(columns={"total_with_depreciation": f"Total ({symbol})"})
+                        .round(2),
                         use_container_width=True,
                         hide_index=True
                     )
-                    
-                    # Add pie chart visualization
-                    # plot_cost_pie(material_cost, energy_cost, total_cost)
             except Exception as e:
                 st.error(f"Error processing file {uploaded_file.name}: {str(e)}")
                 continue
 
+    # --- Build plates: every part and copy packed onto the selected printer's bed ---
+    if plate_parts:
+        with st.expander("Build Plates", expanded=sum(part.quantity for part in plate_parts) > 1):
+            plate_col1, plate_col2 = st.columns(2)
+            with plate_col1:
+                spacing_mm = st.number_input(
+                    "Gap Between Parts (mm)", min_value=0.0, value=DEFAULT_SPACING_MM, step=1.0, key="plate_spacing"
+                )
+            with plate_col2:
+                overhead_minutes = st.number_input(
+                    "Overhead per Plate (min)",
+                    min_value=0,
+                    value=int(DEFAULT_PLATE_OVERHEAD_HOURS * 60),
+                    step=5,
+                    key="plate_overhead",
+                    help="Heat-up, purge, bed levelling and clearing the plate; shared by the parts on it"
+                )
+            try:
+                bed = bed_size(catalog.printers[make][model])
+                plates = nested_plates(tuple(plate_keys), plate_parts, bed, spacing_mm)
+                plate_quote = price_plates(
+                    plate_parts,
+                    plates,
+                    {
+                        "density": density,
+                        "cost_per_kg": cost_per_kg,
+                        "electricity_rate": electricity_rate,
+                        "markup_percent": markup_percent,
+                        "printer": {**catalog.printers[make][model], "avg_power_watts": power}
+                    },
+                    plate_overhead_hours=overhead_minutes / 60
+                )
+            except ValueError as e:
+                st.warning(str(e))
+            else:
+                st.markdown(
+                    f"**{plate_quote['plates']} plate{'s' if plate_quote['plates'] != 1 else ''}** on the "
+                    f"{make} {model} ({bed[0]:g} x {bed[1]:g} mm), {plate_quote['print_hours']:.1f}h of printing "
+                    f"for {symbol}{plate_quote['total_cost']:.2f} including depreciation"
+                )
+                st.caption(" · ".join(
+                    f"Plate {number}: {len(plate['placements'])} parts, {plate['utilisation']:.0%} of the bed"
+                    for number, plate in enumerate(plates, start=1)
+                ))
+                st.dataframe(
+                    pd.DataFrame([
+                        {
+                            "Part": name,
+                            "Copies": entry["quantity"],
+                            f"Unit ({symbol})": round(entry["unit_cost"], 2),
+                            f"Overhead share ({symbol})": round(entry["overhead_share"], 2),
+                            f"Total ({symbol})": round(entry["total_cost"], 2)
+                        }
+                        for name, entry in plate_quote["parts"].items()
+                    ]),
+                    use_container_width=True,
+                    hide_index=True
+                )
+
 else:
+    get_parse_jobs().release(st.session_state.parse_owner)
+    st.session_state.pipelines.clear()
     st.info("Please upload one or more 3D model files to begin.")
     
     # Show empty cost breakdown with example format
@@ -791,4 +1052,56 @@ else:
         ]),
         use_container_width=True,
         hide_index=True
-    )
\ No newline at end of file
+    )
+
+# --- Performance debug panel ---
+if show_metrics:
+    metrics.stop_trace()
+    with st.expander("Performance debug", expanded=True):
+        for name, trace in traces.items():
+            st.markdown(f"**{name}**")
+            st.dataframe(
+                pd.DataFrame([
+                    {
+                        "Stage": " " * record["depth"] + record["stage"],
+                        "Labels": ", ".join(f"{k}={v}" for k, v in record["labels"].items()),
+                        "Time (ms)": round(record["seconds"] * 1000, 2),
+                        "Peak memory (MB)": None if record["peak_bytes"] is None else round(record["peak_bytes"] / 2 ** 20, 1)
+                    }
+                    for record in sorted(trace, key=lambda r: r["timestamp"])
+                ], columns=["Stage", "Labels", "Time (ms)", "Peak memory (MB)"]),
+                use_container_width=True,
+                hide_index=True
+            )
+            if name in graphs_shown:
+                # What this rerun cost: a miss recomputed the node, a hit reused it
+                st.dataframe(
+                    pd.DataFrame([
+                        {
+                            "Node": entry["node"],
+                            "Hits": entry["hits"],
+                            "Misses": entry["misses"],
+                            "Last run (ms)": round(entry["seconds"] * 1000, 2)
+                        }
+                        for entry in graphs_shown[name].stats()
+                        if entry["hits"] or entry["misses"]
+                    ], columns=["Node", "Hits", "Misses", "Last run (ms)"]),
+                    use_container_width=True,
+                    hide_index=True
+                )
+        st.caption("Totals since the server started, for every session:")
+        col_export1, col_export2 = st.columns(2)
+        with col_export1:
+            st.download_button(
+                "Prometheus metrics",
+                metrics.prometheus_text(),
+                file_name="quote_metrics.prom",
+                mime="text/plain"
+            )
+        with col_export2:
+            st.download_button(
+                "JSON",
+                json.dumps({"traces": traces, "stages": metrics.snapshot()}, indent=1, default=str),
+                file_name="quote_metrics.json",
+                mime="application/json"
+            )
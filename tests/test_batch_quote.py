@@ -0,0 +1,84 @@
+import os
+import csv
+import json
+import time
+import multiprocessing
+
+import pytest
+import trimesh
+from utils import batch_quote
+from utils.batch_quote import collect_jobs, run_batch, completed_paths
+
+SETTINGS = {
+    'material': 'PLA',
+    'density': 1.24,
+    'cost_per_kg': 25.0,
+    'electricity_rate': 0.34,
+    'markup_percent': 20,
+    'printer': {'cost': 499, 'upgrades': 50, 'maintenance': 50, 'lifetime_hours': 5000, 'avg_power_watts': 100}
+}
+
+
+def _make_models(folder):
+    trimesh.creation.box(extents=(10, 10, 10)).export(str(folder / 'cube.stl'))
+    (folder / 'nested').mkdir()
+    trimesh.creation.icosphere(radius=5).export(str(folder / 'nested' / 'ball.obj'))
+    (folder / 'broken.stl').write_bytes(b'not a mesh')
+    (folder / 'notes.txt').write_text('ignored')
+
+
+def test_collect_jobs_from_directory_and_manifest(tmp_path):
+    _make_models(tmp_path)
+    found = collect_jobs(str(tmp_path))
+    assert [p.rsplit('/', 1)[-1] for p in found] == ['broken.stl', 'cube.stl', 'ball.obj']
+
+    manifest = tmp_path / 'jobs.txt'
+    manifest.write_text('cube.stl\n# comment\nnested/ball.obj\n')
+    assert collect_jobs(str(manifest)) == [str(tmp_path / 'cube.stl'), str(tmp_path / 'nested/ball.obj')]
+
+
+def test_run_batch_streams_rows_and_resumes(tmp_path):
+    _make_models(tmp_path)
+    output = str(tmp_path / 'quotes.csv')
+    paths = collect_jobs(str(tmp_path))
+
+    summary = run_batch(paths, SETTINGS, output, workers=2, timeout=60)
+    assert summary == {'ok': 2, 'error': 1, 'timeout': 0, 'skipped': 0}
+    with open(output, newline='') as f:
+        rows = {row['path'].rsplit('/', 1)[-1]: row for row in csv.DictReader(f)}
+    assert abs(float(rows['cube.stl']['volume_cm3']) - 1.0) < 1e-6
+    assert abs(float(rows['cube.stl']['material_cost']) - 0.031) < 1e-4
+    assert rows['broken.stl']['status'] == 'error'
+
+    # A second run finds everything already quoted
+    assert completed_paths(output) == set(paths)
+    summary = run_batch(paths, SETTINGS, output, workers=2, timeout=60)
+    assert summary['skipped'] == 3 and summary['ok'] == 0
+
+
+def test_only_the_file_that_kills_its_worker_is_an_error(tmp_path, monkeypatch):
+    if multiprocessing.get_start_method() != 'fork':
+        pytest.skip("workers must inherit the patched measure_file")
+    measure = batch_quote.measure_file
+
+    def crash_or_measure(path, file_type, settings):
+        if path.endswith('crash.stl'):
+            os._exit(1)
+        if path.endswith('slow.stl'):
+            time.sleep(0.9)
+        return measure(path, file_type, settings)
+
+    monkeypatch.setattr(batch_quote, 'measure_file', crash_or_measure)
+    for name in ('a', 'b', 'crash', 'c', 'slow'):
+        trimesh.creation.box(extents=(10, 10, 10)).export(str(tmp_path / f'{name}.stl'))
+    output = str(tmp_path / 'quotes.jsonl')
+    paths = [str(tmp_path / f'{name}.stl') for name in ('a', 'b', 'crash', 'c')]
+    summary = run_batch(paths, SETTINGS, output, workers=4, timeout=60)
+    assert summary == {'ok': 3, 'error': 1, 'timeout': 0, 'skipped': 0}
+    with open(output) as f:
+        statuses = {json.loads(line)['path'].rsplit('/', 1)[-1]: json.loads(line)['status'] for line in f}
+    assert statuses == {'a.stl': 'ok', 'b.stl': 'ok', 'c.stl': 'ok', 'crash.stl': 'error'}
+
+    # Fractional timeouts aren't rounded up to whole seconds
+    row = batch_quote.quote_file(str(tmp_path / 'slow.stl'), SETTINGS, timeout=0.3)
+    assert row['status'] == 'timeout'
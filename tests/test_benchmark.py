@@ -0,0 +1,47 @@
+import numpy as np
+import trimesh
+
+from utils.synthetic_meshes import SHAPES, FILE_TYPES, generate_mesh, write_mesh
+from utils.stl_parser import parse_3d_file
+from utils.benchmark import run_benchmarks, append_run, load_history, select_run, compare_runs, main
+
+
+def test_synthetic_meshes_are_closed_deterministic_and_readable(tmp_path):
+    for shape in SHAPES:
+        vertices, faces = generate_mesh(shape, '10k')
+        assert 5_000 < len(faces) < 15_000
+        mesh = trimesh.Trimesh(vertices, faces, process=False)
+        assert mesh.is_watertight and mesh.is_winding_consistent and mesh.volume > 0
+        again = generate_mesh(shape, 10_000)
+        assert np.array_equal(vertices, again[0]) and np.array_equal(faces, again[1])
+
+    vertices, faces = generate_mesh('thin_wall', '1k')
+    expected = trimesh.Trimesh(vertices, faces, process=False).volume / 1000
+    for file_type in FILE_TYPES:
+        path = str(tmp_path / f"tube.{file_type}")
+        write_mesh(path, vertices, faces)
+        volume_cm3, _, _ = parse_3d_file(path, file_type, build_mesh=False)
+        assert abs(volume_cm3 - expected) < 1e-4
+
+
+def test_run_record_and_compare(tmp_path, capsys):
+    results = run_benchmarks(sizes=['1k'], shapes=['sphere'], formats=['stl'], repeat=1, workdir=str(tmp_path))
+    assert {'parse/stl/sphere/1k', 'load/stl/sphere/1k', 'preview/sphere/1k',
+            'validate/sphere/1k', 'ray_volume/sphere/1k', 'supports/sphere/1k',
+            'sliced_time/sphere/1k', 'costs/vectorised/1k', 'monte_carlo/1k'} <= set(results)
+    assert results['parse/stl/sphere/1k']['triangles'] > 0
+    assert all(result['seconds'] >= 0 and 'peak_mb' in result for result in results.values())
+
+    history = str(tmp_path / 'history.json')
+    append_run(history, results, label='base')
+    slower = {name: dict(result) for name, result in results.items()}
+    slower['load/stl/sphere/1k']['seconds'] += 1.0
+    append_run(history, slower)
+    runs = load_history(history)
+    assert select_run(runs, 'base') is runs[0] and select_run(runs, '-1') is runs[1]
+
+    regressed = [row[0] for row in compare_runs(runs[0], runs[1]) if row[-1]]
+    assert regressed == ['load/stl/sphere/1k']
+    assert main(['compare', '--history', history]) == 1
+    assert 'REGRESSION' in capsys.readouterr().out
+    assert main(['compare', '--history', history, '--baseline', '-1']) == 0
@@ -0,0 +1,43 @@
+import os
+import json
+import shutil
+import pytest
+from utils import catalog as catalog_module
+from utils.catalog import get_catalog, load_catalog, DEFAULT_CATALOG_DIR
+from utils.cost_calculator import get_materials
+
+
+def test_default_catalog_indexes_every_model():
+    catalog = load_catalog()
+    assert 'Bambu Lab' in catalog.makes
+    for make in catalog.makes:
+        for label in catalog.model_labels[make]:
+            model = catalog.model_for_label[make][label]
+            assert catalog.printer(make, model) is catalog.printers[make][model]
+    assert catalog.model_for_label['Creality']['Ender-3 V3 SE (110W)'] == 'Ender-3 V3 SE'
+    assert catalog.materials['PLA']['diameters'] == [1.75, 2.85]
+    with pytest.raises(ValueError):
+        catalog.printer('Creality', 'Ender-3 V3 SE / NEO / S1')
+
+
+def test_reloads_only_when_files_change(tmp_path, monkeypatch):
+    for name in ('printers.json', 'materials.json'):
+        shutil.copy(os.path.join(DEFAULT_CATALOG_DIR, name), tmp_path / name)
+    monkeypatch.setenv('CATALOG_DIR', str(tmp_path))
+    monkeypatch.setattr(catalog_module, '_catalog', None)
+
+    first = get_catalog()
+    assert get_catalog() is first
+    assert get_materials() is first.materials
+
+    materials = json.loads((tmp_path / 'materials.json').read_text())
+    materials['PLA']['cost_per_kg'] = 99.0
+    (tmp_path / 'materials.json').write_text(json.dumps(materials))
+    os.utime(tmp_path / 'materials.json', ns=(0, 1))
+    reloaded = get_catalog()
+    assert reloaded is not first
+    assert reloaded.materials['PLA']['cost_per_kg'] == 99.0
+
+    # A half-written file keeps the last good catalog
+    (tmp_path / 'printers.json').write_text('{"Bambu Lab": ')
+    assert get_catalog() is reloaded
@@ -0,0 +1,42 @@
+import io
+import pickle
+import numpy as np
+import pytest
+import trimesh
+
+from utils.compact_mesh import CompactMesh, merge_vertices
+from utils.parse_cache import ParseCache
+from utils.stl_parser import parse_3d_file
+
+
+def test_merges_a_triangle_soup_like_trimesh():
+    sphere = trimesh.creation.icosphere(subdivisions=3, radius=10)
+    mesh = CompactMesh.from_triangles(sphere.triangles)
+    assert mesh.vertices.dtype == np.float32 and mesh.faces.dtype == np.int32
+    assert len(mesh.vertices) == len(sphere.vertices)
+    assert np.allclose(mesh.vertices[mesh.faces], sphere.triangles, atol=1e-5)
+    assert mesh.volume == pytest.approx(sphere.volume, rel=1e-6)
+    assert np.allclose(mesh.bounds, sphere.bounds, atol=1e-5)
+    assert mesh.nbytes < sphere.vertices.nbytes + sphere.faces.nbytes
+    with pytest.raises(ValueError):
+        mesh.vertices[0, 0] = 1.0
+
+
+def test_merge_keeps_first_seen_order():
+    vertices, faces = merge_vertices([[1, 1, 1], [0, 0, 0], [1, 1, 1], [-0.0, 0, 0]], [[0, 1, 2], [1, 2, 3]])
+    assert vertices.tolist() == [[1, 1, 1], [0, 0, 0]]
+    assert faces.tolist() == [[0, 1, 0], [1, 0, 1]]
+    with pytest.raises(ValueError):
+        CompactMesh([[0, 0, 0]], [[0, 1, 2]], merge=False)
+
+
+def test_cache_and_pickle_share_read_only_geometry():
+    buffer = io.BytesIO()
+    trimesh.creation.box(extents=(10, 20, 30)).export(buffer, file_type='stl')
+    cache = ParseCache()
+    _, _, first = parse_3d_file(io.BytesIO(buffer.getvalue()), 'stl', cache=cache)
+    _, _, second = parse_3d_file(io.BytesIO(buffer.getvalue()), 'stl', cache=cache)
+    assert isinstance(first, CompactMesh) and second is first
+    assert len(first.vertices) == 8 and first.volume == pytest.approx(6000)
+    copy = pickle.loads(pickle.dumps(first))
+    assert np.array_equal(copy.faces, first.faces) and not copy.faces.flags.writeable
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from utils.cost_calculator import (
+    calc_costs, calc_material_cost, calc_energy_cost, calc_total_cost, calc_depreciation_cost
+)
+
+
+def _random_jobs(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'volume_cm3': rng.uniform(0.1, 500, n),
+        'density': rng.uniform(1.0, 1.3, n),
+        'cost_per_kg': rng.uniform(15, 100, n),
+        'print_time_hr': rng.uniform(0.1, 48, n),
+        'power_watt': rng.integers(80, 250, n),
+        'electricity_rate': rng.uniform(0.1, 0.5, n),
+        'markup_percent': rng.integers(0, 100, n),
+        'printer_cost': rng.uniform(200, 4000, n),
+        'upgrades': rng.uniform(0, 500, n),
+        'maintenance': rng.uniform(0, 300, n),
+        'lifetime_hours': rng.choice([4000, 5000], n),
+    })
+
+
+def test_calc_costs_matches_scalar_functions_exactly():
+    jobs = _random_jobs()
+    costs = calc_costs(jobs)
+    assert isinstance(costs, pd.DataFrame) and costs.index.equals(jobs.index)
+    for i, job in jobs.iloc[:200].iterrows():
+        material = calc_material_cost(job.volume_cm3, job.density, job.cost_per_kg)
+        energy = calc_energy_cost(job.print_time_hr, job.power_watt, job.electricity_rate)
+        printer = {
+            'cost': job.printer_cost, 'upgrades': job.upgrades,
+            'maintenance': job.maintenance, 'lifetime_hours': job.lifetime_hours
+        }
+        assert costs.material_cost[i] == material
+        assert costs.energy_cost[i] == energy
+        assert costs.total_cost[i] == calc_total_cost(material, energy, job.markup_percent)
+        assert costs.depreciation_cost[i] == calc_depreciation_cost(printer, job.print_time_hr)
+
+
+def test_calc_costs_broadcasts_scalars_against_arrays():
+    rates = np.array([0.20, 0.34, 0.40])
+    costs = calc_costs(
+        volume_cm3=10, density=1.24, cost_per_kg=20,
+        print_time_hr=4, power_watt=120, electricity_rate=rates
+    )
+    assert costs['material_cost'].shape == (3,)
+    np.testing.assert_array_equal(costs['energy_cost'], [0.096, 0.1632, 0.192])
+    # No printer details -> no depreciation, as with calc_depreciation_cost({})
+    np.testing.assert_array_equal(costs['depreciation_cost'], 0.0)
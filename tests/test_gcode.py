@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from utils.gcode import analyse_gcode
+
+
+def test_single_move_follows_trapezoid_profile():
+    # 100 mm at 50 mm/s with 500 mm/s²: 0.1 s ramps (2.5 mm each) and 1.9 s cruising
+    result = analyse_gcode(b"G90\nM82\nG1 F3000\nG1 X100 E5\n")
+    assert result["print_time_hours"] * 3600 == pytest.approx(2.1)
+    assert result["filament_length_mm"] == pytest.approx(5)
+    assert result["filament_volume_cm3"] == pytest.approx(5 * np.pi * 0.875 ** 2 / 1000)
+
+
+def test_modes_resets_arcs_and_retractions():
+    gcode = b"""; comment line
+G28
+G91
+M83
+G1 X10 E1 F600 ; relative
+G1 E-0.8 F2400
+G1 E0.8
+G90
+G92 E0
+G1 X20 Y0 E2 F600
+G2 X20 Y0 I-10 J0 E3
+N12 G4 P500
+"""
+    result = analyse_gcode(gcode)
+    details = result["details"]
+    assert result["filament_length_mm"] == pytest.approx(4)
+    assert details["bbox"] == pytest.approx({"x": 20, "y": 0, "z": 0})
+    assert details["dwell_time_hours"] * 3600 == pytest.approx(0.5)
+    # 20 mm of lines plus a 2π·10 mm circle at 10 mm/s, ramps add a little
+    printing = details["print_time_hours"] * 3600
+    assert (20 + 20 * np.pi) / 10 < printing < (20 + 20 * np.pi) / 10 + 1
+
+
+def test_block_size_does_not_change_result():
+    t = np.linspace(0, 2 * np.pi, 3000)
+    lines = [b"M204 P1500 T3000", b"M205 X8", b"G1 X0 Y0 F9000"]
+    lines += [b"G1 X%.3f Y%.3f E%.4f F2400" % (20 * np.cos(a), 20 * np.sin(a), i * 0.01) for i, a in enumerate(t)]
+    # Spaced words go through the regex fallback
+    lines += [b"G1 X 5 Y 5 F 1200"]
+    gcode = b"\n".join(lines + [b";TIME:60"]) + b"\n"
+    whole = analyse_gcode(gcode)
+    blocks = analyse_gcode(gcode, block_size=2048)
+    assert blocks["print_time_hours"] == pytest.approx(whole["print_time_hours"], rel=1e-9)
+    assert blocks["filament_length_mm"] == pytest.approx(whole["filament_length_mm"])
+    assert whole["details"]["moves"] == 3001
+    assert whole["details"]["slicer_time_hours"] == pytest.approx(60 / 3600)
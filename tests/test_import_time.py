@@ -0,0 +1,20 @@
+from utils.importtime import (
+    measure_import, parse_importtime, CORE_MODULES, CORE_IMPORT_BUDGET_SECONDS
+)
+
+
+def test_core_cold_start_within_budget():
+    # Best of three fresh interpreters, to ride out a busy machine
+    runs = [measure_import(CORE_MODULES, breakdown=False) for _ in range(3)]
+    assert not runs[0][1], f"Heavy packages imported eagerly: {runs[0][1]}"
+    assert min(elapsed for elapsed, _, _ in runs) < CORE_IMPORT_BUDGET_SECONDS
+
+
+def test_parse_importtime_sums_per_package():
+    report = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |   numpy.core\n"
+        "import time:        50 |        150 | numpy\n"
+        "import time:        20 |         20 | utils.catalog\n"
+    )
+    assert parse_importtime(report) == {'numpy': 150, 'utils': 20}
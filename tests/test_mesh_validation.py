@@ -0,0 +1,50 @@
+import pytest
+import trimesh
+
+from utils.mesh_validation import check_mesh, validate_mesh, ray_parity_volume
+
+
+def test_closed_mesh_keeps_signed_volume():
+    mesh = trimesh.creation.icosphere(subdivisions=3, radius=10)
+    report = validate_mesh(mesh.vertices, mesh.faces, mesh.volume / 1000)
+    assert report['watertight'] and report['winding_consistent']
+    assert report['method'] == 'signed' and report['confidence'] == 1.0
+    assert report['volume_cm3'] == pytest.approx(mesh.volume / 1000)
+
+    # Inside-out but consistent: only the sign was wrong
+    inverted = validate_mesh(mesh.vertices, mesh.faces[:, ::-1])
+    assert inverted['method'] == 'signed' and inverted['volume_cm3'] == pytest.approx(mesh.volume / 1000)
+
+
+def test_flipped_faces_and_holes_fall_back_to_ray_parity():
+    mesh = trimesh.creation.icosphere(subdivisions=4, radius=20)
+    expected = mesh.volume / 1000
+
+    faces = mesh.faces.copy()
+    faces[::7] = faces[::7, ::-1]
+    flipped = validate_mesh(mesh.vertices, faces)
+    assert flipped['watertight'] and not flipped['winding_consistent'] and flipped['inconsistent_edges'] > 0
+    assert flipped['signed_volume_cm3'] < 0.8 * expected
+    assert flipped['method'] == 'ray_parity'
+    assert flipped['volume_cm3'] == pytest.approx(expected, rel=0.01) and flipped['confidence'] > 0.95
+
+    holed = validate_mesh(mesh.vertices, mesh.faces[10:])
+    assert holed['boundary_loops'] == 1 and holed['boundary_edges'] > 0
+    assert holed['volume_cm3'] == pytest.approx(expected, rel=0.02)
+    assert 0.5 < holed['confidence'] < 1.0
+
+
+def test_non_manifold_edges_and_axis_aligned_boxes():
+    box = trimesh.creation.box(extents=(10, 20, 30))
+    # Two boxes sharing an edge: four faces meet along it
+    other = box.copy()
+    other.apply_translation((10, 20, 0))
+    merged = trimesh.util.concatenate([box, other])
+    merged.merge_vertices()
+    report = check_mesh(merged.vertices, merged.faces)
+    assert report['non_manifold_edges'] > 0 and not report['watertight']
+
+    volume, confidence = ray_parity_volume(box.vertices, box.faces)
+    assert volume == pytest.approx(6.0, rel=0.01) and confidence > 0.95
+    with pytest.raises(ValueError):
+        check_mesh(box.vertices, box.faces[:0])
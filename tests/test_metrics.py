@@ -0,0 +1,102 @@
+import json
+import time
+import asyncio
+import logging
+
+import numpy as np
+
+from utils import metrics
+
+
+def test_disabled_spans_are_free_and_traces_nest():
+    metrics.reset()
+    assert metrics.span('parse') is metrics.span('preview')
+    with metrics.span('parse'):
+        pass
+    assert metrics.snapshot() == []
+
+    with metrics.collect() as trace:
+        with metrics.span('parse', file_type='stl'):
+            with metrics.span('parse.build_mesh'):
+                pass
+        try:
+            with metrics.span('preview'):
+                raise ValueError('boom')
+        except ValueError:
+            pass
+    assert [(r['stage'], r['depth'], r['error']) for r in trace] == [
+        ('parse.build_mesh', 1, False), ('parse', 0, False), ('preview', 0, True)
+    ]
+    assert not metrics.enabled()
+
+    text = metrics.prometheus_text()
+    assert 'quote_stage_duration_seconds_count{stage="parse",file_type="stl"} 1' in text
+    assert 'quote_stage_duration_seconds_bucket{stage="parse",file_type="stl",le="+Inf"} 1' in text
+    assert 'quote_stage_errors_total{stage="preview"} 1' in text
+    metrics.reset()
+
+
+def test_memory_async_isolation_and_json_logs(caplog):
+    metrics.reset()
+    metrics.configure(enabled=True, memory=True)
+    try:
+        with metrics.collect() as trace:
+            with metrics.span('outer'):
+                with metrics.span('inner'):
+                    block = np.ones(2_000_000)
+                    del block
+        inner, outer = trace
+        assert inner['peak_bytes'] >= 16_000_000 and outer['peak_bytes'] >= inner['peak_bytes']
+
+        async def stage(name):
+            with metrics.collect() as task_trace, metrics.span(name):
+                await asyncio.sleep(0.01)
+            return task_trace
+
+        async def concurrently():
+            return await asyncio.gather(stage('a'), stage('b'))
+
+        with caplog.at_level(logging.INFO, logger='utils.metrics'):
+            first, second = asyncio.run(concurrently())
+        # Interleaved tasks keep their own span stacks
+        assert [(r['stage'], r['depth']) for r in first + second] == [('a', 0), ('b', 0)]
+        assert [json.loads(r.message)['stage'] for r in caplog.records] == ['a', 'b']
+        assert 'quote_stage_peak_memory_bytes{stage="outer"}' in metrics.prometheus_text()
+    finally:
+        metrics.configure(enabled=False, memory=False)
+        metrics.reset()
+
+
+def test_memory_tracking_is_counted_per_owner():
+    import tracemalloc
+    try:
+        metrics.track_memory('a', True)
+        metrics.track_memory('b', False)
+        # A session that never asked can't stop another's tracking
+        assert tracemalloc.is_tracing()
+        metrics.configure(memory=True)
+        metrics.track_memory('a', False)
+        assert tracemalloc.is_tracing()
+        metrics.configure(memory=False)
+        assert not tracemalloc.is_tracing()
+    finally:
+        metrics.track_memory('a', False)
+        metrics.configure(memory=False)
+
+
+def test_memory_tracking_lapses_for_owners_that_go_away(monkeypatch):
+    import tracemalloc
+    try:
+        monkeypatch.setattr(metrics, 'MEMORY_OWNER_TTL', 0.05)
+        metrics.configure(enabled=True)
+        metrics.track_memory('closed', True)
+        assert tracemalloc.is_tracing()
+        # The session closed without turning tracking off; the next span notices
+        time.sleep(0.1)
+        with metrics.span('after'):
+            pass
+        assert not tracemalloc.is_tracing() and not metrics._memory_owners
+    finally:
+        metrics.track_memory('closed', False)
+        metrics.configure(enabled=False, memory=False)
+        metrics.reset()
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from utils.business_logic import calc_depreciation, apply_fail_rate
+from utils.monte_carlo import correlated_factors, simulate_quote
+
+PRINTER = {'cost': 400, 'upgrades': 50, 'maintenance': 50, 'lifetime_hours': 5000}
+
+
+def test_factors_are_mean_one_and_correlated():
+    factors = correlated_factors(
+        100_000, {'a': 0.2, 'b': 0.3, 'c': 0.1}, {('a', 'b'): 0.8}, np.random.default_rng(1)
+    )
+    for values in factors.values():
+        assert values.mean() == pytest.approx(1.0, abs=0.01)
+    logs = {name: np.log(values) for name, values in factors.items()}
+    assert np.corrcoef(logs['a'], logs['b'])[0, 1] == pytest.approx(0.8, abs=0.01)
+    assert abs(np.corrcoef(logs['a'], logs['c'])[0, 1]) < 0.02
+    with pytest.raises(ValueError):
+        correlated_factors(10, {'a': 0.1, 'b': 0.1, 'c': 0.1}, {('a', 'b'): 0.99, ('a', 'c'): 0.99, ('b', 'c'): -0.99})
+
+
+def test_percentiles_bracket_the_expected_price():
+    quote = simulate_quote(
+        50, 4, 1.24, 20, 100, 0.34, PRINTER, markup_percent=20, support_volume_cm3=8,
+        fail_rate_percent=10, shipping=3, samples=200_000, seed=0
+    )
+    expected = (apply_fail_rate((58 * 1.24 / 1000 * 20) + 4 * 0.1 * 0.34 + calc_depreciation(500, 5000, 4), 10) + 3) * 1.2
+    assert quote['point'] == pytest.approx(expected)
+    assert quote['mean'] == pytest.approx(expected, rel=0.01)
+    p50, p90, p99 = quote['percentiles'].values()
+    assert p50 < p90 < p99
+    # Without uncertainty or failures the range collapses to the point price
+    fixed = simulate_quote(
+        50, 4, 1.24, 20, 100, 0.34, PRINTER, samples=1000, seed=0,
+        sigmas={'print_time': 0.0, 'support': 0.0, 'filament_price': 0.0, 'electricity_rate': 0.0}
+    )
+    assert all(price == pytest.approx(fixed['point']) for price in fixed['percentiles'].values())
+    with pytest.raises(ValueError):
+        simulate_quote(50, 4, 1.24, 20, 100, 0.34, fail_rate_percent=100)
+
+
+def test_labour_is_charged_once_in_point_and_samples():
+    zero = {'print_time': 0.0, 'support': 0.0, 'filament_price': 0.0, 'electricity_rate': 0.0}
+    quote = simulate_quote(
+        50, 4, 1.24, 20, 100, 0.34, PRINTER, markup_percent=20, fail_rate_percent=20,
+        post_hours=1.0, labour_rate=25, shipping=3, samples=200_000, sigmas=zero, seed=0
+    )
+    attempt = 50 * 1.24 / 1000 * 20 + 4 * 0.1 * 0.34 + calc_depreciation(500, 5000, 4)
+    assert quote['point'] == pytest.approx((attempt / 0.8 + 25 + 3) * 1.2)
+    assert quote['mean'] == pytest.approx(quote['point'], rel=0.005)
+
+
+def test_business_logic_broadcasts():
+    hours = np.array([0.0, 10.0, 20.0])
+    assert calc_depreciation(500, 5000, hours).tolist() == [0.0, 1.0, 2.0]
+    assert calc_depreciation(np.array([500, 500]), np.array([5000, 0]), 10).tolist() == [1.0, 0.0]
+    assert apply_fail_rate(np.array([10.0, 10.0]), np.array([0, 50])).tolist() == [10.0, 20.0]
+    with pytest.raises(ValueError):
+        apply_fail_rate(10, 120)
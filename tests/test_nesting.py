@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+import trimesh
+
+from utils.catalog import load_catalog
+from utils.nesting import (
+    Part, part_from_mesh, rasterise_footprint, nest_parts, price_plates, bed_size
+)
+
+
+def _square(size):
+    return [(0, 0), (size, 0), (size, size), (0, size)]
+
+
+def _occupancy(parts, plate, bed_mm, cell_mm=1.0):
+    """Re-rasterise a plate's placements (without spacing) onto one grid"""
+    by_name = {part.name: part for part in parts}
+    grid = np.zeros((int(bed_mm[1] // cell_mm), int(bed_mm[0] // cell_mm)), dtype=int)
+    for placement in plate['placements']:
+        mask = rasterise_footprint(by_name[placement['name']].footprint, cell_mm, 0.0, placement['rotation'])
+        row, column = int(placement['y'] // cell_mm), int(placement['x'] // cell_mm)
+        grid[row:row + mask.shape[0], column:column + mask.shape[1]] += mask
+    return grid
+
+
+def test_copies_fill_plates_without_overlapping():
+    cylinder = trimesh.creation.cylinder(radius=20, height=10)
+    parts = [
+        part_from_mesh('disc', cylinder.vertices, cylinder.volume / 1000, 1.0, quantity=12),
+        Part('block', _square(30), 5, 4.5, 0.5, quantity=5)
+    ]
+    plates = nest_parts(parts, (100, 100), build_height_mm=100, spacing_mm=4)
+    placed = [placement['name'] for plate in plates for placement in plate['placements']]
+    assert placed.count('disc') == 12 and placed.count('block') == 5
+    # Four 44 mm discs fit on a 100 mm plate, so at least three plates
+    assert 3 <= len(plates) <= 5
+    for plate in plates:
+        assert _occupancy(parts, plate, (100, 100)).max() <= 1
+        assert 0 < plate['utilisation'] <= 1
+
+
+def test_rejects_parts_that_cannot_be_nested():
+    with pytest.raises(ValueError):
+        nest_parts([Part('a', _square(10), 5, 1, 1), Part('a', _square(10), 5, 1, 1)], (100, 100))
+    with pytest.raises(ValueError):
+        nest_parts([Part('tall', _square(10), 150, 1, 1)], (100, 100), build_height_mm=100)
+    with pytest.raises(ValueError):
+        nest_parts([Part('wide', _square(120), 5, 1, 1)], (100, 100))
+    with pytest.raises(ValueError):
+        Part('none', _square(10), 5, 1, 1, quantity=0)
+
+
+def test_plate_overhead_is_shared():
+    printer = load_catalog().printers['Bambu Lab']['A1']
+    settings = {
+        'density': 1.24, 'cost_per_kg': 20.0, 'electricity_rate': 0.25,
+        'markup_percent': 0, 'printer': printer
+    }
+    parts = [Part('cube', _square(20), 20, 8.0, 1.5, quantity=4)]
+    bed = bed_size(printer)
+    plates = nest_parts(parts, bed[:2], build_height_mm=bed[2])
+    assert len(plates) == 1
+    shared = price_plates(parts, plates, settings, plate_overhead_hours=0.5)
+    alone = price_plates(parts, plates, settings, plate_overhead_hours=0.0)
+    entry = shared['parts']['cube']
+    assert entry['quantity'] == 4
+    assert shared['print_hours'] == pytest.approx(4 * 1.5 + 0.5)
+    assert entry['overhead_share'] == pytest.approx(shared['total_cost'] - alone['total_cost'])
+    assert entry['unit_cost'] == pytest.approx(alone['parts']['cube']['unit_cost'] + entry['overhead_share'] / 4)
+
+
+def test_catalog_printers_have_build_volumes():
+    catalog = load_catalog()
+    for make, models in catalog.printers.items():
+        for model, printer in models.items():
+            x, y, z = bed_size(printer)
+            assert min(x, y, z) > 0
+    with pytest.raises(ValueError):
+        bed_size({'cost': 100})
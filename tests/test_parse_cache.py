@@ -0,0 +1,66 @@
+import io
+import trimesh
+from utils.parse_cache import ParseCache, CacheEntry
+from utils.compact_mesh import CompactMesh
+from utils.stl_parser import parse_3d_file
+
+
+def _box_stl_bytes(extents=(10, 20, 30)):
+    buffer = io.BytesIO()
+    trimesh.creation.box(extents=extents).export(buffer, file_type='stl')
+    return buffer.getvalue()
+
+
+def test_parse_3d_file_uses_cache():
+    cache = ParseCache()
+    data = _box_stl_bytes()
+    volume, bbox, _ = parse_3d_file(io.BytesIO(data), 'stl', cache=cache)
+    assert cache.misses == 1 and len(cache) == 1
+
+    cached_volume, cached_bbox, mesh = parse_3d_file(io.BytesIO(data), 'stl', cache=cache)
+    assert cache.hits == 1
+    assert cached_volume == volume
+    assert cached_bbox == bbox
+    assert len(mesh.faces) == 12
+
+
+def test_cache_evicts_least_recently_used():
+    entry = CacheEntry(1.0, {'x': 1, 'y': 1, 'z': 1}, CompactMesh([[0, 0, 0]] * 100, [[0, 1, 2]] * 100, merge=False))
+    cache = ParseCache(max_bytes=entry.nbytes * 2)
+    cache.put('a', entry)
+    cache.put('b', entry)
+    cache.get('a')
+    cache.put('c', entry)
+    assert 'a' in cache and 'c' in cache
+    assert 'b' not in cache
+    assert cache.current_bytes <= cache.max_bytes
+
+
+def test_disk_tier_survives_new_cache(tmp_path):
+    data = _box_stl_bytes()
+    parse_3d_file(io.BytesIO(data), 'stl', cache=ParseCache(cache_dir=str(tmp_path)))
+
+    fresh = ParseCache(cache_dir=str(tmp_path))
+    volume, bbox, _ = parse_3d_file(io.BytesIO(data), 'stl', cache=fresh)
+    assert fresh.disk_hits == 1
+    assert abs(volume - 6.0) < 1e-6
+    assert bbox['z'] == 30
+
+
+def test_budget_survives_entries_growing_after_insert():
+    cache = ParseCache()
+    entries = [
+        CacheEntry(1.0, {'x': 1, 'y': 1, 'z': 1}, CompactMesh([[0, 0, i]] * 3, [[0, 1, 2]], merge=False))
+        for i in range(3)
+    ]
+    size = entries[0].nbytes
+    cache.put('a', entries[0])
+    cache.put('b', entries[1])
+    # Bounds are derived lazily, after the entries were charged
+    entries[0].mesh.bounds
+    entries[1].mesh.bounds
+    cache.put('a', entries[2])
+    assert cache.current_bytes == 2 * size
+    cache.max_bytes = size
+    cache.put('c', entries[2])
+    assert list(cache._entries) == ['c'] and cache.current_bytes == size
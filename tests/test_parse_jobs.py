@@ -0,0 +1,99 @@
+import io
+import threading
+
+import pytest
+import trimesh
+
+from utils.parse_cache import ParseCache
+from utils.parse_jobs import ParseJobs
+from utils.stl_parser import parse_3d_file
+
+
+def _box_stl_bytes(extents=(10, 20, 30)):
+    buffer = io.BytesIO()
+    trimesh.creation.box(extents=extents).export(buffer, file_type='stl')
+    return buffer.getvalue()
+
+
+def test_mesh_jobs_fill_the_parse_cache():
+    cache = ParseCache()
+    jobs = ParseJobs(cache, workers=1)
+    data = _box_stl_bytes()
+    key = cache.make_key(data, 'stl')
+
+    result = jobs.submit('a', key, data, 'stl').result(timeout=30)
+    assert result['kind'] == 'mesh' and abs(result['volume_cm3'] - 6.0) < 1e-6
+    assert 'vertices' not in result and key in cache
+
+    # Later submissions are answered from the cache without reading the upload
+    def unreadable():
+        raise AssertionError('upload read on a cache hit')
+    again = jobs.submit('a', key, unreadable, 'stl')
+    assert again.done() and again.result()['volume_cm3'] == result['volume_cm3']
+    volume, _, mesh = parse_3d_file(io.BytesIO(data), 'stl', cache=cache, cache_key=key)
+    assert cache.hits >= 1 and volume == result['volume_cm3'] and len(mesh.faces) == 12
+
+
+def test_meshes_over_the_cache_budget_are_not_parsed_twice():
+    import gc
+
+    cache = ParseCache(max_bytes=100)
+    jobs = ParseJobs(cache, workers=1)
+    data = _box_stl_bytes()
+    key = cache.make_key(data, 'stl')
+
+    result = jobs.submit('a', key, data, 'stl').result(timeout=30)
+    assert key not in cache and len(result['entry'].mesh.faces) == 12
+
+    def unreadable():
+        raise AssertionError('upload read while its mesh is held')
+    again = jobs.submit('b', key, unreadable, 'stl')
+    assert again.done() and again.result()['entry'] is result['entry']
+
+    # Once nobody holds it, the next submission parses it again
+    del result, again
+    gc.collect()
+    assert jobs.submit('a', key, data, 'stl').result(timeout=30)['entry'].volume_cm3 == pytest.approx(6.0)
+
+
+def test_coalescing_cancellation_and_errors(monkeypatch):
+    import utils.parse_jobs as parse_jobs
+
+    started, unblock = threading.Event(), threading.Event()
+    real_load = parse_jobs.load_upload
+
+    def load_upload(data, file_type, filament_diameter=1.75):
+        if data == b'block':
+            started.set()
+            unblock.wait(10)
+            raise ValueError('bad upload')
+        return real_load(data, file_type, filament_diameter)
+
+    monkeypatch.setattr(parse_jobs, 'load_upload', load_upload)
+    jobs = ParseJobs(ParseCache(), workers=1)
+    running = jobs.submit('a', 'k1', b'block', 'stl')
+    started.wait(10)
+    queued = jobs.submit('a', 'k2', _box_stl_bytes(), 'stl')
+    shared = jobs.submit('a', 'k3', _box_stl_bytes((1, 1, 1)), 'stl')
+    assert jobs.submit('b', 'k3', _box_stl_bytes((1, 1, 1)), 'stl') is shared
+    assert jobs.status(running) == 'running' and jobs.status(queued) == 'queued'
+
+    # 'a' now only shows k1: k2 is dropped, k3 is still wanted by 'b'
+    assert jobs.release('a', keep=[jobs.job_key('k1', 'stl')]) == 1
+    assert queued.cancelled() and not shared.cancelled()
+
+    unblock.set()
+    with pytest.raises(ValueError, match='bad upload'):
+        running.result(timeout=30)
+    assert shared.result(timeout=30)['kind'] == 'mesh'
+    assert jobs.pending == 0
+
+
+def test_gcode_results_are_kept_per_filament_diameter():
+    gcode = b'G21\nG90\nM82\nG1 Z0.2 F600\nG1 X10 Y0 E5 F1200\nG1 X10 Y10 E10\n'
+    jobs = ParseJobs(ParseCache(), workers=1)
+    thin = jobs.submit('a', 'g', gcode, 'gcode', 1.75).result(timeout=30)
+    thick = jobs.submit('a', 'g', gcode, 'gcode', 2.85).result(timeout=30)
+    assert thin['kind'] == 'gcode'
+    assert thick['gcode']['filament_volume_cm3'] > thin['gcode']['filament_volume_cm3']
+    assert jobs.submit('a', 'g', None, 'gcode', 1.75).result()['gcode'] == thin['gcode']
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from utils.catalog import get_catalog
+from utils.cost_calculator import (
+    calc_material_cost, calc_energy_cost, calc_total_cost, calc_depreciation_cost
+)
+from utils.pipeline import Pipeline, quote_graph
+from utils.tariffs import TARIFFS, tariff_energy_cost
+
+
+def _counts(graph):
+    return {entry['node']: (entry['hits'], entry['misses']) for entry in graph.stats()}
+
+
+def test_only_dirty_nodes_recompute():
+    graph = Pipeline()
+    calls = []
+    graph.add('double', lambda x: calls.append('double') or x * 2)
+    graph.add('shifted', lambda y: calls.append('shifted') or y + 1)
+    graph.add('total', lambda double, shifted: calls.append('total') or double + shifted)
+    graph.update(x=1, y=1)
+    assert graph['total'] == 4
+    graph.update(x=1, y=5)
+    assert graph['total'] == 8
+    assert calls == ['double', 'shifted', 'total', 'shifted', 'total']
+    assert _counts(graph) == {'double': (1, 1), 'shifted': (0, 2), 'total': (0, 2)}
+    graph.reset_stats()
+    assert graph['total'] == 8
+    assert _counts(graph) == {'double': (1, 0), 'shifted': (1, 0), 'total': (1, 0)}
+
+
+def test_unchanged_results_stop_propagation():
+    graph = Pipeline()
+    calls = []
+    graph.add('sign', lambda x: calls.append('sign') or (x > 0))
+    graph.add('label', lambda sign: calls.append('label') or ('positive' if sign else 'negative'))
+    graph.set('x', 1)
+    assert graph['label'] == 'positive'
+    # sign reruns but gives the same answer, so label is reused
+    graph.set('x', 2)
+    assert graph['label'] == 'positive'
+    assert calls == ['sign', 'label', 'sign']
+    # Keyed inputs only change with their key
+    graph.add('size', lambda mesh: calls.append('size') or len(mesh))
+    graph.set('mesh', np.zeros(3), key='a')
+    graph['size']
+    graph.set('mesh', np.zeros(3), key='a')
+    graph['size']
+    assert calls.count('size') == 1
+
+
+def test_errors():
+    graph = Pipeline()
+    graph.add('double', lambda x: x * 2)
+    with pytest.raises(ValueError):
+        graph['double']
+    with pytest.raises(ValueError):
+        graph.add('double', lambda x: x)
+    with pytest.raises(ValueError):
+        graph.add('x', lambda: 1)
+    with pytest.raises(ValueError):
+        graph.set('double', 1)
+
+
+def test_quote_graph_matches_cost_functions():
+    printer = get_catalog().printers['Prusa Research']['Prusa MK4']
+    graph = quote_graph()
+    graph.update(
+        volume_cm3=40.0, density=1.24, cost_per_kg=20.0, support_cost=0.5, print_time_hr=6.0,
+        power_watt=120, electricity_rate=0.34, tariff=None, start_hr=0.0, printer=printer,
+        markup_percent=30
+    )
+    material = calc_material_cost(40.0, 1.24, 20.0) + 0.5
+    energy = calc_energy_cost(6.0, 120, 0.34)
+    total = calc_total_cost(material, energy, 30)
+    assert graph['total_with_depreciation'] == pytest.approx(total + calc_depreciation_cost(printer, 6.0))
+    assert graph['cheapest_start'] is None
+
+    # Moving the markup reprices without touching energy or depreciation
+    graph.reset_stats()
+    graph.set('markup_percent', 50)
+    assert graph['total_with_depreciation'] == pytest.approx(
+        calc_total_cost(material, energy, 50) + calc_depreciation_cost(printer, 6.0)
+    )
+    counts = _counts(graph)
+    assert counts['total_cost'] == (0, 1)
+    assert counts['energy_cost'] == counts['depreciation_cost'] == counts['material_cost'] == (1, 0)
+
+    graph.set('tariff', TARIFFS['Economy 7'], key='Economy 7')
+    graph.set('start_hr', 18.0)
+    assert graph['energy_cost'] == tariff_energy_cost(TARIFFS['Economy 7'], 18.0, 6.0, 120)
+    start, cost = graph['cheapest_start']
+    assert cost <= graph['energy_cost']
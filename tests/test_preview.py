@@ -0,0 +1,37 @@
+import numpy as np
+import trimesh
+from utils.preview import decimate, build_preview
+
+
+def test_decimate_respects_face_budget():
+    mesh = trimesh.creation.icosphere(subdivisions=6, radius=10)
+    vertices, faces = decimate(mesh.vertices, mesh.faces, face_budget=5000)
+    assert 2500 <= len(faces) <= 5000
+    assert vertices.dtype == np.float32 and faces.dtype == np.int32
+    assert faces.max() < len(vertices)
+    # Clustering should keep the overall shape
+    simplified = trimesh.Trimesh(vertices, faces, process=False)
+    assert abs(simplified.volume / mesh.volume - 1) < 0.02
+
+
+def test_decimate_samples_faces_when_clustering_cannot_fit():
+    # Even the coarsest grid leaves over a hundred faces of a sphere
+    mesh = trimesh.creation.icosphere(subdivisions=4, radius=10)
+    vertices, faces = decimate(mesh.vertices, mesh.faces, face_budget=50)
+    assert 0 < len(faces) <= 50
+    assert np.array_equal(np.unique(faces), np.arange(len(vertices)))
+
+
+def test_small_mesh_is_only_quantised():
+    mesh = trimesh.creation.box(extents=(1, 2, 3))
+    vertices, faces = decimate(mesh.vertices, mesh.faces, face_budget=5000)
+    assert len(faces) == len(mesh.faces)
+    np.testing.assert_allclose(vertices, mesh.vertices)
+
+
+def test_build_preview_is_cached_per_key_and_budget():
+    mesh = trimesh.creation.icosphere(subdivisions=4)
+    first = build_preview(mesh, face_budget=1000, key='sphere')
+    assert build_preview(mesh, face_budget=1000, key='sphere') is first
+    assert build_preview(mesh, face_budget=2000, key='sphere') is not first
+    assert first.decimated and first.source_faces == len(mesh.faces)
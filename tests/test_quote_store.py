@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from utils.batch_quote import make_settings, price_job
+from utils.catalog import load_catalog, DEFAULT_CATALOG_DIR
+from utils.cost_calculator import calc_costs, calc_material_cost
+from utils.quote_store import QuoteStore, main
+
+
+def _quote(mesh_hash, customer, settings, volume=20.0, hours=2.0, **extra):
+    return {
+        'mesh_hash': mesh_hash, 'file_type': 'stl', 'volume_cm3': volume,
+        'bbox': {'x': 10, 'y': 20, 'z': 30}, 'print_time_hr': hours,
+        'settings': settings, 'customer': customer, **extra
+    }
+
+
+def test_saves_and_finds_quotes():
+    pla = make_settings('PLA')
+    with QuoteStore(':memory:') as store:
+        ids = store.add_quotes([
+            _quote('a.stl', 'ACME', pla, created_at=100),
+            _quote('a.stl', 'Initech', make_settings('PETG'), created_at=200),
+            _quote('b.stl', 'ACME', make_settings('PLA', 'Prusa Research', 'Prusa MK4'), volume=5, created_at=300)
+        ])
+        assert len(ids) == 3 and store.count() == 3
+        acme = store.find(customer='ACME')
+        assert [quote['mesh_hash'] for quote in acme] == ['b.stl', 'a.stl']
+        assert acme[1]['total_cost'] == pytest.approx(price_job(20.0, 2.0, pla)['total_cost'])
+        assert acme[1]['bbox_z'] == 30
+        assert [quote['id'] for quote in store.find(material='PLA', since=150)] == [ids[2]]
+        assert store.find(make='Prusa Research', model='Prusa MK4')[0]['volume_cm3'] == 5
+        # The second quote of a.stl reuses its geometry row
+        assert store._db.execute("SELECT COUNT(*) FROM geometry").fetchone()[0] == 2
+        plan = store._db.execute("EXPLAIN QUERY PLAN SELECT * FROM quotes WHERE customer = 'ACME'").fetchall()
+        assert 'quotes_customer' in str([tuple(row) for row in plan])
+
+
+def test_reprices_only_quotes_linked_to_changed_entries(tmp_path):
+    catalog = load_catalog()
+    custom = make_settings('PLA', cost_per_kg=99.0)
+    with QuoteStore(str(tmp_path / 'quotes.db')) as store:
+        store.add_quotes([
+            _quote('a.stl', 'ACME', make_settings('PLA')),
+            _quote('b.stl', 'ACME', custom),
+            _quote('c.stl', 'ACME', make_settings('PETG')),
+            _quote('d.stl', 'ACME', make_settings('PLA'), hours=5.0, slicer_time=True)
+        ], catalog=catalog)
+        assert store.reprice(catalog) == 0
+
+        for name in ('printers.json', 'materials.json'):
+            shutil.copy(os.path.join(DEFAULT_CATALOG_DIR, name), tmp_path / name)
+        materials = json.loads((tmp_path / 'materials.json').read_text())
+        materials['PLA']['cost_per_kg'] *= 2
+        (tmp_path / 'materials.json').write_text(json.dumps(materials))
+        changed = load_catalog(str(tmp_path))
+
+        before = {quote['mesh_hash']: quote for quote in store.find()}
+        assert store.reprice(changed) == 2
+        after = {quote['mesh_hash']: quote for quote in store.find()}
+        for name in ('a.stl', 'd.stl'):
+            assert after[name]['cost_per_kg'] == materials['PLA']['cost_per_kg']
+            assert after[name]['material_cost'] == pytest.approx(2 * before[name]['material_cost'], abs=1e-4)
+            assert after[name]['energy_cost'] == before[name]['energy_cost']
+        assert after['d.stl']['print_time_hr'] == 5.0
+        # Custom prices and other materials are left alone
+        assert after['b.stl'] == before['b.stl'] and after['c.stl'] == before['c.stl']
+        assert store.reprice(changed) == 0
+
+    assert main(['--db', str(tmp_path / 'quotes.db'), 'reprice']) == 0
+
+
+def test_print_time_is_kept_per_quote(tmp_path):
+    # Same file sliced with different settings
+    with QuoteStore(':memory:') as store:
+        store.add_quotes([
+            _quote('a.stl', 'ACME', make_settings('PLA'), hours=2.0, created_at=100),
+            _quote('a.stl', 'ACME', make_settings('PLA'), hours=8.0, created_at=200)
+        ])
+        before = store.find()
+        assert [quote['print_time_hr'] for quote in before] == [8.0, 2.0]
+
+        for name in ('printers.json', 'materials.json'):
+            shutil.copy(os.path.join(DEFAULT_CATALOG_DIR, name), tmp_path / name)
+        materials = json.loads((tmp_path / 'materials.json').read_text())
+        materials['PLA']['cost_per_kg'] *= 2
+        (tmp_path / 'materials.json').write_text(json.dumps(materials))
+        assert store.reprice(load_catalog(str(tmp_path))) == 2
+        after = store.find()
+        assert [quote['print_time_hr'] for quote in after] == [8.0, 2.0]
+        assert [quote['energy_cost'] for quote in after] == [quote['energy_cost'] for quote in before]
+        assert after[0]['energy_cost'] == pytest.approx(4 * after[1]['energy_cost'], abs=1e-4)
+
+
+def test_saved_total_includes_supports(tmp_path):
+    catalog = load_catalog()
+    pla = make_settings('PLA', cost_per_kg=30.0)
+    pva = catalog.materials['PVA']
+    printer = pla['printer']
+
+    def shown(support_cost):
+        # As the app prices the displayed quote
+        return calc_costs(
+            volume_cm3=20.0, support_cost=support_cost, print_time_hr=2.0, density=pla['density'],
+            cost_per_kg=pla['cost_per_kg'], power_watt=printer['avg_power_watts'],
+            electricity_rate=pla['electricity_rate'], markup_percent=pla['markup_percent'],
+            printer_cost=printer['cost'], upgrades=printer['upgrades'], maintenance=printer['maintenance'],
+            lifetime_hours=printer['lifetime_hours']
+        )['total_with_depreciation']
+
+    with QuoteStore(':memory:') as store:
+        store.add_quotes([
+            _quote('a.stl', 'ACME', pla, support_volume_cm3=4.0, created_at=100),
+            _quote('a.stl', 'ACME', pla, support_volume_cm3=3.0, support_material='PVA', created_at=200)
+        ], catalog=catalog)
+        soluble, regular = store.find()
+        assert regular['total_cost'] == pytest.approx(shown(calc_material_cost(4.0, pla['density'], 30.0)), abs=1e-4)
+        assert soluble['total_cost'] == pytest.approx(
+            shown(calc_material_cost(3.0, pva['density'], pva['cost_per_kg'])), abs=1e-4
+        )
+        assert regular['support_material'] is None and soluble['support_material'] == 'PVA'
+
+        # Soluble supports follow the catalog's PVA price even on a custom main material
+        for name in ('printers.json', 'materials.json'):
+            shutil.copy(os.path.join(DEFAULT_CATALOG_DIR, name), tmp_path / name)
+        materials = json.loads((tmp_path / 'materials.json').read_text())
+        materials['PVA']['cost_per_kg'] *= 2
+        (tmp_path / 'materials.json').write_text(json.dumps(materials))
+        assert store.reprice(load_catalog(str(tmp_path))) == 1
+        repriced = store.find()[0]
+        assert repriced['support_cost_per_kg'] == materials['PVA']['cost_per_kg']
+        assert repriced['material_cost'] == pytest.approx(
+            soluble['material_cost'] + calc_material_cost(3.0, pva['density'], pva['cost_per_kg']), abs=1e-4
+        )
+
+
+def test_rejects_settings_without_printer():
+    settings = make_settings('PLA')
+    del settings['make']
+    with QuoteStore(':memory:') as store, pytest.raises(ValueError):
+        store.add_quote('a.stl', 'stl', 1.0, None, 1.0, settings)
@@ -0,0 +1,91 @@
+import pytest
+
+from utils.catalog import load_catalog
+from utils.scheduler import Job, Printer, Schedule, build_fleet, jobs_from_quotes, schedule_jobs, main
+
+CHEAP = {'cost': 200, 'upgrades': 0, 'maintenance': 0, 'lifetime_hours': 5000, 'avg_power_watts': 100,
+         'build_volume_mm': [200, 200, 200]}
+DEAR = {'cost': 2000, 'upgrades': 0, 'maintenance': 0, 'lifetime_hours': 5000, 'avg_power_watts': 300,
+        'build_volume_mm': [350, 350, 350]}
+
+
+def _fleet():
+    return [Printer(f'cheap {n}', 'Cheap', 'C', CHEAP) for n in (1, 2)] + [Printer('dear', 'Dear', 'D', DEAR)]
+
+
+def _no_overlaps(schedule):
+    for queue in schedule.queues.values():
+        for (_, end, _, _), (start, _, _, _) in zip(queue, queue[1:]):
+            assert start >= end - 1e-9
+
+
+def test_lpt_balances_makespan():
+    # LPT packs 3+3 / 2+2+2 style loads onto identical printers
+    jobs = [Job(f'j{n}', hours) for n, hours in enumerate([3, 3, 2, 2, 2])]
+    printers = [Printer(f'p{n}', 'Cheap', 'C', CHEAP) for n in (1, 2)]
+    schedule = schedule_jobs(jobs, printers)
+    assert schedule.makespan == pytest.approx(7)
+    assert len(schedule.timeline()) == 5
+    _no_overlaps(schedule)
+
+    # A faster printer takes a larger share
+    fast = schedule_jobs([Job(f'j{n}', 1) for n in range(9)], [
+        Printer('slow', 'Cheap', 'C', CHEAP), Printer('fast', 'Cheap', 'C', CHEAP, speed=2.0)
+    ])
+    assert len(fast.queues['fast']) == 6 and fast.makespan == pytest.approx(3)
+
+
+def test_cost_objective_respects_deadline_and_size():
+    jobs = [Job(f'j{n}', 4) for n in range(6)] + [Job('big', 2, (300, 100, 50))]
+    cheapest = schedule_jobs(jobs, _fleet(), objective='cost')
+    # Everything that fits goes on the cheap printers; the big part can only go on the dear one
+    assert [entry[2].name for entry in cheapest.queues['dear']] == ['big']
+    assert cheapest.makespan == pytest.approx(12)
+
+    rushed = schedule_jobs(jobs, _fleet(), objective='cost', deadline_hr=10)
+    assert rushed.makespan == pytest.approx(10)
+    assert rushed.total_cost > cheapest.total_cost
+    assert sum(row['cost'] for row in rushed.timeline()) == pytest.approx(rushed.total_cost)
+
+    with pytest.raises(ValueError):
+        schedule_jobs([Job('huge', 1, (400, 400, 10))], _fleet())
+    with pytest.raises(ValueError):
+        Schedule(_fleet(), objective='speed')
+
+
+def test_incremental_updates():
+    schedule = schedule_jobs([Job(f'j{n}', 5) for n in range(6)], _fleet())
+    before = {name: list(queue) for name, queue in schedule.queues.items()}
+    printer = schedule.add_job(Job('late', 1))
+    assert schedule.assignment['late'] == printer
+    assert all(schedule.queues[name][:len(queue)] == queue for name, queue in before.items())
+    with pytest.raises(ValueError):
+        schedule.add_job(Job('late', 1))
+
+    cost = schedule.total_cost
+    moved = schedule.fail_printer('cheap 1', at_hr=6)
+    # The job running at 6h restarts elsewhere; the finished one stays
+    assert len(schedule.queues['cheap 1']) == 1 and moved
+    assert all(schedule.assignment[name] != 'cheap 1' for name in moved)
+    assert all(row['start_hr'] >= 6 for row in schedule.timeline() if row['job'] in moved)
+    assert len(schedule.assignment) == 7 and schedule.total_cost > cost - 1e-9
+    _no_overlaps(schedule)
+
+
+def test_fleet_and_quotes_cli(tmp_path, capsys):
+    fleet = build_fleet([('Bambu Lab', 'A1', 2), ('Prusa Research', 'Prusa MK4', 1, 1.5)], load_catalog())
+    assert [printer.name for printer in fleet][-1] == 'Prusa Research Prusa MK4 #1'
+    rows = [
+        {'path': 'a.stl', 'status': 'ok', 'print_time_hr': '2.5', 'bbox_x': '20', 'bbox_y': '20', 'bbox_z': '10'},
+        {'path': 'b.stl', 'status': 'error', 'print_time_hr': ''},
+        {'path': 'c.stl', 'status': 'ok', 'print_time_hr': '1.0', 'bbox_x': '', 'bbox_y': '', 'bbox_z': ''}
+    ]
+    jobs = jobs_from_quotes(rows)
+    assert [job.name for job in jobs] == ['a.stl', 'c.stl'] and jobs[1].size_mm is None
+
+    quotes = tmp_path / 'quotes.csv'
+    quotes.write_text('path,status,print_time_hr,bbox_x,bbox_y,bbox_z\na.stl,ok,2.5,20,20,10\nc.stl,ok,1.0,,,\n')
+    output = tmp_path / 'schedule.csv'
+    assert main([str(quotes), '--printer', 'Bambu Lab:A1=2', '-o', str(output)]) == 0
+    assert output.read_text().count('\n') == 3
+    assert '2 jobs on 2 printers' in capsys.readouterr().out
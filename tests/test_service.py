@@ -0,0 +1,92 @@
+import io
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import trimesh
+
+from utils import service as service_module
+from utils.service import QuoteService, create_app
+
+
+def _cube_stl():
+    buffer = io.BytesIO()
+    trimesh.creation.box(extents=(10, 10, 10)).export(buffer, file_type='stl')
+    return buffer.getvalue()
+
+
+def _run(app, scenario):
+    """Run `scenario(client)` against `app` in-process"""
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+
+def test_quote_costs_and_errors():
+    app = create_app(QuoteService(executor=ThreadPoolExecutor(2)))
+
+    async def scenario(client):
+        response = await client.post(
+            '/quote',
+            files={'file': ('cube.stl', _cube_stl())},
+            data={'material': 'PETG', 'make': 'Bambu Lab', 'model': 'A1', 'print_time_hr': '2'}
+        )
+        assert response.status_code == 200
+        quote = response.json()
+        assert abs(quote['volume_cm3'] - 1.0) < 1e-6
+        assert quote['print_time_hr'] == 2.0
+        assert quote['material'] == 'PETG'
+        assert quote['total_cost'] > quote['material_cost'] > 0
+
+        priced = (await client.post('/costs', json={'volume_cm3': [1.0, 2.0], 'print_time_hr': 2, 'material': 'PETG'})).json()
+        assert priced['material_cost'][0] == quote['material_cost']
+        assert priced['total_with_depreciation'][0] == quote['total_cost']
+        assert priced['material_cost'][1] > priced['material_cost'][0]
+        for fields in ({'print_time_hr': 2}, {'volume_cm3': None, 'print_time_hr': 2}):
+            missing = await client.post('/costs', json=fields)
+            assert missing.status_code == 400 and 'volume_cm3' in missing.json()['error']
+
+        bad_material = await client.post('/quote', files={'file': ('cube.stl', b'x')}, data={'material': 'Unobtainium'})
+        assert bad_material.status_code == 400
+        assert (await client.post('/quote', files={'file': ('notes.txt', b'x')})).status_code == 400
+        assert (await client.post('/measure', files={'file': ('broken.stl', b'not a mesh')})).status_code == 422
+        assert (await client.get('/health')).json()['queued'] == 0
+
+    _run(app, scenario)
+
+
+def test_identical_uploads_are_coalesced_and_queue_is_bounded(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def slow_measure(data, file_type, options):
+        calls.append(data)
+        release.wait(10)
+        return {'volume_cm3': float(len(data)), 'bbox': {'x': 1.0, 'y': 1.0, 'z': 1.0}, 'print_time_hr': 1.0}, None
+
+    monkeypatch.setattr(service_module, '_measure', slow_measure)
+    service = QuoteService(max_queue=1, executor=ThreadPoolExecutor(2))
+    app = create_app(service)
+
+    async def scenario(client):
+        def post(data):
+            return client.post('/measure', files={'file': ('part.stl', data)})
+
+        first = asyncio.create_task(post(b'same bytes'))
+        second = asyncio.create_task(post(b'same bytes'))
+        while service.stats['coalesced'] < 1:
+            await asyncio.sleep(0.01)
+        busy = await post(b'other bytes')
+        release.set()
+        responses = await asyncio.gather(first, second)
+        repeat = await post(b'same bytes')
+        return busy, responses, repeat
+
+    busy, responses, repeat = _run(app, scenario)
+    assert busy.status_code == 503 and busy.headers['retry-after']
+    assert [r.json()['volume_cm3'] for r in responses] == [10.0, 10.0]
+    assert repeat.status_code == 200
+    assert calls == [b'same bytes']
+    assert service.stats == {'computed': 1, 'coalesced': 1, 'cached': 1, 'rejected': 1}
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import trimesh
+from utils.cost_calculator import estimate_print_time
+from utils.slicer import slice_layers
+
+
+def test_box_slices_have_exact_area_and_perimeter():
+    box = trimesh.creation.box(extents=(20, 10, 5))
+    stats = slice_layers(box.vertices, box.faces, layer_height=0.5)
+    assert len(stats.heights) == 10
+    assert stats.area == pytest.approx(np.full(10, 200.0))
+    assert stats.perimeter == pytest.approx(np.full(10, 60.0))
+
+
+def test_hole_area_is_subtracted():
+    ring = trimesh.creation.annulus(r_min=5, r_max=10, height=4, sections=256)
+    stats = slice_layers(ring.vertices, ring.faces, layer_height=0.2)
+    expected = np.pi * (10 ** 2 - 5 ** 2)
+    assert stats.area.mean() == pytest.approx(expected, rel=0.01)
+
+
+def test_tall_thin_part_takes_longer_than_cube_estimate():
+    rod = trimesh.creation.box(extents=(4, 4, 120))
+    sliced = estimate_print_time(rod.volume, mesh=rod)
+    cube = estimate_print_time(rod.volume)
+    assert sliced["details"]["method"] == "sliced"
+    assert sliced["details"]["layers"] == 600
+    assert sliced["print_time_hours"] > cube["print_time_hours"]
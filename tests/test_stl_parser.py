@@ -1,6 +1,91 @@
+import io
 import pytest
-from utils.stl_parser import parse_stl
+import trimesh
+from utils.stl_parser import parse_stl, _parse_ascii_stl, _parse_obj
 
-def test_parse_stl_placeholder():
-    # Placeholder: actual test would require a sample STL file
-    assert True 
\ No newline at end of file
+def _sphere_stl(file_type='stl'):
+    mesh = trimesh.creation.icosphere(subdivisions=3, radius=10)
+    mesh.apply_translation([5, 0, 2])
+    buffer = io.BytesIO()
+    mesh.export(buffer, file_type=file_type)
+    return mesh, buffer.getvalue()
+
+
+def test_binary_stl_fast_path_matches_trimesh():
+    mesh, data = _sphere_stl()
+    volume_cm3, bbox, parsed = parse_stl(io.BytesIO(data))
+    assert abs(volume_cm3 - mesh.volume / 1000) < 1e-6
+    assert abs(bbox['x'] - 20) < 1e-4 and abs(bbox['z'] - 20) < 1e-4
+    assert len(parsed.vertices) == len(mesh.vertices)
+
+
+def test_binary_stl_from_path_without_mesh(tmp_path):
+    mesh, data = _sphere_stl()
+    path = tmp_path / 'sphere.stl'
+    path.write_bytes(data)
+    volume_cm3, _, parsed = parse_stl(str(path), build_mesh=False)
+    assert parsed is None
+    assert abs(volume_cm3 - mesh.volume / 1000) < 1e-6
+
+
+def test_ascii_stl_streams_in_small_blocks():
+    mesh, data = _sphere_stl('stl_ascii')
+    # Tiny blocks force facets to straddle block boundaries
+    volume_cm3, bbox, parsed = _parse_ascii_stl(io.BytesIO(data), block_size=1000)
+    assert abs(volume_cm3 - mesh.volume / 1000) < 1e-6
+    assert abs(bbox['y'] - 20) < 1e-4
+    assert len(parsed.faces) == len(mesh.faces)
+
+
+def test_truncated_ascii_stl_is_an_error():
+    _, data = _sphere_stl('stl_ascii')
+    last_facet = data.rfind(b'facet normal')
+    # Cut inside the last facet's vertices, and just after it opens
+    for cut in (data[:data.rfind(b'vertex')], data[:data.find(b'\n', last_facet) + 1]):
+        with pytest.raises(ValueError, match='facet'):
+            _parse_ascii_stl(io.BytesIO(cut), block_size=1000)
+        with pytest.raises(ValueError):
+            parse_stl(io.BytesIO(cut))
+
+
+def test_obj_quads_references_and_relative_indices():
+    # 10 mm cube written as quads, with texture/normal references and
+    # relative (negative) indices on the last face
+    data = b"""# cube
+v 0 0 0
+v 10 0 0
+v 10 10 0
+v 0 10 0
+v 0 0 10
+v 10 0 10
+v 10 10 10
+v 0 10 10
+vn 0 0 1
+f 1/1/1 4/1/1 3/1/1 2/1/1
+f 5//1 6//1 7//1 8//1
+f 1 2 6 5
+f 2 3 7 6
+f 3 4 8 7
+f -8 -4 -1 -5
+"""
+    volume_cm3, bbox, parsed = _parse_obj(io.BytesIO(data))
+    assert abs(volume_cm3 - 1.0) < 1e-9
+    assert bbox == {'x': 10, 'y': 10, 'z': 10}
+    assert len(parsed.faces) == 12
+
+
+def test_obj_skips_degenerate_face_lines():
+    # A two-corner face line must not shift the faces after it
+    data = b"""v 0 0 0
+v 10 0 0
+v 0 10 0
+v 0 0 10
+f 1 2
+f 1 3 2
+f 1 2 4
+f 1 4 3
+f 2 3 4
+"""
+    volume_cm3, _, parsed = _parse_obj(io.BytesIO(data))
+    assert abs(volume_cm3 - 1000 / 6 / 1000) < 1e-9
+    assert parsed.faces.tolist() == [[0, 2, 1], [0, 1, 3], [0, 3, 2], [1, 2, 3]]
@@ -0,0 +1,41 @@
+import pytest
+import trimesh
+
+from utils.supports import analyse_overhangs, support_volume_cm3, SUPPORT_STYLES
+
+
+def _mushroom():
+    """10 mm cube on the bed under a 30 x 30 x 2 mm cap: 8 cm³ of space under the cap"""
+    stem = trimesh.creation.box(extents=(10, 10, 10))
+    stem.apply_translation((0, 0, 5))
+    cap = trimesh.creation.box(extents=(30, 30, 2))
+    cap.apply_translation((0, 0, 11))
+    return trimesh.util.concatenate([stem, cap])
+
+
+def test_columns_stop_at_the_part_or_the_bed():
+    mesh = _mushroom()
+    analysis = analyse_overhangs(mesh.vertices, mesh.faces)
+    assert analysis['supported_area_cm2'] == pytest.approx(8.0, rel=0.03)
+    assert analysis['column_volume_cm3'] == pytest.approx(8.0, rel=0.03)
+
+    box = trimesh.creation.box(extents=(10, 10, 10))
+    flat = analyse_overhangs(box.vertices, box.faces)
+    assert flat['overhang_faces'] == 0 and flat['column_volume_cm3'] == 0
+
+
+def test_overhang_angle_and_styles():
+    sphere = trimesh.creation.icosphere(subdivisions=5, radius=10)
+    steep = analyse_overhangs(sphere.vertices, sphere.faces, overhang_angle=45)
+    # Under the cap below 45°: pi r² h - (2 pi / 3)(R³ - (R² - r²)^1.5), r = R sin 45°
+    assert steep['column_volume_cm3'] == pytest.approx(0.217, rel=0.05)
+    shallow = analyse_overhangs(sphere.vertices, sphere.faces, overhang_angle=70)
+    assert shallow['column_volume_cm3'] < steep['column_volume_cm3']
+
+    volumes = {style: support_volume_cm3(steep, style) for style in SUPPORT_STYLES}
+    assert volumes['tree'] < volumes['regular'] < volumes['soluble']
+    assert support_volume_cm3(steep, 'Regular') == volumes['regular']
+    with pytest.raises(ValueError):
+        support_volume_cm3(steep, 'scaffold')
+    with pytest.raises(ValueError):
+        analyse_overhangs(sphere.vertices, sphere.faces, overhang_angle=120)
@@ -0,0 +1,42 @@
+import pytest
+from utils.cost_calculator import calc_costs
+from utils.sweep import price_sweep
+
+MATERIALS = {
+    "PLA": {"density": 1.24, "cost_per_kg": 25.0},
+    "PETG": {"density": 1.27, "cost_per_kg": 30.0},
+}
+PRINTERS = {
+    "Creality": {
+        "K1": {"cost": 399, "upgrades": 100, "maintenance": 75, "lifetime_hours": 4000, "avg_power_watts": 150},
+        "K1 Max": {"cost": 599, "upgrades": 150, "maintenance": 75, "lifetime_hours": 4000, "avg_power_watts": 150},
+    }
+}
+TARIFFS = {"Peak": 0.40, "Off-Peak": 0.25, "Custom": None}
+
+
+def test_sweep_covers_full_grid_and_matches_cost_engine():
+    table, _ = price_sweep(50, 6, MATERIALS, PRINTERS, TARIFFS, [0, 20, 50])
+    assert len(table) == 2 * 2 * 2 * 3
+
+    row = table[
+        (table.material == "PETG") & (table.printer == "Creality K1")
+        & (table.tariff == "Off-Peak") & (table.markup_percent == 20)
+    ].iloc[0]
+    k1 = PRINTERS["Creality"]["K1"]
+    expected = calc_costs(
+        volume_cm3=50, density=1.27, cost_per_kg=30.0, print_time_hr=6, power_watt=150,
+        electricity_rate=0.25, markup_percent=20, printer_cost=k1["cost"],
+        upgrades=k1["upgrades"], maintenance=k1["maintenance"], lifetime_hours=k1["lifetime_hours"]
+    )
+    assert row.total_with_depreciation == pytest.approx(float(expected["total_with_depreciation"]))
+
+
+def test_sensitivity_ranks_factors_by_swing():
+    _, sensitivity = price_sweep(50, 6, MATERIALS, PRINTERS, TARIFFS, [0, 100])
+    assert list(sensitivity.factor)[0] == "markup_percent"
+    assert sensitivity.swing.is_monotonic_decreasing
+    by_factor = sensitivity.set_index("factor")
+    assert by_factor.loc["material", "cheapest"] == "PLA"
+    assert by_factor.loc["tariff", "cheapest"] == "Off-Peak"
+    assert by_factor.variance_share.sum() <= 1 + 1e-9
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from utils.cost_calculator import calc_energy_cost
+from utils.tariffs import TARIFFS, time_of_use, tariff_energy_cost, cheapest_start
+
+
+def test_energy_cost_integrates_over_the_print_window():
+    economy7 = TARIFFS['Economy 7']
+    # 18:00 to 08:00: 7 h at the night rate, 7 h at the day rate
+    assert tariff_energy_cost(economy7, 18, 14, 120) == pytest.approx(0.12 * (7 * 0.20 + 7 * 0.39))
+    # A flat tariff matches calc_energy_cost, across midnight and days
+    assert tariff_energy_cost(TARIFFS['Standard'], 22.25, 30, 150) == calc_energy_cost(30, 150, 0.34)
+    costs = tariff_energy_cost(economy7, np.array([1.0, 12.0]), 2, 1000)
+    assert costs.tolist() == [pytest.approx(0.4), pytest.approx(0.78)]
+
+
+def test_cheapest_start_matches_brute_force():
+    prices = time_of_use(0.30, [(16, 19, 0.55), (23, 5, 0.12)])
+    durations = np.array([0.2, 3.0, 7.3, 14.0, 30.0])
+    starts, costs = cheapest_start(prices, durations, 200, earliest_hr=9, latest_hr=33)
+    grid = np.arange(9, 33.0001, 0.05)
+    for duration, start, cost in zip(durations, starts, costs):
+        brute = tariff_energy_cost(prices, grid, duration, 200)
+        assert 9 <= start <= 33
+        assert cost == pytest.approx(brute.min(), abs=1e-4)
+        assert tariff_energy_cost(prices, start, duration, 200) == pytest.approx(cost, abs=1e-4)
+    # A short print goes in the cheap night window
+    assert 23 <= starts[0] <= 29
+    with pytest.raises(ValueError):
+        cheapest_start(prices, [-1.0], 200)
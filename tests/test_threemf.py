@@ -0,0 +1,46 @@
+import io
+import zipfile
+import pytest
+import trimesh
+from utils.threemf import read_plate_metadata
+
+SLICE_INFO = b"""<?xml version="1.0" encoding="UTF-8"?>
+<config>
+  <plate>
+    <metadata key="index" value="1"/>
+    <metadata key="prediction" value="5400"/>
+    <metadata key="weight" value="12.50"/>
+    <filament id="1" type="PLA" color="#FFFFFF" used_m="4.19" used_g="12.50"/>
+  </plate>
+  <plate>
+    <metadata key="index" value="2"/>
+    <filament id="1" type="PLA" color="#FFFFFF" used_m="1.00" used_g="3.10"/>
+  </plate>
+</config>
+"""
+
+
+def _project(slice_info=None):
+    data = io.BytesIO(trimesh.creation.box(extents=(10, 10, 10)).export(file_type='3mf'))
+    if slice_info:
+        with zipfile.ZipFile(data, 'a') as archive:
+            archive.writestr('Metadata/slice_info.config', slice_info)
+            archive.writestr('Metadata/plate_1.png', b'\x89PNG')
+    return data.getvalue()
+
+
+def test_reads_sliced_plates_only():
+    plates = read_plate_metadata(io.BytesIO(_project(SLICE_INFO)))
+    assert len(plates) == 1  # plate 2 has no prediction, so it wasn't sliced
+    plate = plates[0]
+    assert plate['plate'] == 1
+    assert plate['print_time_hours'] == pytest.approx(1.5)
+    assert plate['weight_g'] == pytest.approx(12.5)
+    assert plate['filament_length_mm'] == pytest.approx(4190)
+    assert plate['filaments'][0]['type'] == 'PLA'
+    assert plate['thumbnail'] == b'\x89PNG'
+
+
+def test_returns_none_without_slicer_results():
+    assert read_plate_metadata(_project()) is None
+    assert read_plate_metadata(b'not a zip') is None
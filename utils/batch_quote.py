@@ -0,0 +1,395 @@
+"""
+Headless batch quoting.
+
+Prices every STL/OBJ/3MF/G-code file in a directory (or listed in a manifest)
+using the same parser and cost functions as the Streamlit app, and streams
+one result row per file to CSV or JSONL as soon as it is ready.
+
+    python -m utils.batch_quote models/ --output quotes.csv --material PETG
+
+Re-running with the same output file resumes where a crashed run stopped.
+"""
+import os
+import csv
+import json
+import time
+import signal
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.stl_parser import parse_3d_file
+from utils.gcode import analyse_gcode
+from utils.threemf import read_plate_metadata
+from utils.catalog import get_catalog, PRINTER_FIELDS
+from utils.cost_calculator import (
+    calc_material_cost, calc_energy_cost, calc_total_cost, calc_depreciation_cost,
+    estimate_print_time
+)
+
+SUPPORTED_EXTENSIONS = ('stl', 'obj', '3mf', 'gcode')
+# Extra seconds the parent waits past the timeout before killing a worker
+TIMEOUT_GRACE_SECONDS = 5
+
+
+class FileTimeout(BaseException):
+    """
+    Raised by SIGALRM inside a worker. Derives from BaseException so the
+    parsers' `except Exception` fallbacks can't swallow it.
+    """
+
+
+RESULT_FIELDS = [
+    'path', 'status', 'error', 'volume_cm3', 'bbox_x', 'bbox_y', 'bbox_z',
+    'print_time_hr', 'material', 'material_cost', 'energy_cost',
+    'depreciation_cost', 'total_cost', 'elapsed_s'
+]
+
+
+def collect_jobs(source):
+    """
+    Return the model paths to quote.
+
+    `source` is either a directory, walked recursively, or a manifest file:
+    a CSV with a `path` column or a plain text file with one path per line.
+    Relative manifest paths are resolved against the manifest's directory.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.rsplit('.', 1)[-1].lower() in SUPPORTED_EXTENSIONS:
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline='') as f:
+        if source.lower().endswith('.csv'):
+            paths = [row['path'] for row in csv.DictReader(f) if row.get('path')]
+        else:
+            paths = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return [p if os.path.isabs(p) else os.path.join(base, p) for p in paths]
+
+
+def measure_file(source, file_type, settings):
+    """
+    Volume (cm³), bounding box and print time (h) of one file.
+
+    `source` is a path, bytes or file object. Sliced 3MF projects and G-code
+    use the slicer's results; meshes are only built when `settings['slice']`
+    asks for a layer-by-layer estimate. Raises ValueError on failure.
+    """
+    file_type = file_type.lower()
+    plates = read_plate_metadata(source, thumbnails=False) if file_type == '3mf' else None
+    if plates:
+        # Sliced project: the slicer's totals over all plates, meshes are never loaded
+        estimate = {'print_time_hours': sum(p['print_time_hours'] for p in plates)}
+        volume_cm3 = sum(p['weight_g'] for p in plates) / settings['density']
+        bbox = {'x': None, 'y': None, 'z': None}
+    elif file_type == 'gcode':
+        # Sliced files: filament use and time come from the moves
+        estimate = analyse_gcode(source, filament_diameter=settings.get('filament_diameter', 1.75))
+        volume_cm3 = estimate['filament_volume_cm3']
+        bbox = estimate['details']['bbox']
+    else:
+        # The mesh is only built when it will be sliced
+        volume_cm3, bbox, mesh = parse_3d_file(source, file_type, build_mesh=settings.get('slice', False))
+        estimate = estimate_print_time(volume_cm3 * 1000, mesh=mesh)
+    if 'error' in estimate:
+        raise ValueError(f"Print time estimate failed: {estimate['error']}")
+    bbox = {axis: None if bbox[axis] is None else float(bbox[axis]) for axis in 'xyz'}
+    return float(volume_cm3), bbox, float(estimate['print_time_hours'])
+
+
+def price_job(volume_cm3, print_time_hr, settings):
+    """Material, energy, depreciation and total cost of one print, as shown in the app"""
+    printer = settings['printer']
+    material_cost = calc_material_cost(volume_cm3, settings['density'], settings['cost_per_kg'])
+    energy_cost = calc_energy_cost(print_time_hr, printer['avg_power_watts'], settings['electricity_rate'])
+    depreciation_cost = calc_depreciation_cost(printer, print_time_hr)
+    total_cost = calc_total_cost(material_cost, energy_cost, settings['markup_percent']) + depreciation_cost
+    return {
+        'material_cost': material_cost,
+        'energy_cost': energy_cost,
+        'depreciation_cost': round(depreciation_cost, 4),
+        'total_cost': round(total_cost, 4)
+    }
+
+
+def quote_file(path, settings, timeout=None):
+    """Parse one model and price it; never raises, errors are reported in the row"""
+    started = time.perf_counter()
+    row = {'path': path, 'material': settings['material']}
+    if timeout and hasattr(signal, 'setitimer'):
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        file_type = path.rsplit('.', 1)[-1]
+        volume_cm3, bbox, print_time_hr = measure_file(path, file_type, settings)
+        row.update({
+            'status': 'ok',
+            'volume_cm3': round(volume_cm3, 4),
+            **{f'bbox_{axis}': None if bbox[axis] is None else round(bbox[axis], 4) for axis in 'xyz'},
+            'print_time_hr': round(print_time_hr, 4),
+            **price_job(volume_cm3, print_time_hr, settings)
+        })
+    except FileTimeout:
+        row.update({'status': 'timeout', 'error': f"Timed out after {timeout}s"})
+    except Exception as e:
+        row.update({'status': 'error', 'error': str(e)})
+    finally:
+        if timeout and hasattr(signal, 'setitimer'):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    row['elapsed_s'] = round(time.perf_counter() - started, 3)
+    return row
+
+
+def _raise_timeout(signum, frame):
+    raise FileTimeout()
+
+
+class ResultWriter:
+    """Append-only CSV/JSONL writer that flushes every row"""
+
+    def __init__(self, path):
+        self.path = path
+        self.jsonl = path.lower().endswith(('.jsonl', '.json'))
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'a', newline='')
+        self._csv = None
+        if not self.jsonl:
+            self._csv = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+            if not exists:
+                self._csv.writeheader()
+
+    def write(self, row):
+        if self.jsonl:
+            self._file.write(json.dumps(row) + '\n')
+        else:
+            self._csv.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def completed_paths(output_path):
+    """Paths already present in an earlier (possibly interrupted) output file"""
+    if not os.path.exists(output_path):
+        return set()
+    done = set()
+    with open(output_path, newline='') as f:
+        if output_path.lower().endswith(('.jsonl', '.json')):
+            for line in f:
+                try:
+                    done.add(json.loads(line)['path'])
+                except (ValueError, KeyError):
+                    # A half-written last line from a crash
+                    continue
+        else:
+            done.update(row['path'] for row in csv.DictReader(f) if row.get('path'))
+    return done
+
+
+def _report_pid(pids):
+    pids.put(os.getpid())
+
+
+def _new_pool(workers):
+    """Process pool whose workers report their pids, so stuck ones can be killed"""
+    context = multiprocessing.get_context()
+    pids = context.SimpleQueue()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_report_pid, initargs=(pids,))
+    return pool, pids
+
+
+def _kill_pool(pool, pids):
+    """Stop a pool whose worker is stuck in native code and won't see SIGALRM"""
+    while not pids.empty():
+        try:
+            os.kill(pids.get(), signal.SIGTERM)
+        except OSError:
+            # Already exited
+            pass
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_batch(paths, settings, output_path, workers=None, timeout=300, on_result=None):
+    """
+    Quote `paths` over a process pool and stream rows to `output_path`.
+
+    At most `workers` files are in flight, so memory stays bounded for any
+    number of files. Files already in the output are skipped. Returns a
+    summary dict with counts per status.
+
+    A worker that dies takes every file in flight with it. Those files are
+    requeued on a fresh pool and then quoted one at a time, so only the
+    file that actually kills its worker is reported as an error.
+    """
+    workers = workers or os.cpu_count() or 1
+    done = completed_paths(output_path)
+    pending = [p for p in paths if p not in done]
+    pending.reverse()  # pop() from the end keeps the original order
+    summary = {'ok': 0, 'error': 0, 'timeout': 0, 'skipped': len(paths) - len(pending)}
+    # Files that were in flight when a worker died; each runs alone
+    suspects = set()
+
+    def record(row):
+        summary[row['status']] += 1
+        writer.write(row)
+        if on_result:
+            on_result(row)
+
+    writer = ResultWriter(output_path)
+    pool, pids = _new_pool(workers)
+    in_flight = {}
+    try:
+        while pending or in_flight:
+            while pending and len(in_flight) < workers:
+                isolate = pending[-1] in suspects
+                if in_flight and (isolate or any(path in suspects for path, _ in in_flight.values())):
+                    break
+                path = pending.pop()
+                future = pool.submit(quote_file, path, settings, timeout)
+                in_flight[future] = (path, time.monotonic())
+
+            finished, _ = wait(list(in_flight), timeout=1.0, return_when=FIRST_COMPLETED)
+            crashed = []
+            for future in finished:
+                path, _ = in_flight.pop(future)
+                try:
+                    row = future.result()
+                except BrokenProcessPool:
+                    crashed.append(path)
+                    continue
+                except Exception as e:
+                    row = {'path': path, 'material': settings['material'], 'status': 'error', 'error': str(e)}
+                record(row)
+            if crashed:
+                # The rest of the pool's files fail the same way
+                crashed.extend(path for path, _ in in_flight.values())
+                in_flight.clear()
+                if len(crashed) == 1:
+                    record({
+                        'path': crashed[0], 'material': settings['material'],
+                        'status': 'error', 'error': "Worker process died while quoting this file"
+                    })
+                else:
+                    suspects.update(crashed)
+                    pending.extend(reversed(crashed))
+                _kill_pool(pool, pids)
+                pool, pids = _new_pool(workers)
+
+            if timeout:
+                now = time.monotonic()
+                stuck = [
+                    f for f, (_, submitted) in in_flight.items()
+                    if now - submitted > timeout + TIMEOUT_GRACE_SECONDS
+                ]
+                if stuck:
+                    for future in stuck:
+                        path, _ = in_flight.pop(future)
+                        record({
+                            'path': path, 'material': settings['material'],
+                            'status': 'timeout', 'error': f"Timed out after {timeout}s"
+                        })
+                    # Requeue innocent in-flight files and start a fresh pool
+                    pending.extend(path for path, _ in in_flight.values())
+                    in_flight.clear()
+                    _kill_pool(pool, pids)
+                    pool, pids = _new_pool(workers)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        writer.close()
+    return summary
+
+
+def make_settings(material='PLA', make='Bambu Lab', model='A1', cost_per_kg=None,
+                  electricity_rate=0.34, markup_percent=20, slice=False,
+                  filament_diameter=1.75, **printer_overrides):
+    """
+    Quote settings from the catalog. `printer_overrides` (cost, upgrades,
+    maintenance, lifetime_hours, avg_power_watts) replace the catalog's
+    printer details when not None. Raises ValueError for unknown entries.
+    """
+    catalog = get_catalog()
+    materials = catalog.materials
+    if material not in materials:
+        raise ValueError(f"Unknown material '{material}'. Choose from: {', '.join(materials)}")
+    printer = dict(catalog.printer(make, model))
+    unknown = set(printer_overrides) - set(PRINTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown printer fields: {', '.join(sorted(unknown))}")
+    printer.update({key: value for key, value in printer_overrides.items() if value is not None})
+    return {
+        'material': material,
+        'density': materials[material]['density'],
+        'cost_per_kg': cost_per_kg if cost_per_kg is not None else materials[material]['cost_per_kg'],
+        'electricity_rate': electricity_rate,
+        'markup_percent': markup_percent,
+        'slice': slice,
+        'filament_diameter': filament_diameter,
+        'make': make,
+        'model': model,
+        'printer': printer
+    }
+
+
+def build_settings(args):
+    # Explicit flags override the catalog's printer details
+    try:
+        return make_settings(
+            args.material, args.make, args.model,
+            cost_per_kg=args.cost_per_kg,
+            electricity_rate=args.electricity_rate,
+            markup_percent=args.markup,
+            slice=args.slice,
+            filament_diameter=args.filament_diameter,
+            cost=args.printer_cost,
+            upgrades=args.upgrades,
+            maintenance=args.maintenance,
+            lifetime_hours=args.lifetime_hours,
+            avg_power_watts=args.power
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quote a folder or manifest of 3D model files.")
+    parser.add_argument('source', help="Directory to scan, or a .csv/.txt manifest of paths")
+    parser.add_argument('-o', '--output', default='quotes.csv', help="Output .csv or .jsonl (appended to on resume)")
+    parser.add_argument('--material', default='PLA')
+    parser.add_argument('--cost-per-kg', type=float, default=None, help="Override the material price")
+    parser.add_argument('--electricity-rate', type=float, default=0.34, help="£/kWh")
+    parser.add_argument('--markup', type=float, default=20, help="Markup percent")
+    parser.add_argument('--make', default='Bambu Lab', help="Printer make from material_db/printers.json")
+    parser.add_argument('--model', default='A1', help="Printer model from material_db/printers.json")
+    parser.add_argument('--power', type=float, default=None, help="Override the printer power (W)")
+    parser.add_argument('--printer-cost', type=float, default=None)
+    parser.add_argument('--upgrades', type=float, default=None)
+    parser.add_argument('--maintenance', type=float, default=None)
+    parser.add_argument('--lifetime-hours', type=float, default=None)
+    parser.add_argument('--slice', action='store_true', help="Slice each model for print time (slower, more accurate)")
+    parser.add_argument('--filament-diameter', type=float, default=1.75, help="Filament diameter (mm) for G-code files")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--timeout', type=float, default=300, help="Per-file timeout in seconds (0 disables)")
+    args = parser.parse_args(argv)
+
+    settings = build_settings(args)
+    paths = collect_jobs(args.source)
+
+    def report(row):
+        print(f"[{row['status']}] {row['path']}" + (f": {row['error']}" if row.get('error') else ''), flush=True)
+
+    summary = run_batch(paths, settings, args.output, workers=args.workers, timeout=args.timeout, on_result=report)
+    print(
+        f"Done: {summary['ok']} quoted, {summary['error']} failed, "
+        f"{summary['timeout']} timed out, {summary['skipped']} already in {args.output}"
+    )
+    return 0 if not (summary['error'] or summary['timeout']) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
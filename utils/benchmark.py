@@ -0,0 +1,326 @@
+"""
+Performance benchmarks on synthetic meshes.
+
+Times and memory-profiles the quoting pipeline - parsing, preview
+decimation, mesh validation, support estimates, print-time estimates, the
+cost functions and Monte Carlo price ranges - on deterministic meshes from
+utils.synthetic_meshes, appends the results to a JSON history and compares
+runs:
+
+    python -m utils.benchmark run --sizes 1k 100k 1m --label before-change
+    python -m utils.benchmark run --sizes 10m --shapes sphere --formats stl
+    python -m utils.benchmark compare                # latest run vs the one before
+    python -m utils.benchmark compare --baseline before-change --threshold 0.1
+
+`compare` exits with status 1 when any shared benchmark got slower or
+bigger than the threshold allows, so it can gate CI.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+
+from utils.synthetic_meshes import SHAPES, FILE_TYPES, generate_mesh, parse_size, write_mesh
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_HISTORY = 'benchmark_history.json'
+DEFAULT_SIZES = ('1k', '10k', '100k', '1m')
+STAGES = ('parse', 'load', 'preview', 'validate', 'supports', 'print_time', 'sliced_time', 'costs')
+# Allowed slowdown / growth before compare flags a regression
+DEFAULT_THRESHOLD = 0.2
+# Differences below these are noise whatever the ratio
+MIN_SECONDS_DELTA = 0.005
+MIN_PEAK_MB_DELTA = 1.0
+# Jobs priced one at a time by the scalar cost functions
+SCALAR_COST_JOBS = 1000
+
+
+def measure(function, repeat=3, memory=True):
+    """
+    Best and median wall time of `repeat` calls, plus the tracemalloc peak
+    of one extra call (traced separately so tracing doesn't skew timings).
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    result = {'seconds': min(times), 'median_seconds': statistics.median(times)}
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def _model_path(workdir, shape, size, file_type):
+    """Generated model file, written once per workdir and reused afterwards"""
+    path = os.path.join(workdir, f"{shape}_{size}.{file_type}")
+    if not os.path.exists(path):
+        vertices, faces = generate_mesh(shape, size)
+        write_mesh(path + '.part', vertices, faces, file_type)
+        os.replace(path + '.part', path)
+    return path
+
+
+def _mesh_benchmarks(workdir, shape, size, formats, stages, repeat, memory):
+    # Imported here so `compare` doesn't pay for the pipeline modules
+    from utils.stl_parser import parse_3d_file
+    from utils.preview import build_preview
+    from utils.mesh_validation import check_mesh, ray_parity_volume
+    from utils.supports import analyse_overhangs
+    from utils.cost_calculator import estimate_print_time
+
+    results = {}
+    for file_type in formats:
+        path = _model_path(workdir, shape, size, file_type)
+        if 'parse' in stages:
+            results[f"parse/{file_type}/{shape}/{size}"] = measure(
+                lambda: parse_3d_file(path, file_type, build_mesh=False), repeat, memory
+            )
+        if 'load' in stages:
+            results[f"load/{file_type}/{shape}/{size}"] = measure(
+                lambda: parse_3d_file(path, file_type, build_mesh=True), repeat, memory
+            )
+
+    if not {'preview', 'validate', 'supports', 'print_time', 'sliced_time'} & set(stages):
+        return results
+    volume_cm3, _, mesh = parse_3d_file(_model_path(workdir, shape, size, 'stl'), 'stl')
+    triangles = len(mesh.faces)
+    for name in results:
+        results[name]['triangles'] = triangles
+    if 'preview' in stages:
+        # A fresh key per call, otherwise every repeat after the first is a cache hit
+        calls = iter(range(repeat + 1))
+        results[f"preview/{shape}/{size}"] = measure(
+            lambda: build_preview(mesh, key=f"benchmark-{shape}-{size}-{next(calls)}"), repeat, memory
+        )
+    if 'validate' in stages:
+        # Every mesh gets the edge checks; only broken ones pay for the ray casting
+        results[f"validate/{shape}/{size}"] = measure(lambda: check_mesh(mesh.vertices, mesh.faces), repeat, memory)
+        results[f"ray_volume/{shape}/{size}"] = measure(
+            lambda: ray_parity_volume(mesh.vertices, mesh.faces), repeat, memory
+        )
+    if 'supports' in stages:
+        results[f"supports/{shape}/{size}"] = measure(lambda: analyse_overhangs(mesh.vertices, mesh.faces), repeat, memory)
+    if 'print_time' in stages:
+        results[f"print_time/{shape}/{size}"] = measure(
+            lambda: estimate_print_time(volume_cm3 * 1000), repeat, memory
+        )
+    if 'sliced_time' in stages:
+        results[f"sliced_time/{shape}/{size}"] = measure(
+            lambda: estimate_print_time(volume_cm3 * 1000, mesh=mesh), repeat, memory
+        )
+    for name in results:
+        results[name]['triangles'] = triangles
+    return results
+
+
+def _cost_benchmarks(sizes, repeat, memory):
+    import numpy as np
+    from utils.cost_calculator import (
+        calc_costs, calc_material_cost, calc_energy_cost, calc_total_cost, calc_depreciation_cost
+    )
+    from utils.monte_carlo import simulate_quote
+
+    printer = {'cost': 499, 'upgrades': 50, 'maintenance': 50, 'lifetime_hours': 5000, 'avg_power_watts': 100}
+    results = {}
+    for size in sizes:
+        jobs = parse_size(size)
+        volumes = np.linspace(1, 500, jobs)
+        hours = np.linspace(0.1, 40, jobs)
+        results[f"costs/vectorised/{size}"] = measure(lambda: calc_costs(
+            volume_cm3=volumes, print_time_hr=hours, density=1.24, cost_per_kg=25,
+            power_watt=100, electricity_rate=0.34, markup_percent=20,
+            printer_cost=499, upgrades=50, maintenance=50, lifetime_hours=5000
+        ), repeat, memory)
+        # Samples drawn for one quote
+        results[f"monte_carlo/{size}"] = measure(lambda: simulate_quote(
+            120, 6, 1.24, 25, 100, 0.34, printer, markup_percent=20, support_volume_cm3=15,
+            fail_rate_percent=5, samples=jobs, seed=0
+        ), repeat, memory)
+
+    def scalar():
+        for volume, hours_each in zip(volumes[:SCALAR_COST_JOBS].tolist(), hours[:SCALAR_COST_JOBS].tolist()):
+            material = calc_material_cost(volume, 1.24, 25)
+            energy = calc_energy_cost(hours_each, 100, 0.34)
+            calc_total_cost(material, energy, 20) + calc_depreciation_cost(printer, hours_each)
+
+    volumes = np.linspace(1, 500, SCALAR_COST_JOBS)
+    hours = np.linspace(0.1, 40, SCALAR_COST_JOBS)
+    results[f"costs/scalar/{SCALAR_COST_JOBS}"] = measure(scalar, repeat, memory)
+    return results
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, shapes=tuple(SHAPES), formats=FILE_TYPES, stages=STAGES,
+                   repeat=3, memory=True, workdir=None, on_result=None):
+    """
+    Run the selected benchmarks and return {name: {seconds, median_seconds,
+    peak_mb[, triangles]}}. Names look like "parse/stl/sphere/100k".
+    Generated models are kept in `workdir` (a temporary directory if None).
+    """
+    for size in sizes:
+        parse_size(size)
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        workdir = workdir or scratch
+        os.makedirs(workdir, exist_ok=True)
+        for size in sizes:
+            for shape in shapes:
+                found = _mesh_benchmarks(workdir, shape, size, formats, stages, repeat, memory)
+                results.update(found)
+                if on_result:
+                    for name, result in found.items():
+                        on_result(name, result)
+        if 'costs' in stages:
+            found = _cost_benchmarks(sizes, repeat, memory)
+            results.update(found)
+            if on_result:
+                for name, result in found.items():
+                    on_result(name, result)
+    return results
+
+
+def _commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def load_history(path):
+    """Runs recorded in `path`, oldest first; [] if it doesn't exist yet"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def append_run(path, results, label=None):
+    """Record a run (with commit, Python and machine details) at the end of the history"""
+    runs = load_history(path)
+    run = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'label': label,
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        'results': results
+    }
+    runs.append(run)
+    with open(path + '.part', 'w') as f:
+        json.dump(runs, f, indent=1)
+    os.replace(path + '.part', path)
+    return run
+
+
+def select_run(runs, reference):
+    """A run by index (e.g. -2) or by label or commit prefix, latest match first"""
+    try:
+        return runs[int(reference)]
+    except ValueError:
+        pass
+    except IndexError:
+        raise ValueError(f"History has only {len(runs)} runs")
+    for run in reversed(runs):
+        if run.get('label') == reference or (run.get('commit') or '').startswith(reference):
+            return run
+    raise ValueError(f"No run labelled or at commit '{reference}'")
+
+
+def compare_runs(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Rows of (name, metric, baseline, current, ratio, regressed) for every
+    benchmark in both runs. Time compares the best of the repeats; a metric
+    regresses when it grows by more than `threshold` and by more than the
+    noise floor.
+    """
+    rows = []
+    floors = {'seconds': MIN_SECONDS_DELTA, 'peak_mb': MIN_PEAK_MB_DELTA}
+    for name in sorted(set(baseline['results']) & set(current['results'])):
+        before, after = baseline['results'][name], current['results'][name]
+        for metric, floor in floors.items():
+            if metric not in before or metric not in after:
+                continue
+            ratio = after[metric] / before[metric] if before[metric] else float('inf')
+            regressed = after[metric] > before[metric] * (1 + threshold) and after[metric] - before[metric] > floor
+            rows.append((name, metric, before[metric], after[metric], ratio, regressed))
+    return rows
+
+
+def _describe(run):
+    parts = [run['timestamp'], run.get('label'), run.get('commit')]
+    return ' '.join(part for part in parts if part)
+
+
+def _print_result(name, result):
+    memory = f" {result['peak_mb']:9.1f} MB" if 'peak_mb' in result else ''
+    print(f"{name:<40} {result['seconds'] * 1000:10.2f} ms{memory}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the quoting pipeline on synthetic meshes.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="Run benchmarks and append them to the history")
+    run.add_argument('--sizes', nargs='+', default=list(DEFAULT_SIZES), help="Triangle counts: 1k 10k 100k 1m 10m or numbers")
+    run.add_argument('--shapes', nargs='+', default=list(SHAPES), choices=list(SHAPES))
+    run.add_argument('--formats', nargs='+', default=list(FILE_TYPES), choices=list(FILE_TYPES))
+    run.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    run.add_argument('--repeat', type=int, default=3, help="Timed calls per benchmark (best is kept)")
+    run.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    run.add_argument('--workdir', default=None, help="Keep generated models here for reuse")
+    run.add_argument('--label', default=None, help="Name for this run, usable as a compare baseline")
+    run.add_argument('--history', default=DEFAULT_HISTORY)
+
+    compare = commands.add_parser('compare', help="Compare two runs from the history")
+    compare.add_argument('--baseline', default='-2', help="Run index, label or commit (default: the previous run)")
+    compare.add_argument('--current', default='-1', help="Run index, label or commit (default: the latest run)")
+    compare.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Allowed growth, 0.2 = 20%%")
+    compare.add_argument('--history', default=DEFAULT_HISTORY)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run_benchmarks(
+            args.sizes, args.shapes, args.formats, args.stages, repeat=args.repeat,
+            memory=not args.no_memory, workdir=args.workdir, on_result=_print_result
+        )
+        recorded = append_run(args.history, results, args.label)
+        print(f"Recorded {len(results)} benchmarks in {args.history} ({_describe(recorded)})")
+        return 0
+
+    runs = load_history(args.history)
+    try:
+        baseline, current = select_run(runs, args.baseline), select_run(runs, args.current)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"Baseline: {_describe(baseline)}")
+    print(f"Current:  {_describe(current)}")
+    if baseline.get('machine') != current.get('machine'):
+        print(f"Warning: runs are from different machines ({baseline.get('machine')} vs {current.get('machine')})")
+    rows = compare_runs(baseline, current, args.threshold)
+    print(f"{'benchmark':<40} {'metric':<8} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, metric, before, after, ratio, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:<40} {metric:<8} {before:>10.4g} {after:>10.4g} {ratio - 1:>+8.1%}{flag}")
+    regressions = sum(row[-1] for row in rows)
+    print(f"{regressions} regressions beyond {args.threshold:.0%} in {len(rows)} comparisons")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,46 @@
+"""
+Business pricing on top of the print cost: depreciation from purchase
+price and lifespan, labour, failed prints and shipping.
+
+Every function takes scalars or NumPy arrays (broadcast against each
+other) and returns a float for scalar inputs, an array otherwise, so the
+same code prices one quote or a whole batch of Monte Carlo samples.
+"""
+import numpy as np
+
+
+def _result(value):
+    return float(value) if np.ndim(value) == 0 else value
+
+
+def calc_depreciation(printer_cost, lifespan_hours, print_time_hr):
+    """Share of the printer's cost used up by a print; 0 when the lifespan is unknown (0)"""
+    printer_cost, lifespan_hours = np.broadcast_arrays(
+        np.asarray(printer_cost, dtype=np.float64), np.asarray(lifespan_hours, dtype=np.float64)
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_hour = np.where(lifespan_hours > 0, printer_cost / lifespan_hours, 0.0)
+    return _result(per_hour * print_time_hr)
+
+
+def calc_labour(prep_hours, post_hours, hourly_rate):
+    """Hands-on time before (slicing, bed prep) and after (removal, cleanup) a print"""
+    return _result(np.add(prep_hours, post_hours) * np.asarray(hourly_rate, dtype=np.float64))
+
+
+def apply_fail_rate(cost, fail_rate_percent):
+    """
+    Cost per good print when `fail_rate_percent` of prints fail and are
+    reprinted: cost / (1 - rate). A 100% fail rate never succeeds (inf).
+    """
+    fail_rate_percent = np.asarray(fail_rate_percent, dtype=np.float64)
+    if np.any((fail_rate_percent < 0) | (fail_rate_percent > 100)):
+        raise ValueError("Fail rate must be between 0 and 100 percent")
+    with np.errstate(divide='ignore'):
+        return _result(np.asarray(cost, dtype=np.float64) / (1 - fail_rate_percent / 100))
+
+
+def calc_final_business_price(base_cost, fail_rate_percent, shipping, markup_percent):
+    """Price to charge: the cost allowing for failed prints, plus shipping, plus markup"""
+    adjusted = np.add(apply_fail_rate(base_cost, fail_rate_percent), shipping)
+    return _result(adjusted * (1 + np.asarray(markup_percent, dtype=np.float64) / 100))
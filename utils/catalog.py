@@ -0,0 +1,103 @@
+import os
+import json
+import threading
+
+# Directory holding printers.json and materials.json
+DEFAULT_CATALOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'material_db')
+PRINTERS_FILE = 'printers.json'
+MATERIALS_FILE = 'materials.json'
+PRINTER_FIELDS = ('cost', 'upgrades', 'maintenance', 'lifetime_hours', 'avg_power_watts')
+# Optional printer field: [x, y, z] in mm, needed for plate nesting
+BUILD_VOLUME_FIELD = 'build_volume_mm'
+MATERIAL_FIELDS = ('density', 'cost_per_kg')
+
+
+class Catalog:
+    """
+    Printers and materials with the lookups and display lists the UI needs.
+
+    `printers` is make -> model -> details and `materials` is name ->
+    properties, so every lookup is a dict access. `model_labels[make]` lists
+    "Model (power W)" labels and `model_for_label[make][label]` maps them back.
+    Instances are shared between sessions and must be treated as read-only.
+    """
+
+    __slots__ = ('printers', 'materials', 'makes', 'model_labels', 'model_for_label', 'material_names')
+
+    def __init__(self, printers, materials):
+        self.printers = printers
+        self.materials = materials
+        self.makes = list(printers)
+        self.model_labels = {}
+        self.model_for_label = {}
+        for make, models in printers.items():
+            labels = {f"{model} ({details['avg_power_watts']:g}W)": model for model, details in models.items()}
+            self.model_labels[make] = list(labels)
+            self.model_for_label[make] = labels
+        self.material_names = list(materials)
+
+    def printer(self, make, model):
+        """Details for one printer; raises ValueError naming the unknown make or model"""
+        models = self.printers.get(make)
+        if models is None:
+            raise ValueError(f"Unknown printer make '{make}'")
+        details = models.get(model)
+        if details is None:
+            raise ValueError(f"Unknown {make} model '{model}'. Choose from: {', '.join(models)}")
+        return details
+
+
+def _check_fields(name, entry, fields):
+    missing = [field for field in fields if field not in entry]
+    if missing:
+        raise ValueError(f"Catalog entry '{name}' is missing {', '.join(missing)}")
+
+
+def load_catalog(directory=DEFAULT_CATALOG_DIR):
+    """Parse and validate printers.json and materials.json from `directory`"""
+    with open(os.path.join(directory, PRINTERS_FILE), encoding='utf-8') as f:
+        printers = json.load(f)
+    with open(os.path.join(directory, MATERIALS_FILE), encoding='utf-8') as f:
+        materials = json.load(f)
+    for make, models in printers.items():
+        for model, details in models.items():
+            _check_fields(f"{make} {model}", details, PRINTER_FIELDS)
+            volume = details.get(BUILD_VOLUME_FIELD)
+            if volume is not None and (len(volume) != 3 or min(volume) <= 0):
+                raise ValueError(f"Catalog entry '{make} {model}' needs {BUILD_VOLUME_FIELD} as three positive sizes")
+    for name, properties in materials.items():
+        _check_fields(name, properties, MATERIAL_FIELDS)
+        properties.setdefault('diameters', [1.75, 2.85])
+    return Catalog(printers, materials)
+
+
+def _mtimes(directory):
+    return tuple(
+        os.stat(os.path.join(directory, name)).st_mtime_ns
+        for name in (PRINTERS_FILE, MATERIALS_FILE)
+    )
+
+
+_catalog = None
+_catalog_mtimes = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    Return the process-wide catalog, re-reading the files only when their
+    modification times change. Set CATALOG_DIR to use another directory.
+    """
+    global _catalog, _catalog_mtimes
+    directory = os.environ.get('CATALOG_DIR') or DEFAULT_CATALOG_DIR
+    with _catalog_lock:
+        try:
+            mtimes = (directory, _mtimes(directory))
+            if _catalog is None or mtimes != _catalog_mtimes:
+                _catalog = load_catalog(directory)
+                _catalog_mtimes = mtimes
+        except (OSError, ValueError):
+            # Keep serving the last good catalog while a file is mid-edit
+            if _catalog is None:
+                raise
+        return _catalog
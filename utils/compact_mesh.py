@@ -0,0 +1,120 @@
+"""
+Compact triangle meshes for parsed uploads.
+
+A trimesh.Trimesh keeps float64 vertices, int64 faces and a cache of
+normals, adjacency and the like, which adds up to several times the
+geometry itself for every upload in every session. CompactMesh holds only
+float32 vertices (merged, so each corner is stored once) and int32 faces,
+read-only so that one instance can be shared by the parse cache and every
+session showing the same upload. Volume and bounds are derived on first
+use and kept; everything else (validation, supports, slicing, previews)
+works from `vertices` and `faces` directly.
+"""
+import numpy as np
+
+# Faces per chunk when summing the volume (bounded float64 temporaries)
+VOLUME_CHUNK_FACES = 1 << 18
+
+
+def merge_vertices(vertices, faces):
+    """
+    Merge vertices with identical float32 coordinates. Returns float32
+    vertices in first-seen order and int32 faces into them.
+    """
+    # -0.0 and 0.0 are the same point but not the same bits
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3) + np.float32(0.0)
+    faces = np.asarray(faces)
+    if not len(vertices):
+        return vertices, np.ascontiguousarray(faces, dtype=np.int32).reshape(-1, 3)
+    # Sort on the coordinate bits: x and y packed into one key, then z
+    bits = vertices.view(np.uint32)
+    xy = bits[:, 0].astype(np.uint64) << np.uint64(32) | bits[:, 1]
+    order = np.lexsort((bits[:, 2], xy))
+    xy, z = xy[order], bits[order, 2]
+    starts = np.empty(len(order), dtype=bool)
+    starts[0] = True
+    starts[1:] = (xy[1:] != xy[:-1]) | (z[1:] != z[:-1])
+    inverse = np.empty(len(order), dtype=np.int64)
+    inverse[order] = np.cumsum(starts) - 1
+    # The sort is stable, so each run starts with its first occurrence;
+    # keeping the file's vertex order keeps faces cache-friendly
+    first = order[starts]
+    by_position = np.argsort(first)
+    rank = np.empty_like(by_position)
+    rank[by_position] = np.arange(len(by_position))
+    return vertices[first[by_position]], rank[inverse][faces].astype(np.int32).reshape(-1, 3)
+
+
+class CompactMesh:
+    """
+    Read-only float32/int32 triangle mesh with lazily derived volume and
+    bounds. Pass `merge=False` for vertices that are already unique (e.g.
+    from the parse cache).
+    """
+
+    __slots__ = ("vertices", "faces", "_volume", "_bounds")
+
+    def __init__(self, vertices, faces, merge=True):
+        if merge:
+            vertices, faces = merge_vertices(vertices, faces)
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+        self.faces = np.ascontiguousarray(faces, dtype=np.int32).reshape(-1, 3)
+        if len(self.faces) and (self.faces.min() < 0 or self.faces.max() >= len(self.vertices)):
+            raise ValueError("Face index out of range")
+        # Shared between sessions, so nobody may change it in place
+        self.vertices.flags.writeable = False
+        self.faces.flags.writeable = False
+        self._volume = None
+        self._bounds = None
+
+    @classmethod
+    def from_triangles(cls, triangles):
+        """Mesh from an (n, 3, 3) triangle soup, such as an STL file's facets"""
+        triangles = np.asarray(triangles).reshape(-1, 3)
+        return cls(triangles, np.arange(len(triangles)).reshape(-1, 3))
+
+    @property
+    def volume(self):
+        """Signed volume (mm³); exact for closed, consistently wound meshes"""
+        if self._volume is None:
+            total = 0.0
+            for start in range(0, len(self.faces), VOLUME_CHUNK_FACES):
+                corners = self.vertices[self.faces[start:start + VOLUME_CHUNK_FACES]].astype(np.float64)
+                v0, v1, v2 = corners[:, 0], corners[:, 1], corners[:, 2]
+                total += np.einsum('ij,ij->', v0, np.cross(v1, v2)) / 6.0
+            self._volume = float(total)
+        return self._volume
+
+    @property
+    def bounds(self):
+        """(2, 3) array of the lower and upper corners"""
+        if self._bounds is None:
+            if not len(self.vertices):
+                self._bounds = np.zeros((2, 3))
+            else:
+                self._bounds = np.array([self.vertices.min(axis=0), self.vertices.max(axis=0)], dtype=np.float64)
+            self._bounds.flags.writeable = False
+        return self._bounds
+
+    @property
+    def extents(self):
+        return self.bounds[1] - self.bounds[0]
+
+    @property
+    def nbytes(self):
+        """Memory held by the geometry and anything derived from it so far"""
+        derived = 0 if self._bounds is None else self._bounds.nbytes
+        return self.vertices.nbytes + self.faces.nbytes + derived
+
+    def __reduce__(self):
+        # Rebuilt read-only (e.g. when sent back from a worker process)
+        return CompactMesh, (self.vertices, self.faces, False)
+
+    def __repr__(self):
+        return f"CompactMesh({len(self.vertices):,} vertices, {len(self.faces):,} faces, {self.nbytes:,} bytes)"
+
+    def to_trimesh(self):
+        """A trimesh.Trimesh with the same geometry, for code that needs one"""
+        import trimesh
+
+        return trimesh.Trimesh(vertices=self.vertices, faces=self.faces, process=False)
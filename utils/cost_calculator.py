@@ -1,92 +1,145 @@
-import os
-import json
+import numpy as np
+from utils.catalog import get_catalog
 
-# Load materials from JSON
-MATERIALS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'material_db', 'materials.json')
 def get_materials():
-    return {
-        "PLA": {
-            "density": 1.24,       # g/cm³
-            "cost_per_kg": 25.00,  # £/kg
-            "diameters": [1.75, 2.85]
-        },
-        "PETG": {
-            "density": 1.27,
-            "cost_per_kg": 30.00,
-            "diameters": [1.75, 2.85]
-        },
-        "ABS": {
-            "density": 1.01,
-            "cost_per_kg": 20.00,
-            "diameters": [1.75, 2.85]
-        },
-        "TPU": {
-            "density": 1.21,
-            "cost_per_kg": 35.00,
-            "diameters": [1.75, 2.85]
-        },
-        "Nylon": {
-            "density": 1.02,
-            "cost_per_kg": 100.00,
-            "diameters": [1.75, 2.85]
-        },
-        "PC": {
-            "density": 1.19,
-            "cost_per_kg": 40.00,
-            "diameters": [1.75, 2.85]
-        },
-        "ASA": {
-            "density": 1.08,
-            "cost_per_kg": 30.00,
-            "diameters": [1.75, 2.85]
-        },
-        "PVA": {
-            "density": 1.23,
-            "cost_per_kg": 40.00,
-            "diameters": [1.75]  # Usually only in 1.75 mm for support material
-        },
-        "HIPS": {
-            "density": 1.04,
-            "cost_per_kg": 35.00,
-            "diameters": [1.75, 2.85]  # Some brands do both, often used for supports
-        },
-        "Carbon Fiber (PLA‑based)": {
-            "density": 1.19,
-            "cost_per_kg": 65.00,
-            "diameters": [1.75, 2.85]
-        }
-    }
+    """Material properties from the shared catalog (material_db/materials.json)"""
+    return get_catalog().materials
+
+
+COST_INPUTS = {
+    "volume_cm3": None,
+    "density": None,
+    "cost_per_kg": None,
+    "support_cost": 0.0,
+    "print_time_hr": None,
+    "power_watt": None,
+    "electricity_rate": None,
+    "markup_percent": 0.0,
+    "printer_cost": 0.0,
+    "upgrades": 0.0,
+    "maintenance": 0.0,
+    "lifetime_hours": np.inf,
+}
+
+# Array kernels - the scalar functions below are thin wrappers around these,
+# so scalar and vectorized results are identical by construction
+
+def _material_cost(volume_cm3, density_g_cm3, cost_per_kg):
+    grams = np.multiply(volume_cm3, density_g_cm3)
+    kg = grams / 1000
+    return np.round(kg * cost_per_kg, 4)
+
+def _energy_cost(print_time_hr, power_watt, electricity_rate):
+    kwh = np.multiply(power_watt, print_time_hr) / 1000
+    return np.round(kwh * electricity_rate, 4)
+
+def _total_cost(material_cost, energy_cost, markup_percent):
+    subtotal = np.add(material_cost, energy_cost)
+    markup = subtotal * (np.asarray(markup_percent) / 100)
+    return np.round(subtotal + markup, 4)
+
+def _depreciation_cost(printer_cost, upgrades, maintenance, lifetime_hours, print_time_hr):
+    total_cost = np.add(np.add(printer_cost, upgrades), maintenance)
+    print_time_min = np.multiply(print_time_hr, 60)
+    depreciation_per_minute = total_cost / (np.multiply(lifetime_hours, 60))
+    return depreciation_per_minute * print_time_min
 
 def calc_material_cost(volume_cm3, density_g_cm3, cost_per_kg):
     """
     Calculate material cost based on volume, density, and cost per kg.
     """
-    grams = volume_cm3 * density_g_cm3
-    kg = grams / 1000
-    return round(kg * cost_per_kg, 4)
+    return float(_material_cost(volume_cm3, density_g_cm3, cost_per_kg))
 
 def calc_energy_cost(print_time_hr, power_watt, electricity_rate):
     """
     Calculate energy cost: time (hr) * power (W) * rate ($/kWh)
     """
-    kwh = (power_watt * print_time_hr) / 1000
-    return round(kwh * electricity_rate, 4)
+    return float(_energy_cost(print_time_hr, power_watt, electricity_rate))
 
 def calc_total_cost(material_cost, energy_cost, markup_percent):
     """
     Calculate total cost with markup.
     """
-    subtotal = material_cost + energy_cost
-    markup = subtotal * (markup_percent / 100)
-    return round(subtotal + markup, 4)
+    return float(_total_cost(material_cost, energy_cost, markup_percent))
+
+def calc_depreciation_cost(printer_details, print_time_hr):
+    """Calculate depreciation cost for a print job."""
+    if not printer_details:
+        return 0.0
+    return float(_depreciation_cost(
+        printer_details["cost"],
+        printer_details["upgrades"],
+        printer_details["maintenance"],
+        printer_details["lifetime_hours"],
+        print_time_hr
+    ))
+
+def calc_costs(jobs=None, **columns):
+    """
+    Vectorized cost engine: price many jobs in one broadcast pass.
+
+    `jobs` is a pandas DataFrame or dict whose columns are named as in
+    COST_INPUTS; keyword arguments add or override columns. Scalars and
+    arrays broadcast against each other, so one part can be priced across
+    many printers or rates at once. `support_cost` (support material already
+    priced, possibly in another material) is added to the material cost.
+    Returns material, energy, depreciation, total (with markup) and
+    total_with_depreciation costs, as a DataFrame if `jobs` was one and as a
+    dict of arrays otherwise. Values match the scalar calc_* functions
+    exactly.
+    """
+    inputs = {}
+    if jobs is not None:
+        inputs.update({name: jobs[name] for name in COST_INPUTS if name in jobs})
+    inputs.update(columns)
+    missing = [name for name, default in COST_INPUTS.items() if default is None and inputs.get(name) is None]
+    if missing:
+        raise ValueError(f"Missing cost inputs: {', '.join(missing)}")
+    values = {
+        name: np.asarray(inputs.get(name, default), dtype=np.float64)
+        for name, default in COST_INPUTS.items()
+    }
+    values = dict(zip(values, np.broadcast_arrays(*values.values())))
+
+    material = _material_cost(values["volume_cm3"], values["density"], values["cost_per_kg"]) + values["support_cost"]
+    energy = _energy_cost(values["print_time_hr"], values["power_watt"], values["electricity_rate"])
+    total = _total_cost(material, energy, values["markup_percent"])
+    depreciation = _depreciation_cost(
+        values["printer_cost"], values["upgrades"], values["maintenance"],
+        values["lifetime_hours"], values["print_time_hr"]
+    )
+    result = {
+        "material_cost": material,
+        "energy_cost": energy,
+        "depreciation_cost": depreciation,
+        "total_cost": total,
+        "total_with_depreciation": total + depreciation,
+    }
+
+    if hasattr(jobs, "loc"):
+        import pandas as pd
+        return pd.DataFrame(result, index=jobs.index)
+    return result
 
 def estimate_print_time(volume_mm3, nozzle_diameter=0.4, layer_height=0.2, 
                        print_speed=50, infill_density=20, shell_thickness=1.2,
-                       acceleration=500, jerk=8, retraction_speed=45):
+                       acceleration=500, jerk=8, retraction_speed=45, mesh=None):
     """
-    Enhanced 3D print time estimation based on volume and print parameters
+    Enhanced 3D print time estimation based on volume and print parameters.
+
+    When a mesh is given it is sliced layer by layer (see utils.slicer);
+    otherwise the part is approximated as a cube of the same volume.
     """
     try:
+        if mesh is not None:
+            from utils.slicer import estimate_print_time_sliced
+            return estimate_print_time_sliced(
+                mesh.vertices, mesh.faces, nozzle_diameter=nozzle_diameter,
+                layer_height=layer_height, print_speed=print_speed,
+                infill_density=infill_density, shell_thickness=shell_thickness,
+                acceleration=acceleration, jerk=jerk, retraction_speed=retraction_speed
+            )
+
         # Calculate extrusion width (typically 120% of nozzle diameter)
         extrusion_width = nozzle_diameter * 1.2
         
@@ -0,0 +1,410 @@
+"""
+Streaming G-code analysis.
+
+Sliced G-code already says exactly what the printer will do, so print time
+and filament use can be read from it instead of estimated from the model.
+The file is read in blocks; each block's G0-G4, G28, G90-G92, M82/M83 and
+M204/M205 lines are picked out with one regex pass and tokenized into NumPy
+arrays, positions are resolved with cumulative sums, and move times come
+from a vectorized trapezoidal planner. Only moves whose speed still depends
+on later moves are carried between blocks, so memory doesn't grow with the
+file size.
+"""
+import re
+
+import numpy as np
+
+from utils.stl_parser import _iter_text_blocks
+from utils.slicer import junction_speed, trapezoid_time
+
+# Smaller blocks keep the per-line temporaries in cache; 1 MB was fastest
+GCODE_BLOCK_BYTES = 1024 * 1024
+# Moves held back for the planner before they are timed as if followed by a stop
+MAX_CARRIED_MOVES = 100_000
+# Feed rate (mm/min) assumed until the file sets one
+DEFAULT_FEEDRATE = 1500.0
+
+# Lines the analyser uses, without comments; everything else is skipped
+_GCODE_LINE_RE = re.compile(
+    rb'^[ \t]*(?:N\d+[ \t]*)?[GM]0*(?:[0-4]|28|9[0-2]|8[23]|20[45])(?![\d.])[^;\n]*',
+    re.MULTILINE
+)
+# Per-word fallback for lines the vectorized tokenizer can't split
+_GCODE_WORD_RE = re.compile(rb'([A-Z])[ \t]*([-+]?(?:\d+\.?\d*|\.\d+))')
+PARAM_LETTERS = b'XYZEFIJRPST'
+# Slicer-reported times, kept for comparison (Cura, PrusaSlicer/OrcaSlicer)
+_CURA_TIME_RE = re.compile(rb'^;TIME:(\d+)', re.MULTILINE)
+_PRUSA_TIME_RE = re.compile(rb'^; estimated printing time[^=\n]*=([^\n]*)', re.MULTILINE)
+_DURATION_PART_RE = re.compile(rb'(\d+)\s*([dhms])')
+_DURATION_SECONDS = {b'd': 86400, b'h': 3600, b'm': 60, b's': 1}
+
+_COL = {chr(letter): i for i, letter in enumerate(PARAM_LETTERS)}
+MOTION_CODES = (0, 1, 2, 3)
+# Move kinds used to split the time
+PRINT, TRAVEL, RETRACT = 0, 1, 2
+
+
+def _tokenise(lines):
+    """
+    Split G-code lines into command codes and a parameter table.
+
+    Every letter must be followed directly by its number, so the letters can
+    be blanked out and all numbers parsed in one `np.fromstring` call. Lines
+    that break that rule (e.g. "X 10" or a bare "G28 X") send the block
+    through the slower per-word regex instead. Commands are coded as G
+    number, or 1000 + M number; missing parameters are NaN.
+    """
+    text = np.frombuffer(b'\n'.join(lines) + b'\n', dtype=np.uint8)
+    is_letter = (text >= ord('A')) & (text <= ord('Z'))
+    following = np.append(text[1:], ord('\n'))
+    starts_number = (
+        ((following >= ord('0')) & (following <= ord('9')))
+        | (following == ord('-')) | (following == ord('+')) | (following == ord('.'))
+    )
+    blanked = text.copy()
+    blanked[is_letter | (text == ord('\n'))] = ord(' ')
+    values = np.fromstring(blanked.tobytes(), dtype=np.float64, sep=' ')
+    if len(values) != is_letter.sum() or not starts_number[is_letter].all():
+        return _tokenise_words(lines)
+
+    positions = np.flatnonzero(is_letter)
+    letters = text[positions]
+    line_ids = np.searchsorted(np.flatnonzero(text == ord('\n')), positions)
+    return _word_table(len(lines), line_ids, letters, values)
+
+
+def _tokenise_words(lines):
+    """Regex fallback for `_tokenise`"""
+    line_ids, letters, values = [], [], []
+    for line_id, line in enumerate(lines):
+        for letter, value in _GCODE_WORD_RE.findall(line):
+            line_ids.append(line_id)
+            letters.append(letter[0])
+            values.append(float(value))
+    return _word_table(
+        len(lines), np.array(line_ids, dtype=np.int64),
+        np.array(letters, dtype=np.uint8), np.array(values, dtype=np.float64)
+    )
+
+
+def _word_table(line_count, line_ids, letters, values):
+    """Scatter (line, letter, value) words into command codes and a parameter table"""
+    is_command = (letters == ord('G')) | (letters == ord('M'))
+    # The first G/M word on each line is its command (after any N word)
+    command_lines, first = np.unique(line_ids[is_command], return_index=True)
+    command_words = np.flatnonzero(is_command)[first]
+    code = np.full(line_count, -1, dtype=np.int64)
+    code[command_lines] = (
+        values[command_words].astype(np.int64) + 1000 * (letters[command_words] == ord('M'))
+    )
+
+    columns = np.full(256, -1, dtype=np.int64)
+    columns[np.frombuffer(PARAM_LETTERS, dtype=np.uint8)] = np.arange(len(PARAM_LETTERS))
+    column = columns[letters]
+    word = ~is_command & (column >= 0)
+    params = np.full((line_count, len(PARAM_LETTERS)), np.nan)
+    params[line_ids[word], column[word]] = values[word]
+    return code, params
+
+
+def _ffill(values, start):
+    """Forward-fill NaNs in `values`, using `start` before the first number"""
+    index = np.where(np.isnan(values), -1, np.arange(len(values)))
+    np.maximum.accumulate(index, out=index)
+    return np.where(index >= 0, values[np.maximum(index, 0)], start)
+
+
+def _axis_positions(set_mask, set_values, deltas, start):
+    """
+    Axis position after each row.
+
+    Rows in `set_mask` jump to `set_values` (absolute moves, G92, G28); every
+    other row adds its entry in `deltas` (relative moves, zero otherwise).
+    """
+    offsets = np.cumsum(deltas)
+    index = np.where(set_mask, np.arange(len(deltas)), -1)
+    np.maximum.accumulate(index, out=index)
+    safe = np.maximum(index, 0)
+    base = np.where(index >= 0, set_values[safe] - offsets[safe], start)
+    return base + offsets
+
+
+def _arc_lengths(start, end, offsets, radius, clockwise):
+    """
+    Path length of G2/G3 arcs in the XY plane (helical if Z changes).
+
+    Centres come from I/J offsets, or from R when no offsets are given;
+    a negative R selects the long way round.
+    """
+    chord = end[:, :2] - start[:, :2]
+    use_radius = np.isnan(offsets).all(axis=1) & ~np.isnan(radius)
+    centre = start[:, :2] + np.nan_to_num(offsets)
+    from_centre = start[:, :2] - centre
+    to_centre = end[:, :2] - centre
+    a0 = np.arctan2(from_centre[:, 1], from_centre[:, 0])
+    a1 = np.arctan2(to_centre[:, 1], to_centre[:, 0])
+    r = np.hypot(from_centre[:, 0], from_centre[:, 1])
+    sweep = np.mod(np.where(clockwise, a0 - a1, a1 - a0), 2 * np.pi)
+    sweep = np.where(sweep < 1e-9, 2 * np.pi, sweep)  # start == end is a full circle
+
+    abs_radius = np.abs(np.nan_to_num(radius))
+    half = np.arcsin(np.clip(np.hypot(*chord.T) / np.maximum(2 * abs_radius, 1e-9), 0, 1))
+    radius_sweep = np.where(np.nan_to_num(radius) < 0, 2 * np.pi - 2 * half, 2 * half)
+    r = np.where(use_radius, abs_radius, r)
+    sweep = np.where(use_radius, radius_sweep, sweep)
+    return np.hypot(r * sweep, end[:, 2] - start[:, 2])
+
+
+def plan_moves(length, speed, accel, junction_sq, final=True):
+    """
+    Trapezoidal planner for a run of moves, without a per-move loop.
+
+    `junction_sq` caps the squared speed at the start of each move (cornering
+    limits). The usual forward and backward passes are min-plus recurrences,
+    v[i]² = min(J[i], v[i-1]² + 2·a·L), which reduce to cumulative sums and
+    running minima. Moves are assumed to end at rest.
+
+    With `final=False` the last moves - whose speed could still rise if more
+    moves follow - are left unplanned. Returns (times, planned, carry_sq):
+    times for the first `planned` moves and the forward speed² limit at the
+    first unplanned one.
+    """
+    n = len(length)
+    reach = 2 * accel * length  # speed² gained or shed over each move
+    before = np.concatenate([[0.0], np.cumsum(reach)[:-1]])
+    forward = before + np.minimum.accumulate(junction_sq - before)
+    after = np.cumsum(reach[::-1])[::-1]
+    slack = np.minimum.accumulate((junction_sq - after)[::-1])[::-1]
+    entry_sq = np.minimum(forward, after + np.minimum(slack, 0))
+
+    planned = n
+    if not final:
+        # Junctions are settled from the start up to the first one whose
+        # backward limit still depends on the end speed
+        unsettled = np.flatnonzero(slack > 0)
+        first = unsettled[0] if len(unsettled) else n
+        planned = max(min(first, n) - 1, n - MAX_CARRIED_MOVES, 0)
+
+    exit_sq = np.concatenate([entry_sq[1:], [0.0]])
+    times = trapezoid_time(
+        length[:planned], speed[:planned], accel[:planned],
+        np.sqrt(entry_sq[:planned]), np.sqrt(exit_sq[:planned])
+    )
+    carry_sq = forward[planned] if planned < n else 0.0
+    return times, planned, carry_sq
+
+
+class GcodeAnalyser:
+    """
+    Incremental G-code analyser; `feed` it text blocks that end on a line
+    break, then call `result`.
+
+    `acceleration` and `jerk` apply until the file sets its own with M204
+    and M205.
+    """
+
+    __slots__ = (
+        "filament_diameter", "position", "xyz_absolute", "e_absolute", "feedrate",
+        "print_accel", "travel_accel", "retract_accel", "jerk", "direction", "speed",
+        "pending", "times", "dwell", "filament", "moves", "lower", "upper", "layer_heights",
+        "slicer_seconds"
+    )
+
+    def __init__(self, filament_diameter=1.75, acceleration=500, jerk=8):
+        self.filament_diameter = filament_diameter
+        self.position = np.zeros(4)
+        self.xyz_absolute = 1.0
+        self.e_absolute = 1.0
+        self.feedrate = DEFAULT_FEEDRATE
+        self.print_accel = self.travel_accel = self.retract_accel = float(acceleration)
+        self.jerk = float(jerk)
+        self.direction = np.zeros(3)
+        self.speed = 0.0
+        # Planner rows (length, speed, accel, junction², kind) not yet timed
+        self.pending = np.empty((0, 5))
+        self.times = np.zeros(3)
+        self.dwell = 0.0
+        self.filament = 0.0
+        self.moves = 0
+        self.lower = np.full(3, np.inf)
+        self.upper = np.full(3, -np.inf)
+        self.layer_heights = set()
+        self.slicer_seconds = None
+
+    def feed(self, block):
+        self._read_slicer_time(block)
+        lines = _GCODE_LINE_RE.findall(block)
+        if not lines:
+            return
+        code, params = _tokenise(lines)
+
+        def column(letter):
+            return params[:, _COL[letter]]
+
+        nan = np.full(len(code), np.nan)
+        is_motion = np.isin(code, MOTION_CODES)
+        is_g92 = code == 92
+        is_g28 = code == 28
+
+        # Modal state: G90/G91 switch XYZ and E, M82/M83 switch E only
+        xyz_mode = np.select([code == 90, code == 91], [1.0, 0.0], nan)
+        e_mode = np.select([code == 90, code == 91, code == 1082, code == 1083], [1.0, 0.0, 1.0, 0.0], nan)
+        xyz_absolute = _ffill(xyz_mode, self.xyz_absolute) > 0
+        e_absolute = _ffill(e_mode, self.e_absolute) > 0
+        feedrate = _ffill(np.where(is_motion, column('F'), np.nan), self.feedrate)
+
+        # M204 P/T/R (S sets print and travel), M205 X for jerk
+        is_m204 = code == 1204
+        legacy = np.where(is_m204, column('S'), np.nan)
+        print_accel = np.where(is_m204 & ~np.isnan(column('P')), column('P'), legacy)
+        travel_accel = np.where(is_m204 & ~np.isnan(column('T')), column('T'), legacy)
+        print_accel = _ffill(print_accel, self.print_accel)
+        travel_accel = _ffill(travel_accel, self.travel_accel)
+        retract_accel = _ffill(np.where(is_m204, column('R'), np.nan), self.retract_accel)
+        jerk = _ffill(np.where(code == 1205, column('X'), np.nan), self.jerk)
+
+        positions = np.empty((len(code), 4))
+        homes_all = is_g28 & np.isnan(params[:, :3]).all(axis=1)
+        for axis, letter in enumerate('XYZE'):
+            value = column(letter)
+            has = ~np.isnan(value)
+            absolute = e_absolute if letter == 'E' else xyz_absolute
+            set_mask = (is_motion & absolute & has) | (is_g92 & has)
+            set_values = np.where(is_motion | is_g92, value, 0.0)
+            if letter != 'E':
+                set_mask |= is_g28 & (has | homes_all)
+            deltas = np.where(is_motion & ~absolute & has, value, 0.0)
+            positions[:, axis] = _axis_positions(set_mask, set_values, deltas, self.position[axis])
+        previous = np.vstack([self.position, positions[:-1]])
+
+        is_dwell = code == 4
+        self.dwell += np.nansum(np.where(is_dwell, np.fmax(column('P') / 1000, column('S')), 0))
+
+        self.position = positions[-1]
+        self.xyz_absolute = float(xyz_absolute[-1])
+        self.e_absolute = float(e_absolute[-1])
+        self.feedrate = feedrate[-1]
+        self.print_accel = print_accel[-1]
+        self.travel_accel = travel_accel[-1]
+        self.retract_accel = retract_accel[-1]
+        self.jerk = jerk[-1]
+        self._add_moves(
+            is_motion, code, params, previous, positions, feedrate,
+            print_accel, travel_accel, retract_accel, jerk
+        )
+
+    def _add_moves(self, is_motion, code, params, previous, positions, feedrate,
+                   print_accel, travel_accel, retract_accel, jerk):
+        start = previous[is_motion]
+        end = positions[is_motion]
+        delta = end - start
+        extruded = delta[:, 3]
+        travel = np.linalg.norm(delta[:, :3], axis=1)
+
+        arcs = np.isin(code[is_motion], (2, 3))
+        if arcs.any():
+            travel[arcs] = _arc_lengths(
+                start[arcs], end[arcs],
+                params[is_motion][arcs][:, [_COL['I'], _COL['J']]],
+                params[is_motion][arcs][:, _COL['R']],
+                code[is_motion][arcs] == 2
+            )
+        self.filament += extruded.sum()
+
+        printing = (extruded > 0) & (travel > 0)
+        if printing.any():
+            ends = np.concatenate([start[printing, :3], end[printing, :3]])
+            np.minimum(self.lower, ends.min(axis=0), out=self.lower)
+            np.maximum(self.upper, ends.max(axis=0), out=self.upper)
+            self.layer_heights.update(np.unique(np.round(end[printing, 2], 3)).tolist())
+
+        # Extruder-only moves (retract/unretract) are timed on E
+        length = np.where(travel > 0, travel, np.abs(extruded))
+        keep = length > 0
+        if not keep.any():
+            return
+        length = length[keep]
+        speed = feedrate[is_motion][keep] / 60
+        kind = np.select([printing[keep], travel[keep] > 0], [PRINT, TRAVEL], RETRACT)
+        accel = np.choose(kind, [
+            print_accel[is_motion][keep], travel_accel[is_motion][keep], retract_accel[is_motion][keep]
+        ])
+
+        # Cornering limit from the angle to the previous move (chord
+        # direction for arcs); extruder-only moves have no direction
+        direction = delta[keep, :3] / np.maximum(travel[keep], 1e-12)[:, None]
+        direction[travel[keep] == 0] = 0
+        previous_direction = np.vstack([self.direction, direction[:-1]])
+        previous_speed = np.concatenate([[self.speed], speed[:-1]])
+        cos_theta = np.einsum('ij,ij->i', previous_direction, direction)
+        limit = junction_speed(cos_theta, np.minimum(previous_speed, speed), jerk[is_motion][keep])
+        self.direction = direction[-1]
+        self.speed = speed[-1]
+        self.moves += len(length)
+
+        rows = np.column_stack([length, speed, accel, limit ** 2, kind])
+        self._plan(np.concatenate([self.pending, rows]), final=False)
+
+    def _plan(self, rows, final):
+        if not len(rows):
+            return
+        length, speed, accel, junction_sq, kind = rows.T
+        times, planned, carry_sq = plan_moves(length, speed, accel, junction_sq, final)
+        self.times += np.bincount(kind[:planned].astype(np.int64), weights=times, minlength=3)
+        self.pending = rows[planned:].copy()
+        if len(self.pending):
+            self.pending[0, 3] = carry_sq
+
+    def _read_slicer_time(self, block):
+        if self.slicer_seconds is not None:
+            return
+        # Substring checks first; a regex search over every block is slow
+        match = b';TIME:' in block and _CURA_TIME_RE.search(block)
+        if match:
+            self.slicer_seconds = float(match.group(1))
+            return
+        match = b'; estimated printing time' in block and _PRUSA_TIME_RE.search(block)
+        if match:
+            self.slicer_seconds = float(sum(
+                int(amount) * _DURATION_SECONDS[unit]
+                for amount, unit in _DURATION_PART_RE.findall(match.group(1))
+            ))
+
+    def result(self):
+        """Plan the remaining moves and return the analysis"""
+        self._plan(self.pending, final=True)
+        seconds = self.times.sum() + self.dwell
+        filament_area = np.pi * (self.filament_diameter / 2) ** 2
+        extent = np.where(np.isfinite(self.lower), self.upper - self.lower, 0.0)
+        return {
+            "print_time_hours": float(seconds / 3600),
+            "filament_length_mm": float(self.filament),
+            "filament_volume_cm3": float(self.filament * filament_area / 1000),
+            "details": {
+                "method": "gcode",
+                "moves": self.moves,
+                "layers": len(self.layer_heights),
+                "print_time_hours": float(self.times[PRINT] / 3600),
+                "travel_time_hours": float(self.times[TRAVEL] / 3600),
+                "retract_time_hours": float(self.times[RETRACT] / 3600),
+                "dwell_time_hours": float(self.dwell / 3600),
+                "slicer_time_hours": None if self.slicer_seconds is None else self.slicer_seconds / 3600,
+                "bbox": dict(zip(("x", "y", "z"), extent.tolist()))
+            }
+        }
+
+
+def analyse_gcode(file_obj, filament_diameter=1.75, acceleration=500, jerk=8,
+                  block_size=GCODE_BLOCK_BYTES):
+    """
+    Print time and filament use of a G-code file, path, or bytes.
+
+    Returns print_time_hours, filament_length_mm and filament_volume_cm3
+    (net of retractions), ready for `calc_energy_cost` and
+    `calc_material_cost`, plus a time breakdown in "details". Heat-up waits
+    (M109/M190) and firmware-side retraction are not timed.
+    """
+    analyser = GcodeAnalyser(filament_diameter, acceleration, jerk)
+    for block in _iter_text_blocks(file_obj, block_size):
+        analyser.feed(block)
+    return analyser.result()
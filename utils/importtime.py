@@ -0,0 +1,100 @@
+"""
+Import-time report.
+
+Imports modules in a fresh interpreter with `-X importtime` and prints the
+wall-clock cold-start time plus the packages that cost the most:
+
+    python -m utils.importtime                      # the estimator core
+    python -m utils.importtime streamlit app_module # anything else
+
+tests/test_import_time.py keeps the core within CORE_IMPORT_BUDGET_SECONDS
+and free of the heavy packages below.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules every quote goes through; none of them may load a heavy package at import
+CORE_MODULES = [
+    'utils.cost_calculator', 'utils.stl_parser', 'utils.parse_cache', 'utils.catalog',
+    'utils.slicer', 'utils.gcode', 'utils.threemf', 'utils.preview', 'utils.batch_quote',
+    'utils.metrics'
+]
+# Imported on first use instead (trimesh brings scipy and networkx)
+HEAVY_MODULES = ('trimesh', 'scipy', 'networkx', 'lxml', 'plotly', 'matplotlib', 'pandas')
+# Measured at about 0.16 s (mostly NumPy); the budget leaves room for slower machines
+CORE_IMPORT_BUDGET_SECONDS = 0.5
+
+_PROBE = """
+import sys, time, json
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def parse_importtime(report):
+    """
+    Sum `-X importtime` self times (microseconds) per top-level package.
+
+    Lines look like "import time:   1234 |   5678 |   package.module".
+    """
+    totals = defaultdict(int)
+    for line in report.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        package = parts[2].strip().split('.')[0]
+        totals[package] += int(parts[0])
+    return dict(totals)
+
+
+def measure_import(modules, breakdown=True):
+    """
+    Import `modules` in a fresh interpreter.
+
+    Returns (seconds, heavy modules that got loaded, per-package self time
+    in microseconds or None when `breakdown` is False - the breakdown adds
+    some overhead to the timing).
+    """
+    command = [sys.executable]
+    if breakdown:
+        command += ['-X', 'importtime']
+    command += ['-c', _PROBE.format(modules=list(modules), heavy=HEAVY_MODULES)]
+    result = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{result.stderr[-2000:]}")
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    packages = parse_importtime(result.stderr) if breakdown else None
+    return probe['elapsed'], probe['loaded'], packages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report cold-start import time per package.")
+    parser.add_argument('modules', nargs='*', help="Modules to import (default: the estimator core)")
+    parser.add_argument('--top', type=int, default=15, help="Number of packages to list")
+    args = parser.parse_args(argv)
+    modules = args.modules or CORE_MODULES
+
+    elapsed, loaded, packages = measure_import(modules)
+    print(f"Cold import of {', '.join(modules)}: {elapsed:.3f} s (with -X importtime overhead)")
+    if not args.modules:
+        print(f"Budget: {CORE_IMPORT_BUDGET_SECONDS:.2f} s")
+    print(f"Heavy packages loaded: {', '.join(loaded) or 'none'}")
+    print()
+    print(f"{'package':<30} {'self ms':>10}")
+    for package, micros in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<30} {micros / 1000:>10.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
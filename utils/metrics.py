@@ -0,0 +1,309 @@
+"""
+Per-stage timing and memory spans for the quoting pipeline.
+
+    from utils import metrics
+
+    with metrics.span("parse", file_type="stl"):
+        volume_cm3, bbox, mesh = parse_3d_file(...)
+
+Spans are recorded when metrics are enabled process-wide (QUOTE_METRICS=1
+or configure(enabled=True)) or when the current thread or task is collecting a
+trace (collect() / start_trace(), used by the app's debug panel).
+Otherwise span() returns a shared no-op context manager, so instrumented
+code costs a flag check per stage.
+
+Recorded spans are aggregated into histograms for prometheus_text() and,
+when the "utils.metrics" logger is enabled for INFO, logged as one JSON
+object per span. Peak memory needs QUOTE_METRICS_MEMORY=1 or
+configure(memory=True); it uses tracemalloc, which slows allocation-heavy
+code and counts every thread's allocations, so it's for investigation
+rather than always-on production use.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+import tracemalloc
+from contextlib import contextmanager
+
+# Histogram bucket bounds (seconds), from a cache hit to a slow slice
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+METRIC_PREFIX = 'quote_stage'
+# Seconds a track_memory() owner's request lasts unless renewed, so sessions
+# that close without saying so don't keep tracemalloc running
+MEMORY_OWNER_TTL = 15 * 60
+
+logger = logging.getLogger(__name__)
+
+_enabled = os.environ.get('QUOTE_METRICS', '') not in ('', '0')
+_memory = False
+# Memory tracking asked for by configure() and by each owner of track_memory()
+# (owner -> time.monotonic() of its last request)
+_memory_configured = False
+_memory_owners = {}
+# When the oldest owner's request lapses
+_memory_deadline = float('inf')
+_memory_lock = threading.Lock()
+# Context variables rather than thread-locals so spans in concurrent
+# asyncio tasks don't nest into each other
+_stack = contextvars.ContextVar('metrics_stack', default=())
+_trace = contextvars.ContextVar('metrics_trace', default=None)
+_stages = {}
+_stages_lock = threading.Lock()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed stage; use through span()"""
+
+    __slots__ = (
+        'name', 'labels', 'depth', 'timestamp', 'seconds', 'peak_bytes',
+        '_started', '_start_bytes', '_peak', '_token'
+    )
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.depth = 0
+        self.timestamp = None
+        self.seconds = None
+        self.peak_bytes = None
+
+    def __enter__(self):
+        stack = _stack.get()
+        self.depth = len(stack)
+        self._start_bytes = None
+        if _memory and time.monotonic() > _memory_deadline:
+            with _memory_lock:
+                _apply_memory()
+        if _memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack and stack[-1]._start_bytes is not None:
+                stack[-1]._peak = max(stack[-1]._peak, peak)
+            tracemalloc.reset_peak()
+            self._start_bytes = self._peak = current
+        self._token = _stack.set(stack + (self,))
+        self.timestamp = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.seconds = time.perf_counter() - self._started
+        _stack.reset(self._token)
+        stack = _stack.get()
+        if self._start_bytes is not None and tracemalloc.is_tracing():
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            # Bytes allocated above the level at entry, including nested spans
+            self.peak_bytes = self._peak - self._start_bytes
+            if stack and stack[-1]._start_bytes is not None:
+                stack[-1]._peak = max(stack[-1]._peak, self._peak)
+        _record(self.as_dict(error=exc_type is not None))
+        return False
+
+    def as_dict(self, error=False):
+        return {
+            'stage': self.name,
+            'labels': self.labels,
+            'depth': self.depth,
+            'timestamp': self.timestamp,
+            'seconds': self.seconds,
+            'peak_bytes': self.peak_bytes,
+            'error': error
+        }
+
+
+def span(name, **labels):
+    """
+    Context manager timing one stage. Keep label values low-cardinality
+    (file type, not file name): each combination is its own time series.
+    """
+    if not _enabled and _trace.get() is None:
+        return _NULL_SPAN
+    return Span(name, labels)
+
+
+def configure(enabled=None, memory=None):
+    """
+    Turn process-wide recording and tracemalloc memory tracking on or off.
+    Memory tracking stays on while any track_memory() owner still wants it.
+    """
+    global _enabled, _memory_configured
+    if enabled is not None:
+        _enabled = enabled
+    if memory is not None:
+        with _memory_lock:
+            _memory_configured = memory
+            _apply_memory()
+
+
+def track_memory(owner, wanted):
+    """
+    Say whether `owner` (e.g. an app session) wants memory tracking.
+    tracemalloc runs while any owner or configure(memory=True) wants it,
+    and is only started or stopped when that changes. An owner's request
+    lapses after MEMORY_OWNER_TTL seconds unless it is made again.
+    """
+    with _memory_lock:
+        if wanted:
+            _memory_owners[owner] = time.monotonic()
+        else:
+            _memory_owners.pop(owner, None)
+        _apply_memory()
+
+
+def _apply_memory():
+    global _memory, _memory_deadline
+    now = time.monotonic()
+    for owner, seen in list(_memory_owners.items()):
+        if now - seen > MEMORY_OWNER_TTL:
+            del _memory_owners[owner]
+    _memory_deadline = min(_memory_owners.values(), default=float('inf')) + MEMORY_OWNER_TTL
+    _memory = _memory_configured or bool(_memory_owners)
+    if _memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def enabled():
+    """True if spans in the current thread or task are being recorded"""
+    return _enabled or _trace.get() is not None
+
+
+def start_trace(trace=None):
+    """
+    Record spans in the current context (thread or asyncio task) into
+    `trace`, or a new list, returned, replacing any trace left over from an
+    interrupted run.
+    """
+    if trace is None:
+        trace = []
+    _trace.set(trace)
+    return trace
+
+
+def stop_trace():
+    """Stop collecting in the current context and return what was collected"""
+    trace = _trace.get()
+    _trace.set(None)
+    return trace or []
+
+
+@contextmanager
+def collect():
+    """`with collect() as trace:` records the block's spans into `trace`"""
+    trace = []
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def _record(record):
+    trace = _trace.get()
+    if trace is not None:
+        trace.append(record)
+    merge([record])
+
+
+def merge(records):
+    """
+    Add span records to the process-wide aggregates, e.g. ones collected in
+    a worker process and sent back with its result.
+    """
+    with _stages_lock:
+        for record in records:
+            key = (record['stage'], tuple(sorted((k, str(v)) for k, v in record['labels'].items())))
+            stats = _stages.get(key)
+            if stats is None:
+                stats = _stages[key] = {
+                    'count': 0, 'errors': 0, 'seconds': 0.0,
+                    'buckets': [0] * len(DURATION_BUCKETS), 'max_peak_bytes': None
+                }
+            stats['count'] += 1
+            stats['errors'] += bool(record.get('error'))
+            stats['seconds'] += record['seconds']
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if record['seconds'] <= bound:
+                    stats['buckets'][index] += 1
+                    break
+            if record.get('peak_bytes') is not None:
+                stats['max_peak_bytes'] = max(stats['max_peak_bytes'] or 0, record['peak_bytes'])
+    if logger.isEnabledFor(logging.INFO):
+        for record in records:
+            logger.info(json.dumps({'event': 'span', **record}, default=str))
+
+
+def snapshot():
+    """Aggregates per (stage, labels) as a list of plain dicts, for JSON export"""
+    with _stages_lock:
+        return [
+            {'stage': stage, 'labels': dict(labels), **{k: v if k != 'buckets' else list(v) for k, v in stats.items()}}
+            for (stage, labels), stats in sorted(_stages.items())
+        ]
+
+
+def reset():
+    """Forget all aggregates (tests, or after a scrape in push setups)"""
+    with _stages_lock:
+        _stages.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(stage, labels, extra=()):
+    pairs = [('stage', stage), *labels, *extra]
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def prometheus_text():
+    """All aggregates in the Prometheus text exposition format"""
+    duration = f'{METRIC_PREFIX}_duration_seconds'
+    lines = [
+        f'# HELP {duration} Time spent in each quoting stage.',
+        f'# TYPE {duration} histogram'
+    ]
+    stages = snapshot()
+    for entry in stages:
+        labels = tuple(sorted(entry['labels'].items()))
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, entry['buckets']):
+            cumulative += count
+            lines.append(f"{duration}_bucket{_labels(entry['stage'], labels, [('le', f'{bound:g}')])} {cumulative}")
+        lines.append(f"{duration}_bucket{_labels(entry['stage'], labels, [('le', '+Inf')])} {entry['count']}")
+        lines.append(f"{duration}_sum{_labels(entry['stage'], labels)} {entry['seconds']:.6f}")
+        lines.append(f"{duration}_count{_labels(entry['stage'], labels)} {entry['count']}")
+
+    errors = f'{METRIC_PREFIX}_errors_total'
+    lines += [f'# HELP {errors} Stages that raised.', f'# TYPE {errors} counter']
+    for entry in stages:
+        lines.append(f"{errors}{_labels(entry['stage'], tuple(sorted(entry['labels'].items())))} {entry['errors']}")
+
+    memory = f'{METRIC_PREFIX}_peak_memory_bytes'
+    tracked = [entry for entry in stages if entry['max_peak_bytes'] is not None]
+    if tracked:
+        lines += [f'# HELP {memory} Largest traced allocation peak seen in each stage.', f'# TYPE {memory} gauge']
+        for entry in tracked:
+            lines.append(f"{memory}{_labels(entry['stage'], tuple(sorted(entry['labels'].items())))} {entry['max_peak_bytes']}")
+    return '\n'.join(lines) + '\n'
+
+
+if os.environ.get('QUOTE_METRICS_MEMORY', '') not in ('', '0'):
+    configure(memory=True)
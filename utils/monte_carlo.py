@@ -0,0 +1,106 @@
+"""
+Monte Carlo price ranges for a quote.
+
+A quote is a point estimate, but print time, support usage, filament and
+electricity prices all vary, and some prints fail and are reprinted. Each
+uncertain input gets a mean-one lognormal factor; the factors are drawn
+together from a Gaussian copula, so correlated inputs (more support means
+a longer print) move together. Reprints are drawn as geometric attempt
+counts from the fail rate. Every sample is priced at once with the array
+functions of utils.business_logic, and the spread is reported as
+percentiles: 200,000 samples take a few tens of milliseconds.
+"""
+import numpy as np
+
+from utils.business_logic import calc_depreciation, calc_labour, apply_fail_rate, calc_final_business_price
+
+DEFAULT_SAMPLES = 200_000
+PERCENTILES = (50, 90, 99)
+# Lognormal sigma of each input's multiplicative error
+DEFAULT_SIGMAS = {
+    'print_time': 0.15,
+    'support': 0.35,
+    'filament_price': 0.10,
+    'electricity_rate': 0.05
+}
+# Correlations between the normal draws behind the factors
+DEFAULT_CORRELATIONS = {
+    ('print_time', 'support'): 0.6,
+    ('filament_price', 'electricity_rate'): 0.3
+}
+
+
+def correlated_factors(samples, sigmas, correlations=None, rng=None):
+    """
+    Mean-one lognormal factors for each name in `sigmas`, with the given
+    pairwise correlations between their underlying normals. Returns
+    name -> array of `samples` factors.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    names = list(sigmas)
+    matrix = np.eye(len(names))
+    for (first, second), rho in (correlations or {}).items():
+        if first in sigmas and second in sigmas:
+            i, j = names.index(first), names.index(second)
+            matrix[i, j] = matrix[j, i] = rho
+    try:
+        lower = np.linalg.cholesky(matrix)
+    except np.linalg.LinAlgError:
+        raise ValueError("Correlations must form a positive definite matrix")
+    sigma = np.array([sigmas[name] for name in names], dtype=np.float64)
+    normals = rng.standard_normal((samples, len(names))) @ lower.T
+    factors = np.exp(normals * sigma - sigma ** 2 / 2)
+    return {name: factors[:, index] for index, name in enumerate(names)}
+
+
+def simulate_quote(volume_cm3, print_time_hr, density, cost_per_kg, power_watt, electricity_rate,
+                   printer=None, markup_percent=0.0, support_volume_cm3=0.0, fail_rate_percent=0.0,
+                   prep_hours=0.0, post_hours=0.0, labour_rate=0.0, shipping=0.0,
+                   samples=DEFAULT_SAMPLES, sigmas=None, correlations=None, seed=None):
+    """
+    Price distribution of one print.
+
+    Each attempt costs material (support volume and filament price
+    varying), energy and depreciation (print time and electricity rate
+    varying); failed attempts are reprinted in full. Labour is charged
+    once per good print, then shipping and markup are added as in
+    calc_final_business_price. `sigmas` and
+    `correlations` update DEFAULT_SIGMAS and DEFAULT_CORRELATIONS.
+
+    Returns a dict with "point" (the same price without any variation, the
+    fail rate applied as an expected value), "mean", "percentiles"
+    (PERCENTILES -> price) and "samples".
+    """
+    if not 0 <= fail_rate_percent < 100:
+        raise ValueError("Fail rate must be at least 0 and below 100 percent")
+    rng = np.random.default_rng(seed)
+    factors = correlated_factors(
+        samples, {**DEFAULT_SIGMAS, **(sigmas or {})}, {**DEFAULT_CORRELATIONS, **(correlations or {})}, rng
+    )
+    printer = printer or {}
+    ownership = printer.get('cost', 0.0) + printer.get('upgrades', 0.0) + printer.get('maintenance', 0.0)
+    lifetime = printer.get('lifetime_hours', 0.0)
+    labour = calc_labour(prep_hours, post_hours, labour_rate)
+
+    def attempt_cost(support_factor, price_factor, time_factor, rate_factor):
+        grams = (volume_cm3 + support_volume_cm3 * support_factor) * density
+        material = grams / 1000 * cost_per_kg * price_factor
+        hours = print_time_hr * time_factor
+        energy = power_watt * hours / 1000 * electricity_rate * rate_factor
+        return material + energy + calc_depreciation(ownership, lifetime, hours)
+
+    # Reprints cost 1 / (1 - fail rate) attempts on average; labour is paid once either way
+    point = calc_final_business_price(
+        apply_fail_rate(attempt_cost(1.0, 1.0, 1.0, 1.0), fail_rate_percent) + labour, 0.0, shipping, markup_percent
+    )
+    per_attempt = attempt_cost(
+        factors['support'], factors['filament_price'], factors['print_time'], factors['electricity_rate']
+    )
+    attempts = rng.geometric(1 - fail_rate_percent / 100, samples) if fail_rate_percent else 1
+    prices = calc_final_business_price(per_attempt * attempts + labour, 0.0, shipping, markup_percent)
+    return {
+        'point': point,
+        'mean': float(prices.mean()),
+        'percentiles': dict(zip(PERCENTILES, np.percentile(prices, PERCENTILES).tolist())),
+        'samples': samples
+    }
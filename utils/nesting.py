@@ -0,0 +1,302 @@
+"""
+Packing parts onto build plates and pricing them per plate.
+
+Each part's footprint is the convex hull of its vertices seen from above,
+grown by half the spacing between parts and rasterised onto a grid of
+`cell_mm` cells. Plates are occupancy grids of the same cells. Parts are
+placed largest first, each copy at the lowest, then leftmost free position
+on the first plate it fits (bottom-left first-fit decreasing), trying each
+allowed rotation. Free positions for a footprint are found for the whole
+plate at once by correlating the occupancy grid with the footprint (an
+FFT), and plates are ruled out before that from their free area and from
+earlier misses of the same footprint, since a plate only ever fills up.
+
+Pricing follows the batch quote settings (see utils.batch_quote.make_settings):
+each plate runs for the sum of its parts' print times plus a fixed
+overhead for heating up, purging and clearing the plate, and that overhead
+is shared between the parts on the plate.
+"""
+import numpy as np
+
+from utils.catalog import BUILD_VOLUME_FIELD
+from utils.cost_calculator import (
+    calc_material_cost, calc_energy_cost, calc_total_cost, calc_depreciation_cost
+)
+
+# Grid resolution (mm); footprints are rounded out to whole cells
+DEFAULT_CELL_MM = 1.0
+# Gap kept between parts (mm)
+DEFAULT_SPACING_MM = 5.0
+# Rotations tried about the vertical axis (degrees)
+DEFAULT_ROTATIONS = (0, 90)
+# Heat-up, purge, bed levelling and part removal per plate (hours)
+DEFAULT_PLATE_OVERHEAD_HOURS = 0.25
+
+
+class Part:
+    """One part to print `quantity` times; footprint is its XY convex hull in mm"""
+
+    __slots__ = ('name', 'footprint', 'height_mm', 'volume_cm3', 'print_time_hr', 'quantity')
+
+    def __init__(self, name, footprint, height_mm, volume_cm3, print_time_hr, quantity=1):
+        if quantity < 1:
+            raise ValueError(f"Quantity of '{name}' must be at least 1")
+        self.name = name
+        self.footprint = np.asarray(footprint, dtype=np.float64)
+        self.height_mm = float(height_mm)
+        self.volume_cm3 = float(volume_cm3)
+        self.print_time_hr = float(print_time_hr)
+        self.quantity = int(quantity)
+
+
+def footprint_hull(vertices):
+    """Convex hull (counter-clockwise, mm) of a mesh's vertices projected onto the bed"""
+    # scipy comes with trimesh
+    from scipy.spatial import ConvexHull, QhullError
+
+    points = np.asarray(vertices, dtype=np.float64)[:, :2]
+    try:
+        return points[ConvexHull(points).vertices]
+    except (QhullError, ValueError):
+        # Flat or tiny footprints: fall back to the bounding rectangle
+        lower, upper = points.min(axis=0), points.max(axis=0)
+        return np.array([lower, [upper[0], lower[1]], upper, [lower[0], upper[1]]])
+
+
+def part_from_mesh(name, vertices, volume_cm3, print_time_hr, quantity=1):
+    """A Part from a mesh's vertices (mm), using the convex hull of its footprint"""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    height = vertices[:, 2].max() - vertices[:, 2].min()
+    return Part(name, footprint_hull(vertices), height, volume_cm3, print_time_hr, quantity)
+
+
+def rasterise_footprint(hull, cell_mm=DEFAULT_CELL_MM, margin_mm=0.0, rotation=0):
+    """
+    Boolean (rows, columns) mask of the cells within `margin_mm` of a convex
+    hull rotated by `rotation` degrees. Corners are mitred, which only errs
+    towards more room between parts.
+    """
+    theta = np.radians(rotation)
+    rotate = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    hull = np.asarray(hull, dtype=np.float64) @ rotate.T
+    hull = hull - hull.min(axis=0) + margin_mm
+    extent = hull.max(axis=0) + margin_mm
+    columns, rows = np.maximum(np.ceil(extent / cell_mm).astype(int), 1)
+    if len(hull) < 3:
+        return np.ones((rows, columns), dtype=bool)
+
+    x = (np.arange(columns) + 0.5) * cell_mm
+    y = (np.arange(rows) + 0.5) * cell_mm
+    edges = np.roll(hull, -1, axis=0) - hull
+    lengths = np.hypot(edges[:, 0], edges[:, 1])
+    keep = lengths > 0
+    hull, edges, lengths = hull[keep], edges[keep], lengths[keep]
+    # Outward distance of each cell centre from each (counter-clockwise) edge;
+    # half a cell's diagonal more counts any cell the footprint touches
+    limit = margin_mm + cell_mm * np.sqrt(0.5)
+    mask = np.ones((rows, columns), dtype=bool)
+    for start, edge, length in zip(hull, edges, lengths):
+        distance = (edge[1] * (x[None, :] - start[0]) - edge[0] * (y[:, None] - start[1])) / length
+        mask &= distance <= limit
+    return mask
+
+
+def _inscribed_rectangle(mask):
+    """(row, column, rows, columns) of a large rectangle inside a convex mask"""
+    filled = mask.any(axis=1)
+    left = np.where(filled, mask.argmax(axis=1), mask.shape[1])
+    right = np.where(filled, mask.shape[1] - mask[:, ::-1].argmax(axis=1), 0)
+    best = (0, 0, 1, 1)
+    best_area = 0
+    for height in range(1, mask.shape[0] + 1):
+        # Widest span shared by `height` consecutive rows, for every start row
+        windows = np.lib.stride_tricks.sliding_window_view
+        lower = windows(left, height).max(axis=1)
+        upper = windows(right, height).min(axis=1)
+        widths = upper - lower
+        row = int(widths.argmax())
+        if widths[row] * height > best_area:
+            best_area = int(widths[row] * height)
+            best = (row, int(lower[row]), height, int(widths[row]))
+    return best
+
+
+class _Plate:
+    """Occupancy grid plus a summed-area table for quick free-rectangle tests"""
+
+    __slots__ = ('occupied', 'free_cells', 'placements', '_table')
+
+    def __init__(self, shape):
+        self.occupied = np.zeros(shape, dtype=np.float64)
+        self.free_cells = shape[0] * shape[1]
+        self.placements = []
+        self._table = None
+
+    def first_free_rectangle_row(self, rows, columns):
+        """First row where some rows x columns window is empty, or None"""
+        if self._table is None:
+            self._table = np.zeros((self.occupied.shape[0] + 1, self.occupied.shape[1] + 1))
+            self._table[1:, 1:] = self.occupied.cumsum(axis=0).cumsum(axis=1)
+        table = self._table
+        sums = (
+            table[rows:, columns:] - table[:-rows, columns:]
+            - table[rows:, :-columns] + table[:-rows, :-columns]
+        )
+        free_rows = np.flatnonzero((sums < 0.5).any(axis=1))
+        return int(free_rows[0]) if len(free_rows) else None
+
+    def fill(self, row, column, mask):
+        self.occupied[row:row + mask.shape[0], column:column + mask.shape[1]] += mask
+        self.free_cells -= int(mask.sum())
+        self._table = None
+
+
+def _first_free_position(occupied, mask, start_row=0):
+    """
+    (row, column) of the first position in scan order, from `start_row` on,
+    where `mask` fits, or None
+    """
+    occupied = occupied[start_row:]
+    rows, columns = mask.shape
+    if rows > occupied.shape[0] or columns > occupied.shape[1]:
+        return None
+    # fftconvolve is in scipy, which trimesh already depends on
+    from scipy.signal import fftconvolve
+
+    overlap = fftconvolve(occupied, mask[::-1, ::-1].astype(np.float64), mode='valid')
+    free = np.flatnonzero(overlap.ravel() < 0.5)
+    if not len(free):
+        return None
+    row, column = divmod(int(free[0]), overlap.shape[1])
+    return row + start_row, column
+
+
+def nest_parts(parts, bed_mm, build_height_mm=None, spacing_mm=DEFAULT_SPACING_MM,
+               cell_mm=DEFAULT_CELL_MM, rotations=DEFAULT_ROTATIONS):
+    """
+    Pack every copy of `parts` onto as few (bed_mm[0] x bed_mm[1]) plates as
+    first-fit decreasing finds.
+
+    Returns a list of plates, each a dict with "placements" (dicts of part
+    name, copy number, x and y of the footprint's lower-left corner in mm,
+    and rotation) and "utilisation" (share of the plate's cells used).
+    Raises ValueError for a part that fits on no plate.
+    """
+    shape = (int(bed_mm[1] // cell_mm), int(bed_mm[0] // cell_mm))
+    masks = {}
+    for part in parts:
+        if part.name in masks:
+            raise ValueError(f"Part names must be unique; '{part.name}' is listed twice")
+        if build_height_mm is not None and part.height_mm > build_height_mm:
+            raise ValueError(f"'{part.name}' is {part.height_mm:.0f} mm tall; the printer builds up to {build_height_mm:.0f} mm")
+        options = []
+        for rotation in rotations:
+            mask = rasterise_footprint(part.footprint, cell_mm, spacing_mm / 2, rotation)
+            if mask.shape[0] <= shape[0] and mask.shape[1] <= shape[1]:
+                options.append((rotation, mask, _inscribed_rectangle(mask)))
+        if not options:
+            raise ValueError(f"'{part.name}' doesn't fit on a {bed_mm[0]:g} x {bed_mm[1]:g} mm plate")
+        masks[part.name] = options
+
+    # Largest footprints first
+    order = sorted(parts, key=lambda part: -min(int(mask.sum()) for _, mask, _ in masks[part.name]))
+    plates = []
+    # (part name, rotation, plate) -> first row worth searching, or None once
+    # the footprint no longer fits. Plates only fill up, so a footprint
+    # never fits anywhere it was blocked before.
+    cursors = {}
+    for part in order:
+        for copy in range(part.quantity):
+            placed = False
+            for index, plate in enumerate(plates):
+                best = None
+                for rotation, mask, (inner_row, _, inner_rows, inner_columns) in masks[part.name]:
+                    key = (part.name, rotation, index)
+                    start_row = cursors.get(key, 0)
+                    if start_row is None or plate.free_cells < mask.sum():
+                        continue
+                    # The footprint can't go anywhere its inscribed rectangle doesn't fit
+                    free_row = plate.first_free_rectangle_row(inner_rows, inner_columns)
+                    if free_row is None:
+                        cursors[key] = None
+                        continue
+                    start_row = max(start_row, free_row - inner_row)
+                    position = _first_free_position(plate.occupied, mask, start_row)
+                    cursors[key] = None if position is None else position[0]
+                    if position is not None and (best is None or position < best[0]):
+                        best = (position, rotation, mask)
+                if best is not None:
+                    _place(plate, part, copy, *best, cell_mm)
+                    placed = True
+                    break
+            if not placed:
+                plate = _Plate(shape)
+                plates.append(plate)
+                rotation, mask, _ = masks[part.name][0]
+                _place(plate, part, copy, (0, 0), rotation, mask, cell_mm)
+
+    total_cells = shape[0] * shape[1]
+    return [
+        {'placements': plate.placements, 'utilisation': 1 - plate.free_cells / total_cells}
+        for plate in plates
+    ]
+
+
+def _place(plate, part, copy, position, rotation, mask, cell_mm):
+    row, column = position
+    plate.fill(row, column, mask)
+    plate.placements.append({
+        'name': part.name,
+        'copy': copy,
+        'x': column * cell_mm,
+        'y': row * cell_mm,
+        'rotation': rotation
+    })
+
+
+def price_plates(parts, plates, settings, plate_overhead_hours=DEFAULT_PLATE_OVERHEAD_HOURS):
+    """
+    Cost of printing nested plates, with each plate's overhead shared
+    between its parts.
+
+    `settings` is a batch quote settings dict (density, cost_per_kg,
+    electricity_rate, markup_percent, printer). Returns a dict with
+    "plates", "print_hours", "total_cost" and "parts": name ->
+    {"quantity", "unit_cost", "total_cost", "overhead_share"}.
+    """
+    by_name = {part.name: part for part in parts}
+    printer = settings['printer']
+
+    def cost(volume_cm3, hours):
+        material = calc_material_cost(volume_cm3, settings['density'], settings['cost_per_kg'])
+        energy = calc_energy_cost(hours, printer['avg_power_watts'], settings['electricity_rate'])
+        return calc_total_cost(material, energy, settings['markup_percent']) + calc_depreciation_cost(printer, hours)
+
+    overhead = cost(0.0, plate_overhead_hours)
+    totals = {name: {'quantity': 0, 'total_cost': 0.0, 'overhead_share': 0.0} for name in by_name}
+    print_hours = 0.0
+    for plate in plates:
+        share = overhead / len(plate['placements'])
+        for placement in plate['placements']:
+            part = by_name[placement['name']]
+            entry = totals[part.name]
+            entry['quantity'] += 1
+            entry['total_cost'] += cost(part.volume_cm3, part.print_time_hr) + share
+            entry['overhead_share'] += share
+            print_hours += part.print_time_hr
+    for entry in totals.values():
+        entry['unit_cost'] = entry['total_cost'] / entry['quantity'] if entry['quantity'] else 0.0
+    return {
+        'plates': len(plates),
+        'print_hours': print_hours + plate_overhead_hours * len(plates),
+        'total_cost': sum(entry['total_cost'] for entry in totals.values()),
+        'parts': totals
+    }
+
+
+def bed_size(printer):
+    """(x, y, z) build volume in mm from a catalog printer entry"""
+    volume = printer.get(BUILD_VOLUME_FIELD)
+    if volume is None:
+        raise ValueError(f"The printer has no {BUILD_VOLUME_FIELD} in the catalog")
+    return tuple(float(size) for size in volume)
@@ -0,0 +1,166 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.compact_mesh import CompactMesh
+
+# Default in-memory budget for cached geometry (bytes)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class CacheEntry:
+    """Parsed geometry for one upload: volume, bounding box and a CompactMesh"""
+
+    # Weak-referenceable so meshes too big to cache can be shared while in use
+    __slots__ = ("volume_cm3", "bbox", "mesh", "__weakref__")
+
+    def __init__(self, volume_cm3, bbox, mesh):
+        self.volume_cm3 = float(volume_cm3)
+        self.bbox = {axis: float(bbox[axis]) for axis in ("x", "y", "z")}
+        self.mesh = mesh
+
+    @property
+    def nbytes(self):
+        return self.mesh.nbytes + 128
+
+
+class ParseCache:
+    """
+    Content-addressed cache for parsed 3D models.
+
+    Entries are keyed by the SHA-256 of the upload bytes plus the file type.
+    The first tier is an in-memory LRU bounded by `max_bytes`; if `cache_dir`
+    is given, entries are also written there as .npz files and survive restarts.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.current_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # key -> (entry, bytes charged when it was inserted); a mesh's nbytes
+        # grows as it derives its bounds, so eviction gives back the charge
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(data, file_type):
+        """Build the cache key for raw file bytes and a file extension"""
+        digest = hashlib.sha256(data).hexdigest()
+        return f"{digest}.{file_type.lower()}"
+
+    def get(self, key):
+        """Return the cached entry for `key`, or None"""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[0]
+
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        """Store an entry in memory and, if configured, on disk"""
+        with self._lock:
+            self._insert(key, entry)
+        self._save_to_disk(key, entry)
+
+    def clear(self):
+        """Drop all in-memory entries (disk entries are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _insert(self, key, entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= old[1]
+        size = entry.nbytes
+        # Entries larger than the whole budget are only kept on disk
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (entry, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                bbox = dict(zip(("x", "y", "z"), data["bbox"]))
+                # Saved meshes are already merged
+                return CacheEntry(data["volume_cm3"], bbox, CompactMesh(data["vertices"], data["faces"], merge=False))
+        except Exception:
+            # A corrupt or partial file is treated as a miss
+            return None
+
+    def _save_to_disk(self, key, entry):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    volume_cm3=np.float64(entry.volume_cm3),
+                    bbox=np.array([entry.bbox["x"], entry.bbox["y"], entry.bbox["z"]]),
+                    vertices=entry.mesh.vertices,
+                    faces=entry.mesh.faces
+                )
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_parse_cache():
+    """
+    Return the process-wide parse cache shared by all Streamlit sessions.
+
+    Set PARSE_CACHE_DIR to enable the on-disk tier and PARSE_CACHE_MAX_MB to
+    change the in-memory budget.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            max_mb = float(os.environ.get("PARSE_CACHE_MAX_MB", DEFAULT_MAX_BYTES / (1024 * 1024)))
+            _default_cache = ParseCache(
+                max_bytes=int(max_mb * 1024 * 1024),
+                cache_dir=os.environ.get("PARSE_CACHE_DIR") or None
+            )
+        return _default_cache
@@ -0,0 +1,215 @@
+"""
+Background parsing of uploaded files.
+
+The app submits every upload to a shared worker pool as soon as it knows
+the upload list, then renders each file as its job finishes. Parsed meshes
+go into the parse cache, so the tab's own parse_3d_file call is a cache
+hit; meshes too big for its memory budget are handed to the caller
+instead, and shared while any caller still holds one. G-code analyses and
+3MF plate results are kept in a small LRU.
+Identical uploads from any session share one job.
+
+Threads are the default: NumPy and the streaming parsers release the GIL
+for most of their work and results need no copying. PARSE_POOL=process
+switches to worker processes, which also parallelise the pure-Python parts
+of trimesh.load at the cost of pickling uploads and meshes. PARSE_WORKERS
+sets the pool size (default: CPU count).
+"""
+import os
+import weakref
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+from utils import metrics
+from utils.stl_parser import parse_3d_file
+from utils.gcode import analyse_gcode
+from utils.threemf import read_plate_metadata
+from utils.parse_cache import CacheEntry, get_parse_cache
+
+# Finished G-code and 3MF plate results kept for reruns (a few KB each)
+RESULT_CACHE_ENTRIES = 256
+
+
+def load_upload(data, file_type, filament_diameter=1.75):
+    """
+    Worker entry point. Returns {"kind": "plates", "plates"} for sliced 3MF
+    projects, {"kind": "gcode", "gcode"} for G-code, and otherwise
+    {"kind": "mesh", "volume_cm3", "bbox", "mesh"}, each with
+    the job's span records under "trace".
+    """
+    with metrics.collect() as trace, metrics.span("parse.job", file_type=file_type):
+        plates = read_plate_metadata(data) if file_type == "3mf" else None
+        if plates:
+            result = {"kind": "plates", "plates": plates}
+        elif file_type == "gcode":
+            result = {"kind": "gcode", "gcode": analyse_gcode(data, filament_diameter=filament_diameter)}
+        else:
+            volume_cm3, bbox, mesh = parse_3d_file(data, file_type)
+            result = {
+                "kind": "mesh",
+                "volume_cm3": volume_cm3,
+                "bbox": bbox,
+                # float32/int32 with merged vertices, so worker processes send back little
+                "mesh": mesh
+            }
+    result["trace"] = trace
+    result["remote"] = multiprocessing.parent_process() is not None
+    return result
+
+
+class ParseJobs:
+    """
+    Shared pool of parse jobs with coalescing and cancellation.
+
+    Each caller identifies itself with an `owner` (e.g. a session id).
+    `submit` returns a Future per upload; `release` drops the owner's
+    interest in everything it no longer shows, cancelling jobs that are
+    still queued and wanted by nobody else. Jobs already running finish
+    and are cached.
+    """
+
+    def __init__(self, cache, workers=None, processes=False):
+        self.cache = cache
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        if processes:
+            # Not fork: the Streamlit server process has threads
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="parse")
+        # Reentrant: cancelling a job runs its done callback in the cancelling thread
+        self._lock = threading.RLock()
+        # key -> (outer Future, executor Future, owners)
+        self._jobs = {}
+        self._results = OrderedDict()
+        # cache_key -> CacheEntry too big for the parse cache, while someone holds it
+        self._oversized = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def job_key(cache_key, file_type, filament_diameter=1.75):
+        return (cache_key, filament_diameter if file_type == "gcode" else None)
+
+    def submit(self, owner, cache_key, data, file_type, filament_diameter=1.75):
+        """
+        Future for one upload's parse result (see load_upload; meshes are
+        reported as {"kind": "mesh", "volume_cm3", "bbox"} and fetched from
+        the parse cache, except that meshes over its memory budget come with
+        their CacheEntry under "entry"). `data` may be a callable returning
+        the bytes, so cache hits never read the upload.
+        """
+        file_type = file_type.lower()
+        key = self.job_key(cache_key, file_type, filament_diameter)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                return _completed({**result, "trace": []})
+            job = self._jobs.get(key)
+            if job is not None:
+                job[2].add(owner)
+                return job[0]
+
+        if file_type != "gcode":
+            entry = self._oversized.get(cache_key)
+            if entry is not None:
+                return _completed({
+                    "kind": "mesh", "volume_cm3": entry.volume_cm3, "bbox": dict(entry.bbox), "entry": entry, "trace": []
+                })
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                return _completed({"kind": "mesh", "volume_cm3": entry.volume_cm3, "bbox": dict(entry.bbox), "trace": []})
+
+        if callable(data):
+            data = data()
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                job[2].add(owner)
+                return job[0]
+            outer = Future()
+            inner = self._executor.submit(load_upload, data, file_type, filament_diameter)
+            self._jobs[key] = (outer, inner, {owner})
+        inner.add_done_callback(lambda done: self._finished(key, cache_key, done))
+        return outer
+
+    def _finished(self, key, cache_key, inner):
+        with self._lock:
+            job = self._jobs.pop(key, None)
+        if job is None or inner.cancelled():
+            return
+        outer = job[0]
+        error = inner.exception()
+        if error is not None:
+            outer.set_exception(error)
+            return
+        result = inner.result()
+        if result.pop("remote"):
+            metrics.merge(result["trace"])
+        if result["kind"] == "mesh":
+            entry = CacheEntry(result["volume_cm3"], result["bbox"], result.pop("mesh"))
+            self.cache.put(cache_key, entry)
+            if cache_key not in self.cache:
+                # Over the memory budget: the caller keeps it instead of parsing it again
+                result["entry"] = entry
+                with self._lock:
+                    self._oversized[cache_key] = entry
+        else:
+            with self._lock:
+                self._results[key] = result
+                while len(self._results) > RESULT_CACHE_ENTRIES:
+                    self._results.popitem(last=False)
+        outer.set_result(result)
+
+    def release(self, owner, keep=()):
+        """Drop `owner`'s interest in jobs not in `keep`; returns how many were cancelled"""
+        keep = set(keep)
+        cancelled = 0
+        with self._lock:
+            for key, (outer, inner, owners) in list(self._jobs.items()):
+                if key in keep or owner not in owners:
+                    continue
+                owners.discard(owner)
+                if not owners and inner.cancel():
+                    self._jobs.pop(key, None)
+                    outer.cancel()
+                    cancelled += 1
+        return cancelled
+
+    def status(self, future):
+        """"done", "running" or "queued" for a Future returned by submit"""
+        if future.done():
+            return "done"
+        with self._lock:
+            for outer, inner, _ in self._jobs.values():
+                if outer is future:
+                    return "running" if inner.running() else "queued"
+        return "done"
+
+    @property
+    def pending(self):
+        return len(self._jobs)
+
+
+def _completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+_default_jobs = None
+_default_jobs_lock = threading.Lock()
+
+
+def get_parse_jobs():
+    """Return the process-wide job pool, configured from PARSE_POOL and PARSE_WORKERS"""
+    global _default_jobs
+    with _default_jobs_lock:
+        if _default_jobs is None:
+            _default_jobs = ParseJobs(
+                get_parse_cache(),
+                workers=int(os.environ.get("PARSE_WORKERS", 0)) or None,
+                processes=os.environ.get("PARSE_POOL", "thread").lower() == "process"
+            )
+        return _default_jobs
@@ -0,0 +1,188 @@
+"""
+Memoised dataflow graph for incremental quoting.
+
+A Pipeline holds named inputs and nodes. Each node is a function of named
+inputs or other nodes, declared when it is added, and remembers the
+versions of its inputs from its last run. get() recomputes a node only if
+one of those versions changed; otherwise it returns the stored value and
+counts a hit. Setting an input to an equal value (or the same `key`)
+keeps its version, and a node that recomputes to an equal value keeps its
+own, so unaffected nodes further down don't rerun either.
+
+The app keeps one Pipeline per uploaded file and session, so moving the
+markup slider reruns only the total and the views that show it:
+
+    parse -> validation -> time -> material / energy / depreciation -> total -> views
+
+Every recomputation is timed as a "pipeline.<node>" metrics span, and
+stats() reports per-node hits and misses.
+"""
+import time
+import inspect
+
+from utils import metrics
+from utils.cost_calculator import (
+    calc_material_cost, calc_energy_cost, calc_total_cost, calc_depreciation_cost
+)
+from utils.tariffs import tariff_energy_cost, cheapest_start
+
+
+def _same(a, b):
+    """Cheap equality for deciding whether a value changed: identity, or == for plain values"""
+    if a is b:
+        return True
+    if type(a) is not type(b) or not isinstance(a, (int, float, str, bytes, tuple, frozenset, dict)):
+        return False
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        # Containers holding arrays have no single truth value
+        return False
+
+
+class Node:
+    """One memoised computation; `inputs` name the values passed to `func` in order"""
+
+    __slots__ = ('name', 'func', 'inputs', 'hits', 'misses', 'seconds', 'version', 'seen', 'value')
+
+    def __init__(self, name, func, inputs):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.hits = 0
+        self.misses = 0
+        self.seconds = 0.0
+        self.version = 0
+        self.seen = None
+        self.value = None
+
+
+class Pipeline:
+    """Inputs and memoised nodes; see the module docstring"""
+
+    def __init__(self):
+        self.nodes = {}
+        # input name -> [value, key, version]
+        self._inputs = {}
+
+    def set(self, name, value, key=None):
+        """
+        Set an input. It only counts as changed when `key` differs (if
+        given) or the value differs; use a key for values that are
+        expensive to compare or rebuilt on every run, like meshes.
+        """
+        if name in self.nodes:
+            raise ValueError(f"'{name}' is a node, not an input")
+        current = self._inputs.get(name)
+        if current is None:
+            self._inputs[name] = [value, key, 1]
+            return
+        unchanged = _same(key, current[1]) if key is not None else _same(value, current[0])
+        current[0], current[1] = value, key
+        if not unchanged:
+            current[2] += 1
+
+    def update(self, **values):
+        for name, value in values.items():
+            self.set(name, value)
+
+    def add(self, name, func, inputs=None):
+        """
+        Add a node computing `func(*inputs)`. `inputs` defaults to the
+        function's parameter names; each must be an input or an earlier node.
+        """
+        if name in self.nodes or name in self._inputs:
+            raise ValueError(f"'{name}' is already defined")
+        if any(name in node.inputs for node in self.nodes.values()):
+            raise ValueError(f"'{name}' is already used as an input")
+        inputs = list(inspect.signature(func).parameters) if inputs is None else list(inputs)
+        self.nodes[name] = Node(name, func, inputs)
+        return func
+
+    def node(self, name=None, inputs=None):
+        """Decorator form of add(); the node is named after the function by default"""
+        def register(func):
+            return self.add(name or func.__name__, func, inputs)
+        return register
+
+    def _version(self, name):
+        return self.nodes[name].version if name in self.nodes else self._inputs[name][2]
+
+    def get(self, name):
+        """Value of an input or node, recomputing the node only if an input changed"""
+        if name not in self.nodes:
+            try:
+                return self._inputs[name][0]
+            except KeyError:
+                raise ValueError(f"Pipeline input '{name}' has not been set")
+        node = self.nodes[name]
+        arguments = [self.get(input_name) for input_name in node.inputs]
+        seen = tuple(self._version(input_name) for input_name in node.inputs)
+        if seen == node.seen:
+            node.hits += 1
+            return node.value
+        start = time.perf_counter()
+        with metrics.span(f"pipeline.{name}"):
+            value = node.func(*arguments)
+        node.seconds = time.perf_counter() - start
+        node.misses += 1
+        if node.seen is None or not _same(value, node.value):
+            node.version += 1
+        node.seen = seen
+        node.value = value
+        return value
+
+    __getitem__ = get
+
+    def stats(self):
+        """Per-node hits, misses and the time of the last recomputation (s), in definition order"""
+        return [
+            {'node': node.name, 'hits': node.hits, 'misses': node.misses, 'seconds': node.seconds}
+            for node in self.nodes.values()
+        ]
+
+    def reset_stats(self):
+        for node in self.nodes.values():
+            node.hits = node.misses = 0
+
+
+def quote_graph():
+    """
+    A Pipeline with the cost nodes of one quote. Inputs: volume_cm3,
+    density, cost_per_kg, support_cost, print_time_hr, power_watt,
+    electricity_rate, tariff (half-hourly prices or None), start_hr,
+    printer (catalog details) and markup_percent.
+    """
+    graph = Pipeline()
+
+    @graph.node()
+    def material_cost(volume_cm3, density, cost_per_kg, support_cost):
+        return calc_material_cost(volume_cm3, density, cost_per_kg) + support_cost
+
+    @graph.node()
+    def energy_cost(print_time_hr, power_watt, electricity_rate, tariff, start_hr):
+        # Time-of-use tariffs are integrated over the print window
+        if tariff is not None:
+            return tariff_energy_cost(tariff, start_hr, print_time_hr, power_watt)
+        return calc_energy_cost(print_time_hr, power_watt, electricity_rate)
+
+    @graph.node(name='cheapest_start')
+    def best_start(tariff, print_time_hr, power_watt, start_hr):
+        # Cheapest start within a day of the chosen one, or None on flat rates
+        if tariff is None:
+            return None
+        return cheapest_start(tariff, print_time_hr, power_watt, earliest_hr=start_hr, latest_hr=start_hr + 24)
+
+    @graph.node()
+    def depreciation_cost(printer, print_time_hr):
+        return calc_depreciation_cost(printer, print_time_hr)
+
+    @graph.node()
+    def total_cost(material_cost, energy_cost, markup_percent):
+        return calc_total_cost(material_cost, energy_cost, markup_percent)
+
+    @graph.node()
+    def total_with_depreciation(total_cost, depreciation_cost):
+        return total_cost + depreciation_cost
+
+    return graph
@@ -0,0 +1,212 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Faces sent to the browser by default; plenty for an interactive preview
+DEFAULT_FACE_BUDGET = 100_000
+PREVIEW_FACE_BUDGETS = [20_000, 50_000, 100_000, 250_000]
+# Max number of decimated previews kept in memory
+PREVIEW_CACHE_SIZE = 32
+# Clustering passes allowed while searching for a grid that fits the budget
+DECIMATE_MAX_PASSES = 6
+
+
+class PreviewMesh:
+    """Decimated, float32/int32 geometry ready to hand to Plotly"""
+
+    __slots__ = ("vertices", "faces", "source_faces")
+
+    def __init__(self, vertices, faces, source_faces):
+        self.vertices = vertices
+        self.faces = faces
+        self.source_faces = source_faces
+
+    @property
+    def decimated(self):
+        return len(self.faces) < self.source_faces
+
+    @property
+    def nbytes(self):
+        return self.vertices.nbytes + self.faces.nbytes
+
+
+def cluster_vertices(vertices, faces, resolution):
+    """
+    Vertex-clustering decimation on a uniform grid.
+
+    The bounding box is split into cells with `resolution` cells along its
+    longest axis. Vertices in the same cell are merged to their mean, and
+    faces that collapse or duplicate another face are dropped.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    lower = vertices.min(axis=0)
+    extent = vertices.max(axis=0) - lower
+    cell = max(extent.max(), 1e-9) / resolution
+    dims = np.floor(extent / cell).astype(np.int64) + 1
+
+    cells = np.floor((vertices - lower) / cell).astype(np.int64)
+    np.minimum(cells, dims - 1, out=cells)
+    cell_keys = cells[:, 0] + dims[0] * (cells[:, 1] + dims[1] * cells[:, 2])
+    unique_keys, cluster = np.unique(cell_keys, return_inverse=True)
+
+    counts = np.bincount(cluster, minlength=len(unique_keys)).astype(np.float64)
+    merged = np.column_stack([
+        np.bincount(cluster, weights=vertices[:, axis], minlength=len(unique_keys)) / counts
+        for axis in range(3)
+    ])
+
+    new_faces = cluster[faces]
+    keep = (
+        (new_faces[:, 0] != new_faces[:, 1])
+        & (new_faces[:, 1] != new_faces[:, 2])
+        & (new_faces[:, 0] != new_faces[:, 2])
+    )
+    new_faces = new_faces[keep]
+    # Drop duplicates regardless of winding, keeping the first orientation
+    _, first = np.unique(np.sort(new_faces, axis=1), axis=0, return_index=True)
+    new_faces = new_faces[np.sort(first)]
+
+    # Remove clusters no longer referenced by any face
+    used, remap = np.unique(new_faces, return_inverse=True)
+    return merged[used], remap.reshape(-1, 3)
+
+
+def decimate(vertices, faces, face_budget=DEFAULT_FACE_BUDGET):
+    """
+    Reduce a mesh to at most `face_budget` faces and quantise it for display.
+
+    Returns float32 vertices and int32 faces. Meshes already within budget
+    are only quantised; if no clustering pass fits, an even sample of the
+    last pass's faces is kept.
+    """
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces)
+    if len(faces) > face_budget:
+        # Surface cells grow with resolution², so rescale by the square root
+        # of the overshoot until the result lands between half and all of
+        # the budget; keep the largest result that fits
+        resolution = max(int(np.sqrt(face_budget / 2.0)), 4)
+        best = None
+        for _ in range(DECIMATE_MAX_PASSES):
+            new_vertices, new_faces = cluster_vertices(vertices, faces, resolution)
+            if len(new_faces) <= face_budget:
+                if best is None or len(new_faces) > len(best[1]):
+                    best = (new_vertices, new_faces)
+                if len(new_faces) >= face_budget // 2:
+                    break
+            elif resolution <= 4:
+                break
+            scale = np.sqrt(face_budget / max(len(new_faces), 1)) * 0.95
+            resolution = max(int(resolution * scale), 4)
+        if best is None:
+            # Detail packed into too few cells to cluster away
+            step = -(-len(new_faces) // face_budget)
+            used, remap = np.unique(new_faces[::step], return_inverse=True)
+            best = (new_vertices[used], remap.reshape(-1, 3))
+        vertices, faces = best
+    return (
+        np.ascontiguousarray(vertices, dtype=np.float32),
+        np.ascontiguousarray(faces, dtype=np.int32)
+    )
+
+
+_preview_cache = OrderedDict()
+_preview_cache_lock = threading.Lock()
+
+
+def mesh_key(mesh):
+    """Content hash of a mesh's geometry, for callers without an upload hash"""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(mesh.vertices).tobytes())
+    digest.update(np.ascontiguousarray(mesh.faces).tobytes())
+    return digest.hexdigest()
+
+
+def build_preview(mesh, face_budget=DEFAULT_FACE_BUDGET, key=None):
+    """
+    Return a cached `PreviewMesh` for `mesh` at the given face budget.
+
+    `key` identifies the mesh (e.g. the parse cache key of the upload); if
+    omitted, the geometry is hashed. Volume and cost calculations should keep
+    using the full-resolution mesh.
+    """
+    if key is None:
+        key = mesh_key(mesh)
+    cache_key = (key, face_budget)
+    with _preview_cache_lock:
+        preview = _preview_cache.get(cache_key)
+        if preview is not None:
+            _preview_cache.move_to_end(cache_key)
+            return preview
+
+    vertices, faces = decimate(mesh.vertices, mesh.faces, face_budget)
+    preview = PreviewMesh(vertices, faces, len(mesh.faces))
+    with _preview_cache_lock:
+        _preview_cache[cache_key] = preview
+        while len(_preview_cache) > PREVIEW_CACHE_SIZE:
+            _preview_cache.popitem(last=False)
+    return preview
+
+
+def normalise_preview_vertices(vertices, size=10.0):
+    """Scale vertices so the largest dimension is `size` and centre them on the origin"""
+    vertices = np.asarray(vertices, dtype=np.float32)
+    lower = vertices.min(axis=0)
+    upper = vertices.max(axis=0)
+    max_dim = float((upper - lower).max())
+    scale = size / max_dim if max_dim > 0 else 1.0
+    center = (upper + lower) / 2 * scale
+    return vertices * np.float32(scale) - center.astype(np.float32)
+
+
+def build_preview_figure(preview):
+    """
+    Build the interactive Plotly figure for a `PreviewMesh`.
+
+    Vertices and faces stay float32/int32 so Plotly ships them as compact
+    typed arrays instead of float64 JSON lists.
+    """
+    import plotly.graph_objects as go
+
+    x, y, z = normalise_preview_vertices(preview.vertices).T
+    i, j, k = preview.faces.T
+
+    fig = go.Figure(data=[
+        go.Mesh3d(
+            x=x, y=y, z=z,
+            i=i, j=j, k=k,
+            color='#00E5FF',  # Cyan color
+            opacity=1.0,      # Full opacity
+            lighting=dict(
+                ambient=0.6,
+                diffuse=0.8,
+                specular=0.2,
+                roughness=0.5
+            ),
+            lightposition=dict(
+                x=100,
+                y=200,
+                z=150
+            )
+        )
+    ])
+
+    # Update layout with better camera positioning
+    fig.update_layout(
+        scene=dict(
+            aspectmode='data',
+            camera=dict(
+                up=dict(x=0, y=1, z=0),  # Set up vector
+                center=dict(x=0, y=0, z=0),  # Look at center
+                eye=dict(x=1.5, y=1.5, z=1.5)  # Camera position
+            ),
+            xaxis=dict(range=[-5, 5]),
+            yaxis=dict(range=[-5, 5]),
+            zaxis=dict(range=[-5, 5])
+        ),
+        margin=dict(l=0, r=0, b=0, t=0)
+    )
+    return fig
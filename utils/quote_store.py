@@ -0,0 +1,376 @@
+"""
+Persistent quote store on SQLite.
+
+Geometry and prices are kept apart: `geometry` has one row per distinct
+upload (keyed by its content hash, as in the parse cache) with the facts
+that only depend on the file - type, volume and bounding box - and
+`quotes` has one row per quote with its print time and support volume
+(which depend on the slicing and support settings), price inputs
+(material, printer, rates) and the resulting costs. Quotes are indexed by customer, material,
+printer and date.
+
+Inputs that matched the catalog when a quote was saved stay linked to it.
+reprice() compares the linked inputs against the current catalog, fetches
+only the quotes whose material or printer changed, prices them in one
+calc_costs pass and writes back the inputs and cost columns; geometry is
+never touched or re-parsed.
+
+    python -m utils.quote_store list --customer ACME
+    python -m utils.quote_store reprice          # after editing material_db/*.json
+"""
+import os
+import time
+import sqlite3
+import argparse
+import threading
+
+import numpy as np
+
+from utils.catalog import get_catalog
+from utils.cost_calculator import calc_costs
+
+DEFAULT_DB = 'quotes.db'
+PRINTER_COLUMNS = {
+    'printer_cost': 'cost',
+    'upgrades': 'upgrades',
+    'maintenance': 'maintenance',
+    'lifetime_hours': 'lifetime_hours',
+    'power_watts': 'avg_power_watts'
+}
+COST_COLUMNS = ('material_cost', 'energy_cost', 'depreciation_cost', 'total_cost')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geometry (
+    mesh_hash TEXT PRIMARY KEY,
+    file_type TEXT NOT NULL,
+    volume_cm3 REAL NOT NULL,
+    bbox_x REAL,
+    bbox_y REAL,
+    bbox_z REAL
+);
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    customer TEXT,
+    name TEXT,
+    mesh_hash TEXT NOT NULL REFERENCES geometry (mesh_hash),
+    print_time_hr REAL NOT NULL,
+    slicer_time INTEGER NOT NULL,
+    support_volume_cm3 REAL NOT NULL,
+    support_material TEXT,
+    support_density REAL NOT NULL,
+    support_cost_per_kg REAL NOT NULL,
+    material TEXT NOT NULL,
+    density REAL NOT NULL,
+    cost_per_kg REAL NOT NULL,
+    material_linked INTEGER NOT NULL,
+    make TEXT NOT NULL,
+    model TEXT NOT NULL,
+    printer_cost REAL NOT NULL,
+    upgrades REAL NOT NULL,
+    maintenance REAL NOT NULL,
+    lifetime_hours REAL NOT NULL,
+    power_watts REAL NOT NULL,
+    printer_linked INTEGER NOT NULL,
+    electricity_rate REAL NOT NULL,
+    markup_percent REAL NOT NULL,
+    material_cost REAL NOT NULL,
+    energy_cost REAL NOT NULL,
+    depreciation_cost REAL NOT NULL,
+    total_cost REAL NOT NULL,
+    priced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quotes_customer ON quotes (customer, created_at);
+CREATE INDEX IF NOT EXISTS quotes_material ON quotes (material, material_linked);
+CREATE INDEX IF NOT EXISTS quotes_support ON quotes (support_material);
+CREATE INDEX IF NOT EXISTS quotes_printer ON quotes (make, model, printer_linked);
+CREATE INDEX IF NOT EXISTS quotes_created ON quotes (created_at);
+CREATE INDEX IF NOT EXISTS quotes_mesh ON quotes (mesh_hash);
+"""
+
+# Quote rows with their geometry
+SELECT_QUOTES = """
+SELECT q.*, g.file_type, g.volume_cm3, g.bbox_x, g.bbox_y, g.bbox_z
+FROM quotes q JOIN geometry g ON g.mesh_hash = q.mesh_hash
+"""
+
+
+def _price(rows):
+    """calc_costs over quote rows (dicts with geometry and price inputs) -> dict of cost arrays"""
+    column = lambda name: np.array([row[name] for row in rows], dtype=np.float64)
+    supports = calc_costs(
+        volume_cm3=column('support_volume_cm3'),
+        density=column('support_density'),
+        cost_per_kg=column('support_cost_per_kg'),
+        print_time_hr=0.0,
+        power_watt=0.0,
+        electricity_rate=0.0
+    )
+    costs = calc_costs(
+        volume_cm3=column('volume_cm3'),
+        support_cost=supports['material_cost'],
+        print_time_hr=column('print_time_hr'),
+        density=column('density'),
+        cost_per_kg=column('cost_per_kg'),
+        power_watt=column('power_watts'),
+        electricity_rate=column('electricity_rate'),
+        markup_percent=column('markup_percent'),
+        printer_cost=column('printer_cost'),
+        upgrades=column('upgrades'),
+        maintenance=column('maintenance'),
+        lifetime_hours=column('lifetime_hours')
+    )
+    return {
+        'material_cost': costs['material_cost'],
+        'energy_cost': costs['energy_cost'],
+        'depreciation_cost': np.round(costs['depreciation_cost'], 4),
+        'total_cost': np.round(costs['total_with_depreciation'], 4)
+    }
+
+
+class QuoteStore:
+    """
+    Quotes in one SQLite file (or ':memory:'). Safe to share between
+    threads; each call runs in its own transaction.
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            if path != ':memory:':
+                self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_quotes(self, quotes, catalog=None):
+        """
+        Save quotes; returns their ids. Each quote is a dict with
+        "mesh_hash", "file_type", "volume_cm3", "bbox" ({x, y, z}),
+        "print_time_hr", "settings" (as from utils.batch_quote.make_settings)
+        and optionally "customer", "name", "created_at" (Unix time),
+        "slicer_time" (True when print_time_hr came from a slicer rather
+        than an estimate), "support_volume_cm3" and "support_material"
+        (a catalog material; by default the quote's own). Costs are
+        computed here.
+        """
+        catalog = catalog or get_catalog()
+        now = time.time()
+        rows = []
+        for quote in quotes:
+            settings = quote['settings']
+            printer = settings['printer']
+            make, model = settings.get('make'), settings.get('model')
+            if make is None or model is None:
+                raise ValueError("Quote settings need the printer's make and model")
+            catalog_material = catalog.materials.get(settings['material'], {})
+            catalog_printer = catalog.printers.get(make, {}).get(model, {})
+            bbox = quote.get('bbox') or {}
+            # Supports in the quote's material follow its (possibly custom) price
+            support_material = quote.get('support_material')
+            if support_material == settings['material']:
+                support_material = None
+            support_props = settings if support_material is None else catalog.materials[support_material]
+            rows.append({
+                'mesh_hash': quote['mesh_hash'],
+                'file_type': quote['file_type'],
+                'volume_cm3': float(quote['volume_cm3']),
+                'bbox_x': bbox.get('x'),
+                'bbox_y': bbox.get('y'),
+                'bbox_z': bbox.get('z'),
+                'created_at': float(quote.get('created_at', now)),
+                'customer': quote.get('customer'),
+                'name': quote.get('name'),
+                'print_time_hr': float(quote['print_time_hr']),
+                'slicer_time': int(bool(quote.get('slicer_time'))),
+                'support_volume_cm3': float(quote.get('support_volume_cm3') or 0.0),
+                'support_material': support_material,
+                'support_density': float(support_props['density']),
+                'support_cost_per_kg': float(support_props['cost_per_kg']),
+                'material': settings['material'],
+                'density': float(settings['density']),
+                'cost_per_kg': float(settings['cost_per_kg']),
+                'material_linked': int(
+                    catalog_material.get('density') == settings['density']
+                    and catalog_material.get('cost_per_kg') == settings['cost_per_kg']
+                ),
+                'make': make,
+                'model': model,
+                **{column: float(printer[field]) for column, field in PRINTER_COLUMNS.items()},
+                'printer_linked': int(all(
+                    catalog_printer.get(field) == printer[field] for field in PRINTER_COLUMNS.values()
+                )),
+                'electricity_rate': float(settings['electricity_rate']),
+                'markup_percent': float(settings['markup_percent']),
+                'priced_at': now
+            })
+        if not rows:
+            return []
+        for row, costs in zip(rows, zip(*_price(rows).values())):
+            row.update(zip(COST_COLUMNS, map(float, costs)))
+
+        with self._lock, self._db:
+            # The first quote of a file records its geometry; later ones reuse it
+            self._db.executemany(
+                "INSERT OR IGNORE INTO geometry VALUES "
+                "(:mesh_hash, :file_type, :volume_cm3, :bbox_x, :bbox_y, :bbox_z)",
+                rows
+            )
+            ids = []
+            for row in rows:
+                cursor = self._db.execute(
+                    "INSERT INTO quotes (created_at, customer, name, mesh_hash, print_time_hr, slicer_time, "
+                    "support_volume_cm3, support_material, support_density, support_cost_per_kg, material, density, "
+                    "cost_per_kg, material_linked, make, model, printer_cost, upgrades, maintenance, lifetime_hours, "
+                    "power_watts, printer_linked, electricity_rate, markup_percent, material_cost, energy_cost, "
+                    "depreciation_cost, total_cost, priced_at) VALUES (:created_at, :customer, :name, :mesh_hash, "
+                    ":print_time_hr, :slicer_time, :support_volume_cm3, :support_material, :support_density, "
+                    ":support_cost_per_kg, :material, :density, :cost_per_kg, :material_linked, :make, :model, "
+                    ":printer_cost, :upgrades, :maintenance, :lifetime_hours, :power_watts, :printer_linked, "
+                    ":electricity_rate, :markup_percent, :material_cost, :energy_cost, :depreciation_cost, "
+                    ":total_cost, :priced_at)",
+                    row
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def add_quote(self, mesh_hash, file_type, volume_cm3, bbox, print_time_hr, settings, **extra):
+        """Save one quote (see add_quotes); returns its id"""
+        return self.add_quotes([{
+            'mesh_hash': mesh_hash, 'file_type': file_type, 'volume_cm3': volume_cm3,
+            'bbox': bbox, 'print_time_hr': print_time_hr, 'settings': settings, **extra
+        }])[0]
+
+    def find(self, customer=None, material=None, make=None, model=None, since=None, until=None, limit=None):
+        """Quotes (as dicts, newest first) matching every filter given; dates are Unix times"""
+        filters, values = [], []
+        for column, value in (('customer', customer), ('material', material), ('make', make), ('model', model)):
+            if value is not None:
+                filters.append(f"q.{column} = ?")
+                values.append(value)
+        if since is not None:
+            filters.append("q.created_at >= ?")
+            values.append(since)
+        if until is not None:
+            filters.append("q.created_at < ?")
+            values.append(until)
+        query = SELECT_QUOTES + (" WHERE " + " AND ".join(filters) if filters else "") + " ORDER BY q.created_at DESC"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        with self._lock:
+            return [dict(row) for row in self._db.execute(query, values)]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM quotes").fetchone()[0]
+
+    def reprice(self, catalog=None):
+        """
+        Bring quotes linked to the catalog up to date with it. Only quotes
+        whose material or printer details changed are read and rewritten;
+        returns how many were repriced.
+        """
+        catalog = catalog or get_catalog()
+        stale = {}
+        with self._lock:
+            for name, properties in catalog.materials.items():
+                rows = self._db.execute(
+                    SELECT_QUOTES + " WHERE q.material = ? AND q.material_linked = 1 "
+                    "AND (q.cost_per_kg != ? OR q.density != ?)",
+                    (name, properties['cost_per_kg'], properties['density'])
+                )
+                for row in rows:
+                    quote = stale.setdefault(row['id'], dict(row))
+                    quote.update(cost_per_kg=properties['cost_per_kg'], density=properties['density'])
+                    if quote['support_material'] is None:
+                        quote.update(support_cost_per_kg=properties['cost_per_kg'], support_density=properties['density'])
+                # Supports in another material always come from the catalog
+                rows = self._db.execute(
+                    SELECT_QUOTES + " WHERE q.support_material = ? "
+                    "AND (q.support_cost_per_kg != ? OR q.support_density != ?)",
+                    (name, properties['cost_per_kg'], properties['density'])
+                )
+                for row in rows:
+                    stale.setdefault(row['id'], dict(row)).update(
+                        support_cost_per_kg=properties['cost_per_kg'], support_density=properties['density']
+                    )
+            for make, models in catalog.printers.items():
+                for model, details in models.items():
+                    changed = " OR ".join(f"q.{column} != ?" for column in PRINTER_COLUMNS)
+                    rows = self._db.execute(
+                        SELECT_QUOTES + f" WHERE q.make = ? AND q.model = ? AND q.printer_linked = 1 AND ({changed})",
+                        (make, model, *(details[field] for field in PRINTER_COLUMNS.values()))
+                    )
+                    for row in rows:
+                        stale.setdefault(row['id'], dict(row)).update(
+                            {column: details[field] for column, field in PRINTER_COLUMNS.items()}
+                        )
+            if not stale:
+                return 0
+
+            rows = list(stale.values())
+            for row, costs in zip(rows, zip(*_price(rows).values())):
+                row.update(zip(COST_COLUMNS, map(float, costs)), priced_at=time.time())
+            with self._db:
+                self._db.executemany(
+                    "UPDATE quotes SET density = :density, cost_per_kg = :cost_per_kg, "
+                    "support_density = :support_density, support_cost_per_kg = :support_cost_per_kg, "
+                    "printer_cost = :printer_cost, upgrades = :upgrades, maintenance = :maintenance, "
+                    "lifetime_hours = :lifetime_hours, power_watts = :power_watts, "
+                    "material_cost = :material_cost, energy_cost = :energy_cost, "
+                    "depreciation_cost = :depreciation_cost, total_cost = :total_cost, priced_at = :priced_at "
+                    "WHERE id = :id",
+                    rows
+                )
+        return len(rows)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_quote_store():
+    """Return the process-wide quote store, at QUOTE_DB (default quotes.db)"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = QuoteStore(os.environ.get('QUOTE_DB') or DEFAULT_DB)
+        return _default_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List and reprice saved quotes.")
+    parser.add_argument('--db', default=os.environ.get('QUOTE_DB') or DEFAULT_DB)
+    commands = parser.add_subparsers(dest='command', required=True)
+    listing = commands.add_parser('list', help="Show saved quotes, newest first")
+    for name in ('customer', 'material', 'make', 'model'):
+        listing.add_argument(f'--{name}')
+    listing.add_argument('--limit', type=int, default=50)
+    commands.add_parser('reprice', help="Reprice quotes whose catalog material or printer changed")
+    args = parser.parse_args(argv)
+
+    with QuoteStore(args.db) as store:
+        if args.command == 'reprice':
+            print(f"Repriced {store.reprice()} of {store.count()} quotes")
+            return 0
+        for quote in store.find(args.customer, args.material, args.make, args.model, limit=args.limit):
+            created = time.strftime('%Y-%m-%d %H:%M', time.localtime(quote['created_at']))
+            print(
+                f"{quote['id']:>6}  {created}  {quote['customer'] or '-':<16} {quote['name'] or quote['mesh_hash'][:12]:<24} "
+                f"{quote['material']:<6} {quote['make']} {quote['model']}  {quote['total_cost']:.2f}"
+            )
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,332 @@
+"""
+Assigning quoted jobs to a fleet of printers.
+
+A Schedule holds a queue of jobs per printer. Printers of the same make and
+model (and speed) form a class, and each class keeps a heap of its
+printers keyed by when they next come free, so placing a job only compares
+the front printer of each class: O(classes + log printers) per job.
+
+    makespan  each job goes where it finishes first. Fed longest first
+              (add_jobs sorts them) this is LPT list scheduling, within
+              4/3 of the optimal makespan on identical printers.
+    cost      each job goes to the cheapest class (energy and depreciation
+              for its print time there) whose next free printer still
+              finishes it by the deadline, or where it finishes first when
+              none can.
+
+Plans are updated in place: add_job() queues a new job behind the existing
+ones, and fail_printer() re-places only the jobs the failed printer had
+not finished. Neither reshuffles work already planned on other printers.
+
+    python -m utils.scheduler quotes.csv --printer "Bambu Lab:A1=4" --printer "Prusa Research:Prusa MK4=2"
+"""
+import csv
+import json
+import heapq
+import argparse
+
+import numpy as np
+
+from utils.catalog import get_catalog, BUILD_VOLUME_FIELD
+from utils.cost_calculator import calc_costs
+
+OBJECTIVES = ('makespan', 'cost')
+# £/kWh, as for batch quotes
+DEFAULT_ELECTRICITY_RATE = 0.34
+TIMELINE_FIELDS = ['printer', 'job', 'start_hr', 'end_hr', 'cost']
+
+
+class Job:
+    """A quoted job; size_mm is its (x, y, z) bounding box, if known"""
+
+    __slots__ = ('name', 'print_time_hr', 'size_mm')
+
+    def __init__(self, name, print_time_hr, size_mm=None):
+        if not print_time_hr > 0:
+            raise ValueError(f"Job '{name}' needs a positive print time")
+        self.name = name
+        self.print_time_hr = float(print_time_hr)
+        self.size_mm = None if size_mm is None else tuple(float(size) for size in size_mm)
+
+
+class Printer:
+    """
+    One machine of the fleet. `details` is its catalog entry; `speed`
+    scales quoted print times (2.0 prints twice as fast) and
+    `available_hr` is when it is free to start.
+    """
+
+    __slots__ = ('name', 'make', 'model', 'details', 'speed', 'available_hr')
+
+    def __init__(self, name, make, model, details, speed=1.0, available_hr=0.0):
+        if not speed > 0:
+            raise ValueError(f"Printer '{name}' needs a positive speed")
+        self.name = name
+        self.make = make
+        self.model = model
+        self.details = details
+        self.speed = float(speed)
+        self.available_hr = float(available_hr)
+
+
+def build_fleet(inventory, catalog=None):
+    """
+    Printers from (make, model, count) or (make, model, count, speed)
+    entries, named "<make> <model> #<n>". Raises ValueError for printers
+    missing from the catalog.
+    """
+    catalog = catalog or get_catalog()
+    fleet = []
+    for make, model, count, *speed in inventory:
+        details = catalog.printer(make, model)
+        fleet.extend(
+            Printer(f"{make} {model} #{number}", make, model, details, *speed)
+            for number in range(1, int(count) + 1)
+        )
+    return fleet
+
+
+def jobs_from_quotes(rows):
+    """Jobs from batch quote result rows (CSV strings or JSON values); failed rows are skipped"""
+    jobs = []
+    for row in rows:
+        if row.get('status', 'ok') != 'ok' or row.get('print_time_hr') in (None, ''):
+            continue
+        size = [row.get(f'bbox_{axis}') for axis in 'xyz']
+        size = None if any(value in (None, '') for value in size) else [float(value) for value in size]
+        jobs.append(Job(row['path'], float(row['print_time_hr']), size))
+    return jobs
+
+
+def _fits(size_mm, build_volume):
+    """Whether a bounding box fits a build volume, allowing a quarter turn on the bed"""
+    if size_mm is None or build_volume is None:
+        return True
+    x, y, z = size_mm
+    bx, by, bz = build_volume
+    return z <= bz and ((x <= bx and y <= by) or (y <= bx and x <= by))
+
+
+class Schedule:
+    """
+    Jobs assigned to printers, kept up to date as jobs arrive and printers
+    fail. See the module docstring for the objectives.
+    """
+
+    def __init__(self, printers, objective='makespan', electricity_rate=DEFAULT_ELECTRICITY_RATE, deadline_hr=None):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}'. Use one of: {', '.join(OBJECTIVES)}")
+        self.objective = objective
+        self.electricity_rate = electricity_rate
+        self.deadline_hr = deadline_hr
+        self.printers = {}
+        # printer name -> [(start, end, job, cost)] in start order
+        self.queues = {}
+        # job name -> printer name
+        self.assignment = {}
+        self.total_cost = 0.0
+        self._failed = set()
+        self._classes = []
+        classes = {}
+        for printer in printers:
+            if printer.name in self.printers:
+                raise ValueError(f"Printer names must be unique; '{printer.name}' is listed twice")
+            self.printers[printer.name] = printer
+            self.queues[printer.name] = []
+            key = (printer.make, printer.model, printer.speed, id(printer.details))
+            if key not in classes:
+                classes[key] = len(self._classes)
+                self._classes.append({'details': printer.details, 'speed': printer.speed, 'heap': []})
+            index = classes[key]
+            heapq.heappush(self._classes[index]['heap'], (printer.available_hr, printer.name))
+        if not self._classes:
+            raise ValueError("The fleet has no printers")
+
+        details = [group['details'] for group in self._classes]
+        self._speeds = np.array([group['speed'] for group in self._classes])
+        self._power = np.array([printer['avg_power_watts'] for printer in details], dtype=np.float64)
+        self._ownership = {
+            name: np.array([printer[name] for printer in details], dtype=np.float64)
+            for name in ('cost', 'upgrades', 'maintenance', 'lifetime_hours')
+        }
+        self._build = [printer.get(BUILD_VOLUME_FIELD) for printer in details]
+
+    def _options(self, jobs):
+        """
+        Print hours, energy plus depreciation cost, and whether the job fits
+        the build volume, for each job on each class: three (jobs, classes) arrays
+        """
+        hours = np.array([job.print_time_hr for job in jobs])[:, None] / self._speeds[None, :]
+        costs = calc_costs(
+            volume_cm3=0.0, density=0.0, cost_per_kg=0.0,
+            print_time_hr=hours,
+            power_watt=self._power,
+            electricity_rate=self.electricity_rate,
+            printer_cost=self._ownership['cost'],
+            upgrades=self._ownership['upgrades'],
+            maintenance=self._ownership['maintenance'],
+            lifetime_hours=self._ownership['lifetime_hours']
+        )
+        fits = np.array([[_fits(job.size_mm, build) for build in self._build] for job in jobs], dtype=bool)
+        return hours, costs['energy_cost'] + costs['depreciation_cost'], fits
+
+    def _front(self, index):
+        """Next free (time, printer) of a class, dropping failed printers"""
+        heap = self._classes[index]['heap']
+        while heap and heap[0][1] in self._failed:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _place(self, job, hours, costs, fits, at_hr):
+        best = None
+        for index in range(len(self._classes)):
+            front = self._front(index)
+            if front is None or not fits[index]:
+                continue
+            start = max(front[0], at_hr)
+            option = (start + hours[index], costs[index], index, start)
+            if self.objective == 'makespan':
+                rank = option[:2]
+            else:
+                late = self.deadline_hr is not None and option[0] > self.deadline_hr
+                rank = (late, option[0]) if late else (late, option[1], option[0])
+            if best is None or rank < best[0]:
+                best = (rank, option)
+        if best is None:
+            raise ValueError(f"No working printer in the fleet can print '{job.name}'")
+        end, cost, index, start = best[1]
+        _, name = heapq.heappop(self._classes[index]['heap'])
+        heapq.heappush(self._classes[index]['heap'], (end, name))
+        self.queues[name].append((start, end, job, float(cost)))
+        self.assignment[job.name] = name
+        self.total_cost += float(cost)
+        return name
+
+    def add_jobs(self, jobs, at_hr=0.0):
+        """Queue jobs, longest first, starting no earlier than `at_hr`"""
+        jobs = sorted(jobs, key=lambda job: job.print_time_hr, reverse=True)
+        names = [job.name for job in jobs]
+        if len(set(names)) != len(names) or any(name in self.assignment for name in names):
+            raise ValueError("Job names must be unique within a schedule")
+        if not jobs:
+            return
+        hours, costs, fits = self._options(jobs)
+        # Check every job before placing any, so a bad batch leaves the plan as it was
+        too_big = [job.name for job, fit in zip(jobs, fits) if not fit.any()]
+        if too_big:
+            raise ValueError(f"Too big for every printer in the fleet: {', '.join(too_big)}")
+        for row, job in enumerate(jobs):
+            self._place(job, hours[row], costs[row], fits[row], at_hr)
+
+    def add_job(self, job, at_hr=0.0):
+        """Queue one more job without moving any other; returns its printer's name"""
+        if job.name in self.assignment:
+            raise ValueError(f"Job '{job.name}' is already scheduled")
+        hours, costs, fits = self._options([job])
+        return self._place(job, hours[0], costs[0], fits[0], at_hr)
+
+    def fail_printer(self, name, at_hr):
+        """
+        Take a printer out of service at `at_hr`. The job it was printing
+        (restarted from scratch) and everything queued behind it are
+        re-placed on the remaining printers; returns the re-placed jobs'
+        names. Jobs no remaining printer can print are left unassigned and
+        raise ValueError once the rest are placed.
+        """
+        if name not in self.printers:
+            raise ValueError(f"Unknown printer '{name}'")
+        self._failed.add(name)
+        queue = self.queues[name]
+        keep = [entry for entry in queue if entry[1] <= at_hr]
+        displaced = [entry[2] for entry in queue[len(keep):]]
+        self.queues[name] = keep
+        for _, _, job, cost in queue[len(keep):]:
+            del self.assignment[job.name]
+            self.total_cost -= cost
+
+        unplaced = []
+        displaced.sort(key=lambda job: job.print_time_hr, reverse=True)
+        if displaced:
+            hours, costs, fits = self._options(displaced)
+            for row, job in enumerate(displaced):
+                try:
+                    self._place(job, hours[row], costs[row], fits[row], at_hr)
+                except ValueError:
+                    unplaced.append(job.name)
+        if unplaced:
+            raise ValueError(f"No working printer can print: {', '.join(unplaced)}")
+        return [job.name for job in displaced]
+
+    @property
+    def makespan(self):
+        return max((queue[-1][1] for queue in self.queues.values() if queue), default=0.0)
+
+    def timeline(self):
+        """One row per job (see TIMELINE_FIELDS), by printer and start time"""
+        return [
+            {'printer': name, 'job': job.name, 'start_hr': start, 'end_hr': end, 'cost': cost}
+            for name, queue in self.queues.items()
+            for start, end, job, cost in queue
+        ]
+
+
+def schedule_jobs(jobs, printers, objective='makespan', electricity_rate=DEFAULT_ELECTRICITY_RATE, deadline_hr=None):
+    """Plan a batch of jobs on a fleet in one go; returns the Schedule"""
+    schedule = Schedule(printers, objective, electricity_rate, deadline_hr)
+    schedule.add_jobs(jobs)
+    return schedule
+
+
+def _read_quotes(path):
+    with open(path, newline='') as f:
+        if path.lower().endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        return list(csv.DictReader(f))
+
+
+def _parse_printer(text):
+    """"Make:Model=count" or "Make:Model=count@speed" """
+    try:
+        machine, _, count = text.rpartition('=')
+        make, model = machine.split(':', 1)
+        count, _, speed = count.partition('@')
+        return (make.strip(), model.strip(), int(count)) + ((float(speed),) if speed else ())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected Make:Model=count[@speed], got '{text}'")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assign batch-quoted jobs to a printer fleet.")
+    parser.add_argument('quotes', help="Batch quote output (.csv or .jsonl)")
+    parser.add_argument('--printer', type=_parse_printer, action='append', required=True,
+                        help="Make:Model=count[@speed] from material_db/printers.json; repeat for each model")
+    parser.add_argument('--objective', choices=OBJECTIVES, default='makespan')
+    parser.add_argument('--deadline', type=float, default=None, help="Hours; cost mode only uses printers that finish by then")
+    parser.add_argument('--electricity-rate', type=float, default=DEFAULT_ELECTRICITY_RATE, help="£/kWh")
+    parser.add_argument('-o', '--output', default=None, help="Write the timeline to this CSV")
+    args = parser.parse_args(argv)
+
+    try:
+        schedule = schedule_jobs(
+            jobs_from_quotes(_read_quotes(args.quotes)), build_fleet(args.printer),
+            args.objective, args.electricity_rate, args.deadline
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=TIMELINE_FIELDS)
+            writer.writeheader()
+            writer.writerows(schedule.timeline())
+    for name, queue in schedule.queues.items():
+        busy = sum(end - start for start, end, _, _ in queue)
+        print(f"{name}: {len(queue)} jobs, {busy:.1f}h")
+    print(
+        f"{len(schedule.assignment)} jobs on {len(schedule.printers)} printers: "
+        f"done after {schedule.makespan:.1f}h, £{schedule.total_cost:.2f} energy and depreciation"
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,381 @@
+"""
+Headless quoting service.
+
+An ASGI app exposing the parser and cost functions over HTTP, for order
+systems and anything else that can't drive the Streamlit UI:
+
+    uvicorn utils.service:app --port 8000      # or: python -m utils.service
+
+    POST /quote    multipart upload + optional form fields -> volume, time and costs
+    POST /measure  multipart upload -> volume, bounding box and print time
+    POST /costs    JSON volume_cm3 and print_time_hr (numbers or lists) -> costs
+    GET  /catalog  printers and materials
+    GET  /health   pool and queue state
+    GET  /metrics  per-stage timings in Prometheus format (with --metrics)
+
+Parsing runs in a bounded process pool while the event loop only hashes
+uploads and prices results. Concurrent requests for the same file and
+settings share one computation, and once `max_queue` distinct files are
+waiting or running, new ones are refused with 503 and Retry-After. State is
+per process, so run a single server process and scale with --workers.
+"""
+import os
+import asyncio
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from utils.batch_quote import SUPPORTED_EXTENSIONS, make_settings, measure_file, price_job
+from utils.catalog import get_catalog
+from utils.cost_calculator import calc_costs
+from utils import metrics
+
+MAX_UPLOAD_BYTES = int(os.environ.get('QUOTE_MAX_UPLOAD_MB', 200)) * 1024 * 1024
+# Measurements kept for repeat quotes of the same file (a few hundred bytes each)
+RESULT_CACHE_ENTRIES = 1024
+RETRY_AFTER_SECONDS = 5
+# Form/JSON field -> make_settings argument
+NUMBER_FIELDS = {
+    'cost_per_kg': 'cost_per_kg',
+    'electricity_rate': 'electricity_rate',
+    'markup_percent': 'markup_percent',
+    'filament_diameter': 'filament_diameter',
+    'printer_cost': 'cost',
+    'upgrades': 'upgrades',
+    'maintenance': 'maintenance',
+    'lifetime_hours': 'lifetime_hours',
+    'power_watts': 'avg_power_watts'
+}
+
+
+class ServiceBusy(Exception):
+    """Raised when the queue of distinct computations is full"""
+
+
+def _measure(data, file_type, options):
+    """
+    Worker entry point: returns ({volume_cm3, bbox, print_time_hr}, span
+    records). Records are only sent back from worker processes; in-process
+    workers record straight into this process's metrics.
+    """
+    if not options.get('metrics'):
+        volume_cm3, bbox, print_time_hr = measure_file(data, file_type, options)
+        return {'volume_cm3': volume_cm3, 'bbox': bbox, 'print_time_hr': print_time_hr}, None
+    with metrics.collect() as trace, metrics.span('service.measure_file', file_type=file_type):
+        volume_cm3, bbox, print_time_hr = measure_file(data, file_type, options)
+    remote = multiprocessing.parent_process() is not None
+    return {'volume_cm3': volume_cm3, 'bbox': bbox, 'print_time_hr': print_time_hr}, trace if remote else None
+
+
+class QuoteService:
+    """
+    Runs measurements on a worker pool with coalescing and a queue limit.
+
+    Results are keyed by the upload's SHA-256, its type and the settings
+    that change the measurement, so identical uploads share one computation
+    and later repeats are answered from a small in-memory cache. Pass an
+    `executor` (e.g. a ThreadPoolExecutor in tests) to use it instead of an
+    owned process pool.
+    """
+
+    def __init__(self, workers=None, max_queue=None, timeout=300, executor=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue or 4 * self.workers
+        self.timeout = timeout
+        self.stats = {'computed': 0, 'coalesced': 0, 'cached': 0, 'rejected': 0}
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._in_flight = {}
+        self._results = OrderedDict()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # Not fork: the event loop process has threads (uvicorn, to_thread)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def close(self):
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def queued(self):
+        return len(self._in_flight)
+
+    async def measure(self, data, file_type, settings, digest=None):
+        """
+        Volume, bbox and print time for uploaded bytes. `digest` is the
+        SHA-256 hex of `data` if the caller already has it. Raises ServiceBusy
+        when the queue is full, asyncio.TimeoutError past `timeout` and
+        ValueError for files that can't be parsed.
+        """
+        options = {
+            'density': settings['density'],
+            'slice': settings['slice'],
+            'filament_diameter': settings['filament_diameter'],
+            'metrics': metrics.enabled()
+        }
+        if digest is None:
+            digest = await asyncio.to_thread(file_digest, data)
+        # Density only matters for sliced 3MF projects (weight -> volume)
+        key = (digest, file_type, options['slice'], options['filament_diameter'],
+               options['density'] if file_type == '3mf' else None)
+
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+            self.stats['cached'] += 1
+            return result
+
+        future = self._in_flight.get(key)
+        if future is None:
+            if len(self._in_flight) >= self.max_queue:
+                self.stats['rejected'] += 1
+                raise ServiceBusy(f"{len(self._in_flight)} files already queued")
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, _measure, data, file_type, options)
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+            self.stats['computed'] += 1
+        else:
+            self.stats['coalesced'] += 1
+        # Shielded so one caller timing out or disconnecting doesn't cancel the others
+        result, _ = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        return result
+
+    def _finished(self, key, future):
+        self._in_flight.pop(key, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            result, trace = future.result()
+            if trace:
+                metrics.merge(trace)
+            self._results[key] = result
+            if len(self._results) > RESULT_CACHE_ENTRIES:
+                self._results.popitem(last=False)
+        elif isinstance(error, BrokenProcessPool) and self._owns_executor:
+            # A worker died (e.g. out of memory); the next request gets a fresh pool
+            self.close()
+
+
+def file_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _error(status, message, headers=None):
+    return JSONResponse({'error': message}, status_code=status, headers=headers)
+
+
+def _number(fields, name):
+    """Optional numeric field as a float, None when absent or blank"""
+    value = fields.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a number")
+
+
+def _settings_from(fields):
+    """make_settings() from form or JSON fields; raises ValueError for bad values"""
+    arguments = {}
+    for name in ('material', 'make', 'model'):
+        if fields.get(name):
+            arguments[name] = str(fields[name])
+    for name, argument in NUMBER_FIELDS.items():
+        value = _number(fields, name)
+        if value is not None:
+            arguments[argument] = value
+    arguments['slice'] = str(fields.get('slice', '')).lower() in ('1', 'true', 'yes', 'on')
+    return make_settings(**arguments)
+
+
+async def _read_upload(request):
+    """(bytes, file type, form fields) of a multipart request with one 'file' part"""
+    length = request.headers.get('content-length')
+    if length and length.isdigit() and int(length) > MAX_UPLOAD_BYTES:
+        raise OverflowError()
+    form = await request.form(max_files=1)
+    upload = form.get('file')
+    if upload is None or not hasattr(upload, 'read'):
+        raise ValueError("Send the model as a multipart 'file' field")
+    data = await upload.read()
+    await form.close()
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise OverflowError()
+    file_type = (form.get('file_type') or (upload.filename or '').rsplit('.', 1)[-1]).lower()
+    if file_type not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported file type '{file_type}'. Use one of: {', '.join(SUPPORTED_EXTENSIONS)}")
+    return data, file_type, form
+
+
+async def _measure_request(request):
+    """Shared by /measure and /quote: returns (response body, settings) or an error response"""
+    service = request.app.state.service
+    try:
+        with metrics.span('service.read_upload'):
+            data, file_type, fields = await _read_upload(request)
+        settings = _settings_from(fields)
+        print_time_hr = _number(fields, 'print_time_hr')
+    except OverflowError:
+        return _error(413, f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"), None
+    except ValueError as e:
+        return _error(400, str(e)), None
+
+    digest = await asyncio.to_thread(file_digest, data)
+    try:
+        with metrics.span('service.measure', file_type=file_type):
+            measured = await service.measure(data, file_type, settings, digest)
+    except ServiceBusy as e:
+        return _error(503, f"Busy: {e}", headers={'Retry-After': str(RETRY_AFTER_SECONDS)}), None
+    except asyncio.TimeoutError:
+        return _error(504, f"Timed out after {service.timeout}s"), None
+    except BrokenProcessPool:
+        return _error(500, "Worker process crashed"), None
+    except Exception as e:
+        return _error(422, str(e)), None
+
+    body = {'file_hash': digest, 'file_type': file_type, **measured}
+    if print_time_hr is not None:
+        # The caller's own slicer time wins over the estimate
+        body['print_time_hr'] = print_time_hr
+    return body, settings
+
+
+async def measure(request):
+    body, settings = await _measure_request(request)
+    return body if settings is None else JSONResponse(body)
+
+
+async def quote(request):
+    body, settings = await _measure_request(request)
+    if settings is None:
+        return body
+    printer = settings['printer']
+    with metrics.span('service.price'):
+        body.update({
+            'material': settings['material'],
+            'cost_per_kg': settings['cost_per_kg'],
+            'power_watts': printer['avg_power_watts'],
+            **price_job(body['volume_cm3'], body['print_time_hr'], settings)
+        })
+    return JSONResponse(body)
+
+
+async def costs(request):
+    """Price volumes and times without a file; lists are priced element-wise"""
+    try:
+        fields = await request.json()
+        if not isinstance(fields, dict):
+            raise ValueError("Send a JSON object")
+        settings = _settings_from(fields)
+        printer = settings['printer']
+        with metrics.span('service.costs'):
+            result = calc_costs(
+                volume_cm3=fields.get('volume_cm3'),
+                print_time_hr=fields.get('print_time_hr'),
+                density=settings['density'],
+                cost_per_kg=settings['cost_per_kg'],
+                power_watt=printer['avg_power_watts'],
+                electricity_rate=settings['electricity_rate'],
+                markup_percent=settings['markup_percent'],
+                printer_cost=printer['cost'],
+                upgrades=printer['upgrades'],
+                maintenance=printer['maintenance'],
+                lifetime_hours=printer['lifetime_hours']
+            )
+    except (ValueError, TypeError) as e:
+        return _error(400, str(e))
+    return JSONResponse({name: values.tolist() for name, values in result.items()})
+
+
+async def catalog(request):
+    current = get_catalog()
+    return JSONResponse({'printers': current.printers, 'materials': current.materials})
+
+
+async def metrics_text(request):
+    return PlainTextResponse(metrics.prometheus_text(), media_type='text/plain; version=0.0.4')
+
+
+async def health(request):
+    service = request.app.state.service
+    return JSONResponse({
+        'status': 'ok',
+        'workers': service.workers,
+        'queued': service.queued,
+        'max_queue': service.max_queue,
+        **service.stats
+    })
+
+
+def create_app(service=None):
+    """Build the ASGI app around `service` (a default QuoteService if None)"""
+    service = service or QuoteService()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        service.close()
+
+    app = Starlette(
+        routes=[
+            Route('/quote', quote, methods=['POST']),
+            Route('/measure', measure, methods=['POST']),
+            Route('/costs', costs, methods=['POST']),
+            Route('/catalog', catalog),
+            Route('/health', health),
+            Route('/metrics', metrics_text)
+        ],
+        lifespan=lifespan
+    )
+    app.state.service = service
+    return app
+
+
+app = create_app(QuoteService(
+    workers=int(os.environ.get('QUOTE_WORKERS', 0)) or None,
+    max_queue=int(os.environ.get('QUOTE_MAX_QUEUE', 0)) or None
+))
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the quoting API over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument('--max-queue', type=int, default=None, help="Distinct files queued before 503 (default: 4 per worker)")
+    parser.add_argument('--timeout', type=float, default=300, help="Seconds to wait for one file")
+    parser.add_argument('--metrics', action='store_true', help="Record per-stage timings for /metrics")
+    parser.add_argument('--log-spans', action='store_true', help="Also log each stage as a JSON line on stderr")
+    args = parser.parse_args(argv)
+    if args.metrics or args.log_spans:
+        metrics.configure(enabled=True)
+    if args.log_spans:
+        logging.basicConfig(format='%(message)s')
+        metrics.logger.setLevel(logging.INFO)
+    service = QuoteService(workers=args.workers, max_queue=args.max_queue, timeout=args.timeout)
+    uvicorn.run(create_app(service), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
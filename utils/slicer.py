@@ -0,0 +1,296 @@
+"""
+Layer slicing for print-time estimation.
+
+The mesh is cut at every layer height without building polygons: each
+face/plane crossing becomes one oriented segment, computed in NumPy for a
+whole batch of layers at once. Per-layer perimeter length and cross-section
+area fall out as bincounts; consecutive segments are matched through the
+mesh edge they share so cornering speeds can be taken into account.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Upper bound on face/plane crossings handled per batch (~50 MB of temporaries)
+MAX_CROSSINGS_PER_BATCH = 500_000
+
+
+class LayerStats:
+    """Per-layer slice results as parallel arrays"""
+
+    __slots__ = ("heights", "perimeter", "area", "segments", "segment_layer", "segment_length",
+                 "entry_cos", "exit_cos")
+
+    def __init__(self, heights, perimeter, area, segments, segment_layer, segment_length,
+                 entry_cos, exit_cos):
+        self.heights = heights
+        self.perimeter = perimeter            # mm of outline per layer
+        self.area = area                      # mm² of cross-section per layer
+        self.segments = segments              # outline segments per layer
+        self.segment_layer = segment_layer    # layer index of every segment
+        self.segment_length = segment_length  # mm
+        self.entry_cos = entry_cos            # cos of the turn into each segment
+        self.exit_cos = exit_cos              # cos of the turn out of each segment
+
+
+def _edge_keys(faces, vertex_count):
+    """Undirected edge ids for the three edges (0-1, 1-2, 2-0) of every face"""
+    a = faces
+    b = np.roll(faces, -1, axis=1)
+    return np.minimum(a, b) * vertex_count + np.maximum(a, b)
+
+
+def _slice_batch(triangles, normals, edge_keys, face_ids, layer_ids, heights):
+    """Cut the given (face, layer) pairs; returns oriented 2D segments"""
+    tri = triangles[face_ids]
+    d = tri[:, :, 2] - heights[layer_ids][:, None]
+    above = d > 0
+    a_above = above
+    b_above = np.roll(above, -1, axis=1)
+    crossing = a_above != b_above
+
+    d_next = np.roll(d, -1, axis=1)
+    denom = np.where(crossing, d - d_next, 1.0)
+    t = np.where(crossing, d / denom, 0.0)
+    start = tri[:, :, :2]
+    end = np.roll(tri, -1, axis=1)[:, :, :2]
+    points = start + (end - start) * t[:, :, None]
+
+    # A face straddling the plane has exactly two crossing edges: the ones
+    # after the single non-crossing edge. Faces only touching it have none.
+    valid = crossing.sum(axis=1) == 2
+    skipped = np.argmin(crossing, axis=1)
+    order = np.column_stack([(skipped + 1) % 3, (skipped + 2) % 3])
+    rows = np.arange(len(face_ids))[:, None]
+    p, q = points[rows, order].transpose(1, 0, 2)
+    keys = edge_keys[face_ids[:, None], order]
+
+    # Orient so the solid is on the left (outer loops CCW, holes CW)
+    n = normals[face_ids]
+    flip = (q[:, 1] - p[:, 1]) * n[:, 0] - (q[:, 0] - p[:, 0]) * n[:, 1] < 0
+    p[flip], q[flip] = q[flip].copy(), p[flip].copy()
+    keys[flip] = keys[flip][:, ::-1]
+    return p[valid], q[valid], keys[valid, 0], keys[valid, 1], layer_ids[valid]
+
+
+def _turn_cosines(p, q, start_keys, end_keys, layer_ids, key_space):
+    """
+    Cosine of the turn into and out of every segment.
+
+    Segment B follows segment A when B starts on the mesh edge where A
+    ends, in the same layer. Unmatched ends (open meshes) count as a full stop.
+    """
+    direction = q - p
+    length = np.linalg.norm(direction, axis=1)
+    unit = direction / np.maximum(length, 1e-12)[:, None]
+
+    end_ids = layer_ids * key_space + end_keys
+    start_ids = layer_ids * key_space + start_keys
+    sorter = np.argsort(start_ids, kind="stable")
+    pos = np.searchsorted(start_ids, end_ids, sorter=sorter)
+    pos = np.minimum(pos, len(start_ids) - 1)
+    following = sorter[pos]
+    matched = start_ids[following] == end_ids
+
+    exit_cos = np.full(len(p), -1.0)
+    exit_cos[matched] = np.einsum("ij,ij->i", unit[matched], unit[following[matched]])
+    entry_cos = np.full(len(p), -1.0)
+    entry_cos[following[matched]] = exit_cos[matched]
+    return length, entry_cos, exit_cos
+
+
+def _slice_layer_range(triangles, normals, edge_keys, zmin_sorted, zmax, order, heights,
+                       first_layer, last_layer, layer_height, z0, key_space):
+    """Slice layers [first_layer, last_layer) and return their segments"""
+    # Faces sorted by zmin: only a prefix can reach the top of this range
+    top = z0 + layer_height * (last_layer - 0.5)
+    candidates = order[:np.searchsorted(zmin_sorted, top, side="left")]
+    candidates = candidates[zmax[candidates] > heights[first_layer]]
+    if not len(candidates):
+        return None
+
+    tri_z = triangles[candidates][:, :, 2]
+    lo = np.ceil((tri_z.min(axis=1) - z0) / layer_height - 0.5).astype(np.int64)
+    hi = np.floor((tri_z.max(axis=1) - z0) / layer_height - 0.5).astype(np.int64)
+    lo = np.maximum(lo, first_layer)
+    hi = np.minimum(hi, last_layer - 1)
+    counts = np.maximum(hi - lo + 1, 0)
+    face_ids = np.repeat(candidates, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    layer_ids = np.repeat(lo, counts) + offsets
+    if not len(face_ids):
+        return None
+
+    p, q, start_keys, end_keys, layer_ids = _slice_batch(
+        triangles, normals, edge_keys, face_ids, layer_ids, heights
+    )
+    # Drop zero-length segments through a vertex lying on the plane
+    keep = np.any(np.abs(q - p) > 1e-12, axis=1)
+    p, q, start_keys, end_keys, layer_ids = p[keep], q[keep], start_keys[keep], end_keys[keep], layer_ids[keep]
+    length, entry_cos, exit_cos = _turn_cosines(p, q, start_keys, end_keys, layer_ids, key_space)
+    cross = p[:, 0] * q[:, 1] - q[:, 0] * p[:, 1]
+    return layer_ids, length, cross, entry_cos, exit_cos
+
+
+def slice_layers(vertices, faces, layer_height=0.2, workers=None):
+    """
+    Slice a mesh at every layer and return a `LayerStats`.
+
+    Layers are cut mid-way through each layer height. Batches of layers run
+    in a thread pool; the NumPy work releases the GIL so batches overlap.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    triangles = vertices[faces]
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    # Compact edge ids keep (layer, edge) keys well inside int64
+    _, edge_keys = np.unique(_edge_keys(faces, len(vertices)), return_inverse=True)
+    edge_keys = edge_keys.reshape(-1, 3)
+    key_space = int(edge_keys.max()) + 1 if len(edge_keys) else 1
+
+    z = triangles[:, :, 2]
+    zmin = z.min(axis=1)
+    zmax = z.max(axis=1)
+    z0 = float(zmin.min())
+    layer_count = max(int(np.ceil((zmax.max() - z0) / layer_height)), 1)
+    heights = z0 + layer_height * (np.arange(layer_count) + 0.5)
+
+    order = np.argsort(zmin, kind="stable")
+    zmin_sorted = zmin[order]
+
+    # Split layers so each batch has a bounded number of crossings
+    spans = np.maximum(np.floor((zmax - z0) / layer_height - 0.5) - np.ceil((zmin - z0) / layer_height - 0.5) + 1, 0)
+    workers = workers or min(os.cpu_count() or 1, 8)
+    batch_count = max(int(np.ceil(spans.sum() / MAX_CROSSINGS_PER_BATCH)), workers)
+    bounds = np.unique(np.linspace(0, layer_count, min(batch_count, layer_count) + 1).astype(int))
+
+    def run(batch):
+        return _slice_layer_range(
+            triangles, normals, edge_keys, zmin_sorted, zmax, order, heights,
+            bounds[batch], bounds[batch + 1], layer_height, z0, key_space
+        )
+
+    if workers > 1 and len(bounds) > 2:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, range(len(bounds) - 1)))
+    else:
+        results = [run(batch) for batch in range(len(bounds) - 1)]
+    results = [r for r in results if r is not None]
+
+    if results:
+        layer_ids, length, cross, entry_cos, exit_cos = (np.concatenate(parts) for parts in zip(*results))
+    else:
+        layer_ids = np.zeros(0, dtype=np.int64)
+        length = cross = entry_cos = exit_cos = np.zeros(0)
+
+    return LayerStats(
+        heights=heights,
+        perimeter=np.bincount(layer_ids, weights=length, minlength=layer_count),
+        area=np.abs(0.5 * np.bincount(layer_ids, weights=cross, minlength=layer_count)),
+        segments=np.bincount(layer_ids, minlength=layer_count),
+        segment_layer=layer_ids,
+        segment_length=length,
+        entry_cos=entry_cos,
+        exit_cos=exit_cos
+    )
+
+
+def junction_speed(cos_theta, speed, jerk):
+    """
+    Speed allowed through a corner between two moves.
+
+    Straight continuations keep full speed; sharper turns are limited so the
+    velocity change stays near `jerk`, down to `jerk / 2` for a reversal.
+    """
+    sin_half = np.sqrt(np.clip((1 - cos_theta) / 2, 0, 1))
+    return np.minimum(speed, jerk / np.maximum(sin_half * 2, 1e-9))
+
+
+def trapezoid_time(length, speed, accel, entry_speed, exit_speed):
+    """
+    Time (s) for moves of `length` mm with a trapezoidal velocity profile.
+
+    Accelerates from `entry_speed` towards `speed` and decelerates to
+    `exit_speed`; short moves that can't reach `speed` get a triangular
+    profile. All arguments broadcast.
+    """
+    length = np.asarray(length, dtype=np.float64)
+    speed = np.maximum(np.asarray(speed, dtype=np.float64), 1e-9)
+    entry_speed = np.minimum(entry_speed, speed)
+    exit_speed = np.minimum(exit_speed, speed)
+    accel = np.maximum(accel, 1e-9)
+
+    accel_dist = (speed ** 2 - entry_speed ** 2) / (2 * accel)
+    decel_dist = (speed ** 2 - exit_speed ** 2) / (2 * accel)
+    cruise = length - accel_dist - decel_dist
+
+    full = (speed - entry_speed) / accel + (speed - exit_speed) / accel + np.maximum(cruise, 0) / speed
+    peak = np.sqrt(np.maximum((2 * accel * length + entry_speed ** 2 + exit_speed ** 2) / 2, 0))
+    peak = np.maximum(peak, np.maximum(entry_speed, exit_speed))
+    short = (peak - entry_speed) / accel + (peak - exit_speed) / accel
+    # Guard against moves too short to change speed at all
+    short = np.minimum(short, 2 * length / np.maximum(entry_speed + exit_speed, 1e-9))
+    return np.where(cruise >= 0, full, short)
+
+
+def estimate_print_time_sliced(vertices, faces, nozzle_diameter=0.4, layer_height=0.2,
+                               print_speed=50, infill_density=20, shell_thickness=1.2,
+                               acceleration=500, jerk=8, retraction_speed=45,
+                               travel_factor=1.05, workers=None):
+    """
+    Print-time estimate from the sliced mesh.
+
+    Perimeters: each wall loop follows the sliced outline, with every
+    segment timed by a trapezoidal profile whose entry/exit speeds come from
+    the turn angle at its ends. Infill: the layer area is filled with
+    rectilinear lines (100% within `shell_thickness` of exposed top and
+    bottom surfaces, `infill_density` elsewhere), each line starting and
+    ending at the jerk speed. Returns the same structure as
+    `estimate_print_time`.
+    """
+    layers = slice_layers(vertices, faces, layer_height, workers)
+    extrusion_width = nozzle_diameter * 1.2
+    num_shells = max(round(shell_thickness / extrusion_width), 1)
+    shell_layers = max(int(np.ceil(shell_thickness / layer_height)), 1)
+
+    # Perimeter time from the real outline segments
+    entry = junction_speed(layers.entry_cos, print_speed, jerk)
+    exit_ = junction_speed(layers.exit_cos, print_speed, jerk)
+    segment_time = trapezoid_time(layers.segment_length, print_speed, acceleration, entry, exit_)
+    perimeter_time = num_shells * segment_time.sum()
+
+    # Area covered by walls is not infilled
+    area = layers.area
+    fill_area = np.maximum(area - layers.perimeter * extrusion_width * num_shells, 0)
+
+    # Solid where the layer is exposed within shell_layers above or below
+    padded = np.concatenate([np.zeros(shell_layers), area, np.zeros(shell_layers)])
+    above = padded[2 * shell_layers:]
+    below = padded[:-2 * shell_layers]
+    exposed = np.maximum(area - np.minimum(above, below), 0)
+    solid_area = np.minimum(np.maximum(exposed, 0), fill_area)
+    sparse_area = fill_area - solid_area
+    infill_length = (solid_area + sparse_area * infill_density / 100) / extrusion_width
+
+    # Rectilinear lines span roughly the width of the region
+    line_length = np.sqrt(np.maximum(fill_area, 1e-9))
+    line_count = infill_length / line_length
+    infill_time = (line_count * trapezoid_time(line_length, print_speed, acceleration, jerk, jerk)).sum()
+
+    layer_count = len(layers.heights)
+    retraction_time = (layer_count * 2) / retraction_speed
+    print_time_hours = (perimeter_time + infill_time + retraction_time) * travel_factor / 3600
+
+    return {
+        "print_time_hours": print_time_hours,
+        "details": {
+            "method": "sliced",
+            "layers": layer_count,
+            "perimeter_length": float(layers.perimeter.sum() * num_shells),
+            "infill_length": float(infill_length.sum()),
+            "max_layer_area": float(area.max()) if layer_count else 0.0,
+            "perimeter_time_hours": perimeter_time / 3600,
+            "infill_time_hours": infill_time / 3600
+        }
+    }
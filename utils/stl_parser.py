@@ -1,26 +1,414 @@
-import trimesh
+import io
+import re
+from itertools import chain
 import numpy as np
+from utils.parse_cache import CacheEntry
+from utils.compact_mesh import CompactMesh
+from utils.metrics import span
 
-def parse_3d_file(file_obj, file_type):
-    """Parse 3D model file and return volume and bounding box"""
+# On-disk layout of one binary STL facet: normal, 3 vertices, attribute byte count
+BINARY_STL_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attr', '<u2')
+])
+BINARY_STL_HEADER = 84
+# Facets per chunk when scanning (~20 MB of float64 temporaries)
+STL_CHUNK_FACES = 1 << 18
+# Bytes read per block by the streaming text parsers
+TEXT_BLOCK_BYTES = 8 * 1024 * 1024
+
+_STL_VERTEX_RE = re.compile(rb'vertex([^\r\n]*)')
+_OBJ_VERTEX_RE = re.compile(rb'^[ \t]*v[ \t]+([^\r\n]*)', re.M)
+# Fallback for OBJ vertices carrying extra columns (w or vertex colours)
+_OBJ_VERTEX_XYZ_RE = re.compile(rb'^[ \t]*v[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)', re.M)
+_OBJ_FACE_RE = re.compile(rb'^[ \t]*f[ \t]+([^\r\n]*)', re.M)
+_OBJ_FACE_REF_RE = re.compile(rb'/[^ \t\n]*')
+
+
+def _read_bytes(file_obj):
+    """Return the raw bytes of an uploaded file or path without moving its pointer"""
+    if isinstance(file_obj, str):
+        with open(file_obj, 'rb') as f:
+            return f.read()
+    if isinstance(file_obj, (bytes, bytearray, memoryview)):
+        return bytes(file_obj)
+    if hasattr(file_obj, 'getvalue'):
+        return file_obj.getvalue()
+    position = file_obj.tell()
+    file_obj.seek(0)
+    data = file_obj.read()
+    file_obj.seek(position)
+    return data
+
+
+def _binary_stl_facets(file_obj):
+    """
+    Return the facets of a binary STL as a structured array without copying.
+
+    Paths and real files are memory-mapped; in-memory uploads (BytesIO) are
+    viewed through their buffer. Returns None if the data is not binary STL.
+    """
+    if isinstance(file_obj, str):
+        with open(file_obj, 'rb') as f:
+            header = f.read(BINARY_STL_HEADER)
+            f.seek(0, 2)
+            size = f.tell()
+        source = file_obj
+    elif isinstance(file_obj, (bytes, bytearray, memoryview)):
+        source = memoryview(file_obj)
+        header = bytes(source[:BINARY_STL_HEADER])
+        size = source.nbytes
+    elif hasattr(file_obj, 'getbuffer'):
+        source = file_obj.getbuffer()
+        header = bytes(source[:BINARY_STL_HEADER])
+        size = source.nbytes
+    elif hasattr(file_obj, 'fileno'):
+        source = file_obj
+        position = file_obj.tell()
+        file_obj.seek(0)
+        header = file_obj.read(BINARY_STL_HEADER)
+        file_obj.seek(0, 2)
+        size = file_obj.tell()
+        file_obj.seek(position)
+    else:
+        return None
+
+    if size < BINARY_STL_HEADER:
+        return None
+    count = int(np.frombuffer(header, dtype='<u4', count=1, offset=80)[0])
+    expected = BINARY_STL_HEADER + count * BINARY_STL_DTYPE.itemsize
+    # ASCII files start with "solid"; binary files may too, so trust the size
+    if size < expected or (size != expected and header.startswith(b'solid')):
+        return None
+    if count == 0:
+        return np.zeros(0, dtype=BINARY_STL_DTYPE)
+
+    if isinstance(source, memoryview):
+        return np.frombuffer(source, dtype=BINARY_STL_DTYPE, count=count, offset=BINARY_STL_HEADER)
+    return np.memmap(source, dtype=BINARY_STL_DTYPE, mode='r', offset=BINARY_STL_HEADER, shape=(count,))
+
+
+class _TriangleStats:
+    """Running signed-tetrahedron volume (mm³) and bounds over triangle chunks"""
+
+    def __init__(self):
+        self.volume = 0.0
+        self.count = 0
+        self.lower = np.full(3, np.inf)
+        self.upper = np.full(3, -np.inf)
+
+    def add(self, triangles):
+        chunk = np.asarray(triangles, dtype=np.float64)
+        if not len(chunk):
+            return
+        v0, v1, v2 = chunk[:, 0], chunk[:, 1], chunk[:, 2]
+        self.volume += np.einsum('ij,ij->', v0, np.cross(v1, v2)) / 6.0
+        flat = chunk.reshape(-1, 3)
+        self.lower = np.minimum(self.lower, flat.min(axis=0))
+        self.upper = np.maximum(self.upper, flat.max(axis=0))
+        self.count += len(chunk)
+
+    def bounds(self):
+        if not self.count:
+            return np.zeros((2, 3))
+        return np.array([self.lower, self.upper])
+
+
+def _triangle_stats(triangles, chunk_faces=STL_CHUNK_FACES):
+    """
+    Signed-tetrahedron volume (mm³) and bounds of an (n, 3, 3) triangle array.
+
+    Works through the array in fixed-size chunks so memory stays bounded even
+    when `triangles` is a memory-mapped multi-GB file.
+    """
+    stats = _TriangleStats()
+    for start in range(0, len(triangles), chunk_faces):
+        stats.add(triangles[start:start + chunk_faces])
+    return stats.volume, stats.bounds()
+
+
+def _indexed_triangle_stats(vertices, faces, chunk_faces=STL_CHUNK_FACES):
+    """Same as `_triangle_stats` for an indexed mesh, without building the soup"""
+    stats = _TriangleStats()
+    for start in range(0, len(faces), chunk_faces):
+        stats.add(vertices[faces[start:start + chunk_faces]])
+    return stats.volume, stats.bounds()
+
+
+def _bbox_from_bounds(bounds):
+    return {
+        'x': abs(bounds[1][0] - bounds[0][0]),
+        'y': abs(bounds[1][1] - bounds[0][1]),
+        'z': abs(bounds[1][2] - bounds[0][2])
+    }
+
+
+def _mesh_from_triangles(triangles):
+    """Build a vertex-merged CompactMesh from an (n, 3, 3) triangle soup"""
+    with span("parse.build_mesh"):
+        return CompactMesh.from_triangles(triangles)
+
+
+def _iter_text_blocks(file_obj, block_size=TEXT_BLOCK_BYTES):
+    """Yield blocks of roughly `block_size` bytes that always end on a line break"""
+    if isinstance(file_obj, str):
+        with open(file_obj, 'rb') as f:
+            yield from _iter_text_blocks(f, block_size)
+        return
+    if isinstance(file_obj, (bytes, bytearray, memoryview)):
+        file_obj = io.BytesIO(file_obj)
+    position = file_obj.tell()
+    file_obj.seek(0)
+    carry = b''
     try:
-        # Special handling for 3MF files
-        if file_type.lower() == '3mf':
-            mesh_or_scene = trimesh.load(
-                file_obj,
-                file_type='3mf',
-                force='mesh',
-                process=True,
-                maintain_order=True,
-                skip_materials=True,
-                resolver=None  # Disable external references
-            )
-        else:
-            mesh_or_scene = trimesh.load(
-                file_obj,
-                file_type=file_type,
-                force='mesh'
-            )
+        while True:
+            block = file_obj.read(block_size)
+            if not block:
+                break
+            block = carry + block
+            cut = block.rfind(b'\n') + 1
+            if cut == 0:
+                carry = block
+                continue
+            carry = block[cut:]
+            yield block[:cut]
+        if carry:
+            yield carry
+    finally:
+        file_obj.seek(position)
+
+
+def _parse_floats(tokens, expected):
+    """Convert a sequence of whitespace-separated numeric byte records in one call"""
+    text = tokens if isinstance(tokens, bytes) else b' '.join(tokens)
+    values = np.fromstring(text, dtype=np.float64, sep=' ')
+    if len(values) != expected:
+        raise ValueError("Malformed numeric record")
+    return values
+
+
+def _parse_ascii_stl(file_obj, build_mesh=True, block_size=TEXT_BLOCK_BYTES):
+    """
+    Stream an ASCII STL in fixed-size blocks.
+
+    Each block's `vertex` records are pulled out with one regex pass and
+    converted to floats with a single NumPy call, then fed to the same
+    volume/bounds accumulator as binary STL. Only the current block is held
+    in memory unless a mesh is requested.
+    """
+    stats = _TriangleStats()
+    soup = []
+    leftover = np.zeros((0, 3))
+    # facet records opened and closed, to catch a file cut off mid-facet
+    opened = closed = 0
+    for block in _iter_text_blocks(file_obj, block_size):
+        ends = block.count(b'endfacet')
+        opened += block.count(b'facet') - ends
+        closed += ends
+        records = _STL_VERTEX_RE.findall(block)
+        if not records:
+            continue
+        vertices = _parse_floats(records, 3 * len(records)).reshape(-1, 3)
+        # A facet can straddle two blocks, so keep incomplete triangles
+        vertices = np.concatenate([leftover, vertices])
+        usable = len(vertices) - len(vertices) % 3
+        triangles = vertices[:usable].reshape(-1, 3, 3)
+        leftover = vertices[usable:]
+        stats.add(triangles)
+        if build_mesh:
+            soup.append(triangles)
+    if len(leftover) or not opened == closed == stats.count:
+        raise ValueError("Truncated or malformed facet in ASCII STL")
+    if not stats.count:
+        raise ValueError("No facets found in ASCII STL")
+
+    mesh = _mesh_from_triangles(np.concatenate(soup)) if build_mesh else None
+    return stats.volume / 1000, _bbox_from_bounds(stats.bounds()), mesh
+
+
+def _obj_face_triangles(face_text, vertex_offsets=None):
+    """
+    Fan-triangulate OBJ face records with vectorized token counting.
+
+    `face_text` holds one face per line with texture/normal references
+    already stripped. Returns 0-based (n, 3) triangle indices; negative
+    (relative) indices are resolved with `vertex_offsets`, the vertex count
+    seen before each face line.
+    """
+    chars = np.frombuffer(face_text, dtype=np.uint8)
+    is_token = (chars != ord(' ')) & (chars != ord('\t')) & (chars != ord('\n'))
+    token_starts = np.flatnonzero(is_token & ~np.concatenate([[False], is_token[:-1]]))
+    line_ends = np.append(np.flatnonzero(chars == ord('\n')), len(chars))
+    counts = np.diff(np.searchsorted(token_starts, line_ends), prepend=0)
+
+    indices = np.fromstring(face_text, dtype=np.int64, sep=' ')
+    if len(indices) != counts.sum():
+        raise ValueError("Malformed face record")
+    negative = indices < 0
+    if negative.any():
+        if vertex_offsets is None:
+            raise ValueError("Relative face indices need vertex offsets")
+        per_index = np.repeat(vertex_offsets, counts)
+        indices[negative] += per_index[negative] + 1
+    indices -= 1
+
+    # Polygon with k corners -> k - 2 triangles (0, j, j + 1)
+    # Lines with fewer than 3 corners are skipped, but their tokens still take up space
+    starts = np.cumsum(counts) - counts
+    polygons = counts >= 3
+    counts, starts = counts[polygons], starts[polygons]
+    tri_counts = counts - 2
+    first = np.repeat(starts, tri_counts)
+    step = np.arange(tri_counts.sum()) - np.repeat(np.cumsum(tri_counts) - tri_counts, tri_counts)
+    return np.column_stack([indices[first], indices[first + step + 1], indices[first + step + 2]])
+
+
+def _parse_obj(file_obj, build_mesh=True, block_size=TEXT_BLOCK_BYTES):
+    """
+    Stream an OBJ file in fixed-size blocks.
+
+    `v` and `f` records are extracted per block with regex passes and
+    converted with single NumPy calls. OBJ faces may reference any vertex,
+    so vertex and face arrays are kept until the end of the file.
+    """
+    vertex_blocks = []
+    face_blocks = []
+    vertex_count = 0
+    for block in _iter_text_blocks(file_obj, block_size):
+        records = _OBJ_VERTEX_RE.findall(block)
+        if records:
+            try:
+                vertices = _parse_floats(records, 3 * len(records))
+            except ValueError:
+                xyz = chain.from_iterable(_OBJ_VERTEX_XYZ_RE.findall(block))
+                vertices = _parse_floats(xyz, 3 * len(records))
+            vertex_blocks.append(vertices.reshape(-1, 3))
+        face_lines = _OBJ_FACE_RE.findall(block)
+        if face_lines:
+            face_text = _OBJ_FACE_REF_RE.sub(b'', b'\n'.join(face_lines))
+            offsets = None
+            if b'-' in face_text:
+                offsets = _obj_vertex_offsets(block, vertex_count)
+            face_blocks.append(_obj_face_triangles(face_text, offsets))
+        vertex_count += len(records)
+
+    if not vertex_blocks or not face_blocks:
+        raise ValueError("No faces found in OBJ file")
+    vertices = np.concatenate(vertex_blocks)
+    faces = np.concatenate(face_blocks)
+    if faces.min() < 0 or faces.max() >= len(vertices):
+        raise ValueError("Face index out of range in OBJ file")
+
+    volume_mm3, bounds = _indexed_triangle_stats(vertices, faces)
+    mesh = None
+    if build_mesh:
+        with span("parse.build_mesh"):
+            mesh = CompactMesh(vertices, faces)
+    return volume_mm3 / 1000, _bbox_from_bounds(bounds), mesh
+
+
+def _obj_vertex_offsets(block, vertex_count):
+    """Vertex count seen before each face line of a block (for relative indices)"""
+    vertex_starts = np.array([m.start() for m in _OBJ_VERTEX_RE.finditer(block)], dtype=np.int64)
+    face_starts = np.array([m.start() for m in _OBJ_FACE_RE.finditer(block)], dtype=np.int64)
+    return vertex_count + np.searchsorted(vertex_starts, face_starts)
+
+
+def parse_stl(file_obj, build_mesh=True):
+    """
+    Parse an STL file, using the memory-mapped fast path for binary STL.
+
+    With `build_mesh=False` no mesh is created and the third item is None,
+    which is all a quote needs when no preview is shown.
+    """
+    facets = _binary_stl_facets(file_obj)
+    if facets is None:
+        try:
+            return _parse_ascii_stl(file_obj, build_mesh=build_mesh)
+        except Exception as ascii_error:
+            # Let trimesh handle anything unusual, but report our own reason if it can't either
+            try:
+                return _parse_3d_file(file_obj, 'stl')
+            except ValueError:
+                raise ValueError(f"Failed to parse stl file: {ascii_error}") from None
+
+    try:
+        triangles = facets['vertices']
+        volume_mm3, bounds = _triangle_stats(triangles)
+        mesh = _mesh_from_triangles(triangles) if build_mesh else None
+    except Exception as e:
+        raise ValueError(f"Failed to parse stl file: {str(e)}")
+    return volume_mm3 / 1000, _bbox_from_bounds(bounds), mesh
+
+
+def parse_3d_file(file_obj, file_type, cache=None, cache_key=None, build_mesh=True):
+    """
+    Parse 3D model file and return volume and bounding box, plus the
+    geometry as a read-only CompactMesh.
+
+    Binary STL files take a zero-copy fast path; pass `build_mesh=False` to
+    get None instead of a mesh when no preview is needed.
+
+    If a `ParseCache` is passed, results are looked up by the SHA-256 of the
+    file bytes so reruns with the same upload skip `trimesh.load` entirely.
+    Callers that already know the key (e.g. from an earlier rerun) can pass
+    `cache_key` to skip hashing the upload again.
+    """
+    if cache is None:
+        return _parse_uncached(file_obj, file_type, build_mesh)
+
+    data = None
+    if cache_key is None:
+        data = _read_bytes(file_obj)
+        cache_key = cache.make_key(data, file_type)
+    entry = cache.get(cache_key)
+    if entry is None:
+        if data is None:
+            data = _read_bytes(file_obj)
+        volume_cm3, bbox, mesh = _parse_uncached(io.BytesIO(data), file_type, build_mesh)
+        # Mesh-less results are not cached so a later preview still gets geometry
+        if mesh is not None:
+            cache.put(cache_key, CacheEntry(volume_cm3, bbox, mesh))
+        return volume_cm3, bbox, mesh
+
+    # The cached mesh is read-only, so every session can share it
+    return entry.volume_cm3, dict(entry.bbox), entry.mesh if build_mesh else None
+
+
+def _parse_uncached(file_obj, file_type, build_mesh):
+    if file_type.lower() == 'stl':
+        return parse_stl(file_obj, build_mesh=build_mesh)
+    if file_type.lower() == 'obj':
+        try:
+            return _parse_obj(file_obj, build_mesh=build_mesh)
+        except Exception:
+            return _parse_3d_file(file_obj, file_type)
+    return _parse_3d_file(file_obj, file_type)
+
+
+def _parse_3d_file(file_obj, file_type):
+    import trimesh
+
+    try:
+        with span("parse.trimesh_load", file_type=file_type.lower()):
+            # Special handling for 3MF files
+            if file_type.lower() == '3mf':
+                mesh_or_scene = trimesh.load(
+                    file_obj,
+                    file_type='3mf',
+                    force='mesh',
+                    process=True,
+                    maintain_order=True,
+                    skip_materials=True,
+                    resolver=None  # Disable external references
+                )
+            else:
+                mesh_or_scene = trimesh.load(
+                    file_obj,
+                    file_type=file_type,
+                    force='mesh'
+                )
         
         # Handle Scene vs Mesh
         if isinstance(mesh_or_scene, trimesh.Scene):
@@ -36,14 +424,13 @@ def parse_3d_file(file_obj, file_type):
             raise ValueError(f"Unsupported format or no mesh found")
 
         # Calculate volume and bounding box
-        volume_cm3 = mesh.volume / 1000  # Convert mm³ to cm³
-        bbox = {
-            'x': abs(mesh.bounds[1][0] - mesh.bounds[0][0]),
-            'y': abs(mesh.bounds[1][1] - mesh.bounds[0][1]),
-            'z': abs(mesh.bounds[1][2] - mesh.bounds[0][2])
-        }
-        
-        return volume_cm3, bbox, mesh
+        with span("parse.mesh_volume"):
+            volume_cm3 = mesh.volume / 1000  # Convert mm³ to cm³
+            bbox = _bbox_from_bounds(mesh.bounds)
+
+        # Keep only the geometry, not trimesh's float64 arrays and caches
+        with span("parse.build_mesh"):
+            return volume_cm3, bbox, CompactMesh(mesh.vertices, mesh.faces)
 
     except Exception as e:
-        raise ValueError(f"Failed to parse {file_type} file: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"Failed to parse {file_type} file: {str(e)}")
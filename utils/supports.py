@@ -0,0 +1,120 @@
+"""
+Support material estimated from the model's overhangs.
+
+Face normals and areas come from one cross product over all faces. Faces
+that point down more steeply than the overhang angle (measured from
+vertical, as slicers do) and don't sit on the bed need support. Rays are
+cast straight down through an XY grid; along each ray an overhang needs a
+column reaching down to the nearest upward-facing surface below it, or to
+the bed. Summing those columns gives the space supports have to fill, and
+each style fills it at its own density plus a solid interface layer under
+the overhang.
+"""
+import numpy as np
+
+from utils.mesh_validation import _ray_grid, _ray_crossings
+
+# Degrees from vertical; steeper faces print without support
+DEFAULT_OVERHANG_ANGLE = 45
+# Rays cast are about SUPPORT_GRID² (spread over the XY footprint)
+SUPPORT_GRID = 256
+# Faces handled per chunk (bounds the temporaries)
+SUPPORT_CHUNK_FACES = 1 << 18
+# Faces within this distance (mm) of the lowest point rest on the bed
+BED_TOLERANCE = 0.05
+
+# Share of the support space filled, solid interface under each overhang
+# (mm), and the material printed, None meaning the part's own material.
+# Fills are typical slicer defaults; tree supports branch from a few trunks
+SUPPORT_STYLES = {
+    'regular': {'fill': 0.15, 'interface_mm': 0.6, 'material': None},
+    'tree': {'fill': 0.09, 'interface_mm': 0.4, 'material': None},
+    'soluble': {'fill': 0.2, 'interface_mm': 0.8, 'material': 'PVA'}
+}
+
+
+def face_normals_and_areas(triangles):
+    """Unit normals and areas (mm²) of an (n, 3, 3) triangle array"""
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.sqrt(np.einsum('ij,ij->i', normals, normals))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normals = np.where(lengths[:, None] > 0, normals / lengths[:, None], 0.0)
+    return normals, lengths / 2
+
+
+def analyse_overhangs(vertices, faces, overhang_angle=DEFAULT_OVERHANG_ANGLE,
+                      grid=SUPPORT_GRID, chunk_faces=SUPPORT_CHUNK_FACES):
+    """
+    Overhangs of an indexed mesh and the space under them.
+
+    Returns a dict with "overhang_faces", "overhang_area_cm2" (surface
+    area of the overhanging faces), "supported_area_cm2" (their footprint
+    seen from below) and "column_volume_cm3" (the space between them and
+    the surface or bed underneath), all for `overhang_angle` degrees.
+    """
+    if not 0 <= overhang_angle <= 90:
+        raise ValueError("Overhang angle must be between 0 and 90 degrees")
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    if not len(faces):
+        raise ValueError("Mesh has no faces")
+    bounds = np.array([vertices.min(axis=0), vertices.max(axis=0)])
+    bed = bounds[0][2]
+    lower, pitch, shape = _ray_grid(bounds, 2, grid)
+    limit = -np.sin(np.radians(overhang_angle))
+
+    overhang_faces = 0
+    overhang_area = 0.0
+    rays, depths, is_overhang = [], [], []
+    for start in range(0, len(faces), chunk_faces):
+        triangles = vertices[faces[start:start + chunk_faces]]
+        normals, areas = face_normals_and_areas(triangles)
+        top = np.maximum(np.maximum(triangles[:, 0, 2], triangles[:, 1, 2]), triangles[:, 2, 2])
+        overhang = (normals[:, 2] < limit) & (top > bed + BED_TOLERANCE)
+        upward = normals[:, 2] > 0
+        overhang_faces += int(np.count_nonzero(overhang))
+        overhang_area += float(areas[overhang].sum())
+
+        # Only overhangs and the surfaces their columns can stand on matter
+        wanted = np.flatnonzero(overhang | upward)
+        ray, depth, hit = _ray_crossings(triangles[wanted], 2, lower, pitch, shape)
+        rays.append(ray)
+        depths.append(depth)
+        is_overhang.append(overhang[wanted[hit]])
+
+    rays = np.concatenate(rays)
+    depths = np.concatenate(depths) - bed
+    is_overhang = np.concatenate(is_overhang)
+    result = {
+        'overhang_angle': overhang_angle,
+        'overhang_faces': overhang_faces,
+        'overhang_area_cm2': overhang_area / 100,
+        'supported_area_cm2': 0.0,
+        'column_volume_cm3': 0.0
+    }
+    if not np.any(is_overhang):
+        return result
+
+    order = np.lexsort((depths, rays))
+    rays, depths, is_overhang = rays[order], depths[order], is_overhang[order]
+    # Height of the last upward surface at or below each crossing on its
+    # ray: offsetting each ray by more than the model height lets one
+    # running maximum cover every ray without crossing into the next
+    offset = rays * (bounds[1][2] - bed + 1.0)
+    floor = np.maximum.accumulate(np.where(is_overhang, offset, offset + depths)) - offset
+    heights = np.maximum(depths[is_overhang] - floor[is_overhang], 0.0)
+    supported = heights > 0
+    cell_area = pitch * pitch
+    result['supported_area_cm2'] = float(np.count_nonzero(supported) * cell_area / 100)
+    result['column_volume_cm3'] = float(heights.sum() * cell_area / 1000)
+    return result
+
+
+def support_volume_cm3(analysis, style):
+    """Support material (cm³) for one of SUPPORT_STYLES, from analyse_overhangs()"""
+    try:
+        spec = SUPPORT_STYLES[style.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown support style '{style}'. Use one of: {', '.join(SUPPORT_STYLES)}")
+    interface_cm3 = analysis['supported_area_cm2'] * spec['interface_mm'] / 10
+    return analysis['column_volume_cm3'] * spec['fill'] + interface_cm3
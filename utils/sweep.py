@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+from utils.cost_calculator import calc_costs
+
+SWEEP_FACTORS = ["material", "printer", "tariff", "markup_percent"]
+
+
+def _flatten_printers(printers):
+    """Accept {make: {model: details}} or {label: details} and return {label: details}"""
+    flat = {}
+    for key, value in printers.items():
+        if "cost" in value:
+            flat[key] = value
+        else:
+            for model, details in value.items():
+                flat[f"{key} {model}"] = details
+    return flat
+
+
+def price_sweep(volume_cm3, print_time_hr, materials, printers, tariffs, markups):
+    """
+    Price one part over every material × printer × tariff × markup combination.
+
+    `materials` maps name -> {density, cost_per_kg}; `printers` maps
+    make -> model -> details (as in `Catalog.printers`) or label -> details;
+    `tariffs` maps label -> £/kWh (None entries such as "Custom" are skipped).
+    The whole grid is one broadcast call to `calc_costs`.
+
+    Returns (table, sensitivity): a tidy DataFrame with one row per
+    combination, and the factors ranked by how much they move the price.
+    """
+    printers = _flatten_printers(printers)
+    tariffs = {label: rate for label, rate in tariffs.items() if rate is not None}
+    markups = np.asarray(list(markups), dtype=np.float64)
+    if not (materials and printers and tariffs and len(markups)):
+        raise ValueError("Each sweep dimension needs at least one value")
+
+    material_props = list(materials.values())
+    printer_props = list(printers.values())
+    # Axis order: material, printer, tariff, markup
+    density = np.array([m["density"] for m in material_props])[:, None, None, None]
+    cost_per_kg = np.array([m["cost_per_kg"] for m in material_props])[:, None, None, None]
+
+    def printer_column(key):
+        return np.array([p[key] for p in printer_props], dtype=np.float64)[None, :, None, None]
+
+    costs = calc_costs(
+        volume_cm3=volume_cm3,
+        density=density,
+        cost_per_kg=cost_per_kg,
+        print_time_hr=print_time_hr,
+        power_watt=printer_column("avg_power_watts"),
+        electricity_rate=np.array(list(tariffs.values()), dtype=np.float64)[None, None, :, None],
+        markup_percent=markups[None, None, None, :],
+        printer_cost=printer_column("cost"),
+        upgrades=printer_column("upgrades"),
+        maintenance=printer_column("maintenance"),
+        lifetime_hours=printer_column("lifetime_hours"),
+    )
+
+    shape = costs["total_with_depreciation"].shape
+    codes = np.indices(shape).reshape(len(shape), -1)
+    levels = [list(materials), list(printers), list(tariffs), markups.tolist()]
+    table = pd.DataFrame({
+        "material": pd.Categorical.from_codes(codes[0], levels[0]),
+        "printer": pd.Categorical.from_codes(codes[1], levels[1]),
+        "tariff": pd.Categorical.from_codes(codes[2], levels[2]),
+        "markup_percent": markups[codes[3]],
+        **{name: values.ravel() for name, values in costs.items()}
+    })
+    return table, _sensitivity(costs["total_with_depreciation"], levels)
+
+
+def _sensitivity(total, levels):
+    """
+    Rank factors by their main effect on the price.
+
+    For each factor, the price is averaged over all other factors for each
+    of its levels. `swing` is the spread between the cheapest and dearest
+    level, and `variance_share` is the share of the grid's total variance
+    explained by that factor alone (first-order Sobol index on a full grid).
+    """
+    total_variance = total.var()
+    rows = []
+    for axis, factor in enumerate(SWEEP_FACTORS):
+        other_axes = tuple(a for a in range(total.ndim) if a != axis)
+        level_means = total.mean(axis=other_axes)
+        rows.append({
+            "factor": factor,
+            "cheapest": levels[axis][int(level_means.argmin())],
+            "dearest": levels[axis][int(level_means.argmax())],
+            "swing": float(level_means.max() - level_means.min()),
+            "variance_share": float(level_means.var() / total_variance) if total_variance > 0 else 0.0,
+        })
+    return pd.DataFrame(rows).sort_values("swing", ascending=False, ignore_index=True)
@@ -0,0 +1,209 @@
+"""
+Deterministic synthetic meshes for benchmarks and tests.
+
+Every shape is built directly in NumPy at roughly the requested triangle
+count, is closed and outward-facing, and comes out identical on every run:
+
+    vertices, faces = generate_mesh('sphere', 100_000)
+    write_mesh('sphere_100k.stl', vertices, faces)
+"""
+import io
+import zipfile
+
+import numpy as np
+
+# Size labels accepted by parse_size and used in benchmark result names
+SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+FILE_TYPES = ('stl', 'obj', '3mf')
+# Seed for the sphere radii in multi_body scenes
+SCENE_SEED = 705
+# Rows formatted per write() call for the text formats
+TEXT_CHUNK_ROWS = 200_000
+
+_STL_DTYPE = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attr', '<u2')])
+_CUBE_VERTICES = np.array([
+    [0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+    [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]
+], dtype=np.float64)
+_CUBE_FACES = np.array([
+    [0, 2, 1], [0, 3, 2], [4, 5, 6], [4, 6, 7],
+    [0, 1, 5], [0, 5, 4], [1, 2, 6], [1, 6, 5],
+    [2, 3, 7], [2, 7, 6], [3, 0, 4], [3, 4, 7]
+], dtype=np.int64)
+_3MF_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>'
+    '</Types>'
+)
+_3MF_RELS = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Target="/3D/3dmodel.model" Id="rel0" '
+    'Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>'
+    '</Relationships>'
+)
+
+
+def parse_size(label):
+    """Triangle count for '10k', '1m', ... or a plain integer string"""
+    label = str(label).lower()
+    if label in SIZES:
+        return SIZES[label]
+    try:
+        return int(label)
+    except ValueError:
+        raise ValueError(f"Unknown size '{label}'. Use one of {', '.join(SIZES)} or a number")
+
+
+def _quad_faces(rows, columns):
+    """Two triangles per cell of a rows x columns vertex grid that wraps around the columns"""
+    r, c = np.meshgrid(np.arange(rows - 1), np.arange(columns), indexing='ij')
+    a = r * columns + c
+    b = r * columns + (c + 1) % columns
+    d = (r + 1) * columns + c
+    e = (r + 1) * columns + (c + 1) % columns
+    return np.concatenate([
+        np.stack([a, d, b], axis=-1).reshape(-1, 3),
+        np.stack([b, d, e], axis=-1).reshape(-1, 3)
+    ])
+
+
+def sphere(triangles, radius=20.0, center=(0.0, 0.0, 0.0)):
+    """UV sphere with about `triangles` faces (2 per lat/long cell)"""
+    rings = max(int(round(np.sqrt(triangles / 4))), 2)
+    segments = 2 * rings
+    theta = np.linspace(0, np.pi, rings + 2)[1:-1]
+    phi = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    t, p = np.meshgrid(theta, phi, indexing='ij')
+    ring_vertices = np.stack([np.sin(t) * np.cos(p), np.sin(t) * np.sin(p), np.cos(t)], axis=-1).reshape(-1, 3)
+    vertices = np.vstack([[0, 0, 1], ring_vertices, [0, 0, -1]]) * radius + np.asarray(center)
+
+    body = _quad_faces(rings, segments) + 1
+    ring = np.arange(segments)
+    top = np.stack([np.zeros(segments, dtype=np.int64), ring + 1, (ring + 1) % segments + 1], axis=-1)
+    bottom_pole = len(vertices) - 1
+    last = 1 + (rings - 1) * segments
+    bottom = np.stack([np.full(segments, bottom_pole), (ring + 1) % segments + last, ring + last], axis=-1)
+    return vertices, np.vstack([top, body, bottom])
+
+
+def lattice(triangles, cell=4.0, fill=0.5):
+    """Cubic grid of separate cubes, 12 faces each - many small shells"""
+    per_side = max(int(round((triangles / 12) ** (1 / 3))), 1)
+    offsets = np.stack(np.meshgrid(*[np.arange(per_side)] * 3, indexing='ij'), axis=-1).reshape(-1, 1, 3) * cell
+    vertices = (_CUBE_VERTICES * cell * fill + offsets).reshape(-1, 3)
+    faces = (_CUBE_FACES + 8 * np.arange(len(offsets)).reshape(-1, 1, 1)).reshape(-1, 3)
+    return vertices, faces
+
+
+def thin_wall(triangles, radius=30.0, height=60.0, wall=0.8):
+    """Tall tube with a `wall` mm shell: long, thin triangles close together"""
+    # 4 faces per (row, segment) on the two walls plus 4 per segment in the rims
+    segments = max(int(round(np.sqrt(triangles))), 8)
+    rows = max(int(round((triangles / segments - 4) / 4)) + 1, 2)
+    phi = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    z = np.linspace(0, height, rows)
+    zz, pp = np.meshgrid(z, phi, indexing='ij')
+    ring = np.stack([np.cos(pp), np.sin(pp)], axis=-1)
+    outer = np.concatenate([ring * radius, zz[..., None]], axis=-1).reshape(-1, 3)
+    inner = np.concatenate([ring * (radius - wall), zz[..., None]], axis=-1).reshape(-1, 3)
+    vertices = np.vstack([outer, inner])
+
+    grid = _quad_faces(rows, segments)
+    inner_start = len(outer)
+    outer_faces = grid[:, ::-1]
+    inner_faces = grid + inner_start
+    # Rims join the first and last rows of both walls
+    s = np.arange(segments)
+    s1 = (s + 1) % segments
+    top = (rows - 1) * segments
+    rims = np.vstack([
+        np.stack([s, inner_start + s, s1], axis=-1),
+        np.stack([s1, inner_start + s, inner_start + s1], axis=-1),
+        np.stack([top + s, top + s1, inner_start + top + s], axis=-1),
+        np.stack([top + s1, inner_start + top + s1, inner_start + top + s], axis=-1)
+    ])
+    return vertices, np.vstack([outer_faces, inner_faces, rims])
+
+
+def multi_body(triangles, bodies=8, spacing=50.0):
+    """A plate of `bodies` spheres with seeded random radii"""
+    radii = np.random.default_rng(SCENE_SEED).uniform(8, 20, bodies)
+    columns = int(np.ceil(np.sqrt(bodies)))
+    vertices, faces, offset = [], [], 0
+    for index, radius in enumerate(radii):
+        center = ((index % columns) * spacing, (index // columns) * spacing, radius)
+        v, f = sphere(triangles / bodies, radius=radius, center=center)
+        vertices.append(v)
+        faces.append(f + offset)
+        offset += len(v)
+    return np.vstack(vertices), np.vstack(faces)
+
+
+SHAPES = {'sphere': sphere, 'lattice': lattice, 'thin_wall': thin_wall, 'multi_body': multi_body}
+
+
+def generate_mesh(shape, triangles):
+    """(vertices float64 (n, 3), faces int64 (m, 3)) for a named shape"""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown shape '{shape}'. Use one of {', '.join(SHAPES)}")
+    return SHAPES[shape](parse_size(triangles))
+
+
+def _write_rows(stream, fmt, rows):
+    for start in range(0, len(rows), TEXT_CHUNK_ROWS):
+        np.savetxt(stream, rows[start:start + TEXT_CHUNK_ROWS], fmt=fmt)
+
+
+def write_stl(path, vertices, faces):
+    triangles = vertices[faces]
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    records = np.zeros(len(faces), dtype=_STL_DTYPE)
+    records['normal'] = normals / np.where(lengths > 0, lengths, 1)
+    records['vertices'] = triangles
+    with open(path, 'wb') as f:
+        f.write(b'synthetic mesh'.ljust(80, b' '))
+        f.write(np.uint32(len(faces)).tobytes())
+        records.tofile(f)
+
+
+def write_obj(path, vertices, faces):
+    with open(path, 'w') as f:
+        f.write('# synthetic mesh\n')
+        _write_rows(f, 'v %.6f %.6f %.6f', vertices)
+        _write_rows(f, 'f %d %d %d', faces + 1)
+
+
+def write_3mf(path, vertices, faces):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _3MF_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _3MF_RELS)
+        # Streamed into the archive so 10M-face models never exist as one string
+        with io.TextIOWrapper(archive.open('3D/3dmodel.model', 'w', force_zip64=True), encoding='utf-8') as model:
+            _write_3mf_model(model, vertices, faces)
+
+
+def _write_3mf_model(model, vertices, faces):
+    model.write(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<model unit="millimeter" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">'
+        '<resources><object id="1" type="model"><mesh><vertices>\n'
+    )
+    _write_rows(model, '<vertex x="%.6f" y="%.6f" z="%.6f"/>', vertices)
+    model.write('</vertices><triangles>\n')
+    _write_rows(model, '<triangle v1="%d" v2="%d" v3="%d"/>', faces)
+    model.write('</triangles></mesh></object></resources><build><item objectid="1"/></build></model>\n')
+
+
+_WRITERS = {'stl': write_stl, 'obj': write_obj, '3mf': write_3mf}
+
+
+def write_mesh(path, vertices, faces, file_type=None):
+    """Write binary STL, OBJ or 3MF, chosen by `file_type` or the extension"""
+    file_type = (file_type or str(path).rsplit('.', 1)[-1]).lower()
+    if file_type not in _WRITERS:
+        raise ValueError(f"Unsupported file type '{file_type}'. Use one of {', '.join(FILE_TYPES)}")
+    _WRITERS[file_type](path, vertices, faces)
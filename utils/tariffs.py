@@ -0,0 +1,100 @@
+"""
+Time-of-use electricity tariffs.
+
+A tariff is an array of prices (per kWh) for consecutive half-hour slots
+starting at midnight, repeating once it runs out: 48 prices for a daily
+tariff, 336 for a weekly one. Times are hours from the first midnight.
+
+With constant power the cost of a print is power times the integral of the
+price over the print window, and a prefix sum of the slot prices turns that
+integral into two lookups. The cost of starting at s is piecewise linear
+in s, bending only where the start or the end of the window crosses a slot
+boundary, so the cheapest start is always at one of those bends:
+cheapest_start() evaluates them all at once for every job in a batch.
+"""
+import numpy as np
+
+SLOT_HOURS = 0.5
+SLOTS_PER_DAY = 48
+
+
+def time_of_use(base_rate, windows, slots=SLOTS_PER_DAY):
+    """
+    Half-hourly prices at `base_rate` except in `windows`, a list of
+    (start_hour, end_hour, rate); windows ending before they start wrap
+    past midnight.
+    """
+    prices = np.full(slots, float(base_rate))
+    times = np.arange(slots) * SLOT_HOURS % 24
+    for start, end, price in windows:
+        inside = (times >= start) & (times < end) if start <= end else (times >= start) | (times < end)
+        prices[inside] = price
+    return prices
+
+
+# UK tariffs in £/kWh, matching the app's flat rates
+TARIFFS = {
+    'Standard': time_of_use(0.34, []),
+    # Seven off-peak hours overnight
+    'Economy 7': time_of_use(0.39, [(0.5, 7.5, 0.20)]),
+    # Smart meter off-peak overnight, peak rate the rest of the day
+    'Smart Meter': time_of_use(0.40, [(23, 7, 0.25)])
+}
+
+
+def _cumulative(prices, hours):
+    """Integral of the (repeating) tariff from 0 to `hours`, in price x hours"""
+    prices = np.asarray(prices, dtype=np.float64)
+    prefix = np.concatenate([[0.0], np.cumsum(prices) * SLOT_HOURS])
+    period = len(prices) * SLOT_HOURS
+    cycles, within = np.divmod(np.asarray(hours, dtype=np.float64), period)
+    slot = np.minimum((within // SLOT_HOURS).astype(np.int64), len(prices) - 1)
+    return cycles * prefix[-1] + prefix[slot] + (within - slot * SLOT_HOURS) * prices[slot]
+
+
+def tariff_energy_cost(prices, start_hr, print_time_hr, power_watt):
+    """
+    Energy cost of printing for `print_time_hr` from `start_hr` at a
+    constant `power_watt`. Broadcasts like calc_costs; scalars return a
+    float rounded as calc_energy_cost does.
+    """
+    start_hr = np.asarray(start_hr, dtype=np.float64)
+    window = _cumulative(prices, start_hr + print_time_hr) - _cumulative(prices, start_hr)
+    cost = np.round(np.multiply(power_watt, window) / 1000, 4)
+    return float(cost) if np.ndim(cost) == 0 else cost
+
+
+def cheapest_start(prices, print_time_hr, power_watt, earliest_hr=0.0, latest_hr=None):
+    """
+    Cheapest start time in [earliest_hr, latest_hr] (default: one tariff
+    period from earliest_hr) for each print time, and its energy cost.
+
+    Returns (start_hr, cost) arrays shaped like `print_time_hr`; ties go to
+    the earliest start.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    durations = np.asarray(print_time_hr, dtype=np.float64)
+    if np.any(durations < 0):
+        raise ValueError("Print times must not be negative")
+    if latest_hr is None:
+        latest_hr = earliest_hr + len(prices) * SLOT_HOURS
+    if latest_hr < earliest_hr:
+        raise ValueError("latest_hr must not be before earliest_hr")
+
+    # Slot boundaries the window can start on, or end on
+    boundaries = np.arange(np.ceil(earliest_hr / SLOT_HOURS), np.floor(latest_hr / SLOT_HOURS) + 1) * SLOT_HOURS
+    flat = durations.reshape(-1, 1)
+    candidates = np.concatenate([
+        np.broadcast_to(boundaries, (len(flat), len(boundaries))),
+        boundaries - flat,
+        np.full((len(flat), 1), float(earliest_hr)),
+        np.full((len(flat), 1), float(latest_hr))
+    ], axis=1)
+    candidates = np.clip(candidates, earliest_hr, latest_hr)
+
+    window = _cumulative(prices, candidates + flat) - _cumulative(prices, candidates)
+    cost = np.multiply(np.asarray(power_watt, dtype=np.float64).reshape(-1, 1), window) / 1000
+    best = cost.min(axis=1, keepdims=True)
+    # Earliest of the (near-)equal minima
+    starts = np.where(cost <= best + 1e-9, candidates, np.inf).min(axis=1)
+    return starts.reshape(durations.shape), np.round(best[:, 0], 4).reshape(durations.shape)
@@ -0,0 +1,99 @@
+"""
+Slicer results embedded in 3MF project files.
+
+Bambu Studio and OrcaSlicer save each sliced plate's predicted print time
+and filament weight in Metadata/slice_info.config. Reading that entry is a
+few milliseconds, against seconds for loading every mesh in the project, so
+callers should try it first and only parse geometry when it returns None.
+"""
+import io
+import zipfile
+
+SLICE_INFO_ENTRY = "Metadata/slice_info.config"
+THUMBNAIL_ENTRY = "Metadata/plate_{index}.png"
+
+
+def _open_zip(file_obj):
+    if isinstance(file_obj, (bytes, bytearray, memoryview)):
+        file_obj = io.BytesIO(file_obj)
+    elif hasattr(file_obj, "seek"):
+        file_obj.seek(0)
+    return zipfile.ZipFile(file_obj)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_plate(element):
+    """One <plate> element as a dict, or None if it wasn't sliced"""
+    metadata = {
+        item.get("key"): item.get("value")
+        for item in element.iterfind("metadata")
+    }
+    seconds = _to_float(metadata.get("prediction"))
+    if seconds is None:
+        return None
+    filaments = [
+        {
+            "type": filament.get("type"),
+            "color": filament.get("color"),
+            "used_m": _to_float(filament.get("used_m")) or 0.0,
+            "used_g": _to_float(filament.get("used_g")) or 0.0
+        }
+        for filament in element.iterfind("filament")
+    ]
+    weight = _to_float(metadata.get("weight"))
+    if weight is None:
+        weight = sum(f["used_g"] for f in filaments)
+    return {
+        "plate": int(_to_float(metadata.get("index")) or 0),
+        "print_time_hours": seconds / 3600,
+        "weight_g": weight,
+        "filament_length_mm": sum(f["used_m"] for f in filaments) * 1000,
+        "filaments": filaments
+    }
+
+
+def read_plate_metadata(file_obj, thumbnails=True):
+    """
+    Per-plate slicer results from a 3MF project (path, bytes or file object).
+
+    Returns a list of dicts with plate, print_time_hours, weight_g,
+    filament_length_mm, filaments and (if `thumbnails`) the plate's PNG
+    thumbnail bytes or None. Returns None when the project has no sliced
+    plates, e.g. a plain model export; only the metadata entry is
+    decompressed, never the meshes.
+    """
+    from lxml import etree
+
+    try:
+        archive = _open_zip(file_obj)
+    except zipfile.BadZipFile:
+        return None
+    with archive:
+        names = set(archive.namelist())
+        if SLICE_INFO_ENTRY not in names:
+            return None
+
+        plates = []
+        with archive.open(SLICE_INFO_ENTRY) as stream:
+            try:
+                for _, element in etree.iterparse(stream, events=("end",), tag="plate"):
+                    plate = _read_plate(element)
+                    if plate is not None:
+                        plates.append(plate)
+                    element.clear()
+            except etree.XMLSyntaxError:
+                return None
+
+        if thumbnails:
+            for plate in plates:
+                name = THUMBNAIL_ENTRY.format(index=plate["plate"])
+                plate["thumbnail"] = archive.read(name) if name in names else None
+    if hasattr(file_obj, "seek"):
+        file_obj.seek(0)
+    return plates or None
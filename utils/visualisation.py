@@ -1,11 +1,13 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
 
 def plot_cost_pie(material_cost, energy_cost, total_cost):
     """
     Display a minimalist, beige-toned pie chart of cost breakdown in Streamlit.
     """
+    # matplotlib is slow to import and only needed when a chart is drawn
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as mpatches
+
     markup = total_cost - material_cost - energy_cost
     labels = ['Material', 'Energy', 'Markup']
     sizes = [material_cost, energy_cost, markup]